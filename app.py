@@ -1,8 +1,11 @@
 import streamlit as st
-import asyncio
-import json
+import concurrent.futures
+import math
+import os
+import time
+import uuid
 from datetime import datetime
-import pandas as pd
+from itertools import islice
 
 # Import your VNDBFetcher - make sure this file exists and is properly implemented
 try:
@@ -12,6 +15,37 @@ except ImportError as e:
     st.error("Make sure vndb_fetcher.py exists and is properly implemented")
     st.stop()
 
+import async_runtime
+from instrumentation import configure_logging, render_prometheus
+from service_client import ServiceFetcher
+from thumbnail_cache import get_thumbnail_cache
+from vn_cards import get_card_parts
+from vn_record import VNHistory, VNResults
+
+# Fetcher logs go through the "vndb" logger; level from VNDB_LOG_LEVEL (default WARNING)
+configure_logging()
+
+# Optional headless service to use instead of calling VNDB from this process
+VNDB_SERVICE_URL = os.environ.get("VNDB_SERVICE_URL")
+
+# Per-session history bounds (older/duplicate entries are evicted, see VNHistory)
+HISTORY_MAX_SIZE = int(os.environ.get("VN_HISTORY_MAX_SIZE", "200"))
+HISTORY_EVICTION = os.environ.get("VN_HISTORY_EVICTION", "lru")
+
+# Time budget for one fetch, shared by its pages and fallbacks; when it runs
+# out the VNs found so far are shown
+FETCH_BUDGET_SECONDS = float(os.environ.get("VN_FETCH_BUDGET", "10"))
+
+# Results shown per page in the fetched-VNs list
+RESULTS_PAGE_SIZES = [5, 10, 20]
+
+# st.fragment (Streamlit >= 1.37) reruns only the decorated function on its own
+# widget interactions; older versions fall back to a normal full rerun
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+
+# st.download_button accepts a callable that builds the file on click from Streamlit 1.52
+DEFERRED_DOWNLOADS = tuple(int(part) for part in st.__version__.split(".")[:2]) >= (1, 52)
+
 # Page configuration - MUST be first Streamlit command
 st.set_page_config(
     page_title="Visual Novel Recommender System",
@@ -24,9 +58,16 @@ def init_session_state():
     """Initialize all session state variables"""
     try:
         if 'fetcher' not in st.session_state:
-            st.session_state.fetcher = VNDBFetcher()
+            # With VNDB_SERVICE_URL set, fetch through the headless service (service.py)
+            if VNDB_SERVICE_URL:
+                st.session_state.fetcher = ServiceFetcher(VNDB_SERVICE_URL)
+            else:
+                st.session_state.fetcher = VNDBFetcher()
+        if 'session_key' not in st.session_state:
+            # Keys this session's in-flight fetch so a newer one can cancel it
+            st.session_state.session_key = uuid.uuid4().hex
         if 'fetched_vns' not in st.session_state:
-            st.session_state.fetched_vns = []
+            st.session_state.fetched_vns = VNHistory(maxlen=HISTORY_MAX_SIZE, eviction=HISTORY_EVICTION)
         if 'selected_required_tags' not in st.session_state:
             st.session_state.selected_required_tags = []
         if 'selected_excluded_tags' not in st.session_state:
@@ -117,11 +158,12 @@ def display_vn_card(vn_data):
         with st.container():
             st.markdown(f'<div class="vn-card">', unsafe_allow_html=True)
             
-            # Title and safe indicator
+            # Title and safe indicator (card HTML is precomputed once per VN ID)
+            card = get_card_parts(vn_data)
+            title = card['title']
             col1, col2 = st.columns([3, 1])
             with col1:
-                title = vn_data.get("title", "Unknown Title")
-                st.markdown(f'<div class="vn-title">🎮 {title}</div>', unsafe_allow_html=True)
+                st.markdown(card['title_html'], unsafe_allow_html=True)
             with col2:
                 st.markdown('<div class="safe-indicator">✅ SFW</div>', unsafe_allow_html=True)
             
@@ -130,50 +172,35 @@ def display_vn_card(vn_data):
             
             with col1:
                 # Rating and info
-                rating = vn_data.get("rating", 0)
-                votes = vn_data.get("votes", 0)
-                vn_id = vn_data.get("id", "Unknown")
-                released = vn_data.get("released", "Unknown")
-                languages = vn_data.get("languages", [])
-                
-                st.markdown(f'<div class="vn-rating">⭐ Rating: {rating:.1f}/10</div>', unsafe_allow_html=True)
-                st.write(f"🗳️ **Votes:** {votes:,}")
-                st.write(f"🆔 **ID:** {vn_id}")
-                st.write(f"📅 **Released:** {released}")
-                st.write(f"🌐 **Languages:** {', '.join(languages) if languages else 'Unknown'}")
+                st.markdown(card['rating_html'], unsafe_allow_html=True)
+                st.markdown(card['info_markdown'])
                 
                 # Description
-                description = vn_data.get('description', 'No description available')
                 st.write("📖 **Description:**")
-                if len(description) > 400:
+                if card['description_preview']:
                     with st.expander("Click to read full description"):
-                        st.write(description)
-                    st.write(description[:400] + "...")
+                        st.write(card['description'])
+                    st.write(card['description_preview'])
                 else:
-                    st.write(description)
+                    st.write(card['description'])
                 
                 # Tags
-                tags = vn_data.get('tags', [])
-                if tags:
+                if card['tags_html']:
                     st.write("🏷️ **Tags:**")
-                    tags_html = ""
-                    for tag in tags[:10]:  # Show first 10 tags
-                        tags_html += f'<span class="tag">{tag}</span>'
-                    st.markdown(f'<div class="vn-tags">{tags_html}</div>', unsafe_allow_html=True)
+                    st.markdown(card['tags_html'], unsafe_allow_html=True)
                     
-                    if len(tags) > 10:
-                        with st.expander(f"Show all {len(tags)} tags"):
-                            remaining_tags = ""
-                            for tag in tags[10:]:
-                                remaining_tags += f'<span class="tag">{tag}</span>'
-                            st.markdown(f'<div class="vn-tags">{remaining_tags}</div>', unsafe_allow_html=True)
+                    if card['extra_tags_html']:
+                        with st.expander(f"Show all {card['tag_count']} tags"):
+                            st.markdown(card['extra_tags_html'], unsafe_allow_html=True)
             
             with col2:
                 # Image
-                image_url = vn_data.get('image_url')
-                if image_url:
+                # Local thumbnail bytes when cached, otherwise the remote URL right
+                # away, so a slow cover never holds up the rest of the page
+                image = get_thumbnail_cache().image_for(vn_data)
+                if image:
                     try:
-                        st.image(image_url, caption=title, use_container_width=True)
+                        st.image(image, caption=title, use_container_width=True)
                     except Exception as e:
                         st.info("🖼️ Image could not be loaded")
                 else:
@@ -183,8 +210,9 @@ def display_vn_card(vn_data):
     except Exception as e:
         st.error(f"Error displaying VN card: {e}")
 
+@fragment
 def display_tag_selector():
-    """Display tag selection interface"""
+    """Display tag selection interface (toggling a tag only reruns this fragment)"""
     try:
         st.subheader("🏷️ Tag Selection")
         
@@ -250,32 +278,93 @@ def display_tag_selector():
     except Exception as e:
         st.error(f"Error in tag selector: {e}")
 
-async def fetch_vns_by_tags_async(required_tags, excluded_tags, max_results, min_rating, min_votes, strict_filtering, sort_by):
-    """Async wrapper for fetching VNs by tags"""
-    return await st.session_state.fetcher.fetch_vns_by_tags(
+@fragment
+def display_fetched_vns():
+    """Display one page of fetched VNs, newest first (paging only reruns this fragment)"""
+    history = st.session_state.fetched_vns
+    if not history:
+        return
+    
+    total = len(history)
+    st.header(f"📚 Fetched VNs ({total})")
+    
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        page_size = st.selectbox("Results per page", RESULTS_PAGE_SIZES, key="results_page_size")
+    page_count = max(1, math.ceil(total / page_size))
+    # Clamp before the widget is created, the history may have shrunk or the page size grown
+    st.session_state.results_page = min(st.session_state.get('results_page', 1), page_count)
+    with col2:
+        page = st.number_input(f"Page (of {page_count})", 1, page_count, key="results_page")
+    
+    start = (page - 1) * page_size
+    for i, vn in enumerate(islice(reversed(history), start, start + page_size)):
+        st.write(f"### VN #{total - start - i}")
+        display_vn_card(vn)
+
+@fragment
+def display_fetcher_metrics():
+    """
+    Prometheus text of this process's metrics, built only while the toggle is
+    on (toggling only reruns this fragment)
+    """
+    if st.toggle("📈 Show fetcher metrics (Prometheus format)", key="show_fetcher_metrics"):
+        st.button("🔄 Refresh metrics")
+        st.code(render_prometheus(), language="text")
+
+def run_session_fetch(coro):
+    """
+    Run a fetch on the shared loop for this session, superseding the session's
+    previous fetch if it is still running
+
+    The wait is done in short slices with a status line updated in between, so
+    a rerun triggered by a new interaction interrupts it; the abandoned fetch
+    is then cancelled instead of running to completion.
+    """
+    future = async_runtime.submit_for_session(st.session_state.session_key, coro)
+    status = st.empty()
+    start = time.monotonic()
+    try:
+        while True:
+            try:
+                return future.result(timeout=0.25)
+            except concurrent.futures.TimeoutError:
+                status.caption(f"⏳ {time.monotonic() - start:.1f}s of a {FETCH_BUDGET_SECONDS:g}s budget")
+    finally:
+        future.cancel()
+        status.empty()
+
+# The wrappers read session state here, on the script thread, and return the
+# coroutine (or async iterator) for async_runtime to run on the shared loop
+def stream_vns_by_tags_async(required_tags, excluded_tags, max_results, min_rating, min_votes, strict_filtering, sort_by, results):
+    """Async iterator over VNs matching the tags, yielding each as its page arrives"""
+    return st.session_state.fetcher.stream_vns_by_tags(
         required_tags=required_tags,
         excluded_tags=excluded_tags,
         max_results=max_results,
         min_rating=min_rating,
         min_votes=min_votes,
         strict_filtering=strict_filtering,
-        sort_by=sort_by
+        sort_by=sort_by,
+        deadline=FETCH_BUDGET_SECONDS,
+        results=results
     )
 
-async def fetch_random_vn_with_tags_async(required_tags, excluded_tags, max_attempts, strict_filtering, min_rating, min_votes):
+def fetch_random_vn_with_tags_async(required_tags, excluded_tags, max_attempts, strict_filtering, min_rating, min_votes):
     """Async wrapper for fetching random VN with tags"""
-    return await st.session_state.fetcher.fetch_random_vn_with_tags(
+    return st.session_state.fetcher.fetch_random_vn_with_tags(
         required_tags=required_tags,
         excluded_tags=excluded_tags,
         max_attempts=max_attempts,
         strict_filtering=strict_filtering,
         min_rating=min_rating,
-        min_votes=min_votes
+        min_votes=min_votes,
+        deadline=FETCH_BUDGET_SECONDS
     )
 
-async def fetch_vn_async(max_attempts, strict_filtering, min_rating, max_id, min_votes):
+def fetch_vn_async(max_attempts, strict_filtering, min_rating, max_id, min_votes):
     """Async wrapper for fetching VN (legacy method)"""
-    return await st.session_state.fetcher.fetch_random_vn(
+    return st.session_state.fetcher.fetch_random_vn(
         max_attempts=max_attempts,
         strict_filtering=strict_filtering,
         min_rating=min_rating,
@@ -336,7 +425,7 @@ def main():
                     else:
                         with st.spinner("🔍 Searching for VN with selected tags..."):
                             try:
-                                vn = asyncio.run(fetch_random_vn_with_tags_async(
+                                vn = run_session_fetch(fetch_random_vn_with_tags_async(
                                     st.session_state.selected_required_tags,
                                     st.session_state.selected_excluded_tags,
                                     max_attempts,
@@ -345,7 +434,9 @@ def main():
                                     min_votes
                                 ))
                                 if vn:
+                                    get_thumbnail_cache().prefetch([vn])
                                     st.session_state.fetched_vns.append(vn)
+                                    st.session_state.results_page = 1
                                     st.success("✅ Found a matching VN!")
                                 else:
                                     st.error("❌ No VN found with selected tags. Try different tag combinations.")
@@ -358,24 +449,52 @@ def main():
                     if not st.session_state.selected_required_tags and not st.session_state.selected_excluded_tags:
                         st.warning("⚠️ Please select at least one required or excluded tag first!")
                     else:
-                        with st.spinner(f"🔍 Searching for {max_results} VNs with selected tags..."):
-                            try:
-                                vns = asyncio.run(fetch_vns_by_tags_async(
+                        # Cards are rendered as they arrive, then move to the fetched list below
+                        vns = VNResults()
+                        progress = st.empty()
+                        streamed = st.empty()
+                        progress.progress(0.0, text=f"🔍 Searching for {max_results} VNs with selected tags...")
+                        try:
+                            found = 0
+                            with streamed.container():
+                                for vn in async_runtime.iterate(stream_vns_by_tags_async(
                                     st.session_state.selected_required_tags,
                                     st.session_state.selected_excluded_tags,
                                     max_results,
                                     min_rating,
                                     min_votes,
                                     strict_filtering,
-                                    sort_by
-                                ))
-                                if vns:
-                                    st.session_state.fetched_vns.extend(vns)
-                                    st.success(f"✅ Found {len(vns)} matching VNs!")
-                                else:
-                                    st.error("❌ No VNs found with selected tags. Try different tag combinations.")
-                            except Exception as e:
-                                st.error(f"❌ Error: {str(e)}")
+                                    sort_by,
+                                    vns
+                                ), st.session_state.session_key):
+                                    if vn is not None:
+                                        found += 1
+                                        get_thumbnail_cache().prefetch([vn])
+                                        display_vn_card(vn)
+                                    progress.progress(min(found / max_results, 1.0),
+                                                      text=f"🔍 {found} / {max_results} VNs found...")
+                            progress.empty()
+                            streamed.empty()
+                        except Exception as e:
+                            progress.empty()
+                            st.error(f"❌ Error: {str(e)}")
+                        else:
+                            if vns:
+                                get_thumbnail_cache().prefetch(vns)
+                                st.session_state.fetched_vns.extend(vns)
+                                st.session_state.results_page = 1
+                                st.success(f"✅ Found {len(vns)} matching VNs!")
+                                if getattr(vns, "partial", False):
+                                    st.info(f"⏱️ VNDB didn't return every page within the {FETCH_BUDGET_SECONDS:g}s "
+                                            "time budget, so these are the VNs found so far.")
+                                if getattr(vns, "stale", False):
+                                    st.info("🕒 VNDB is slow or unavailable, so these are cached results. "
+                                            "They will be refreshed in the background.")
+                            elif getattr(vns, "partial", False):
+                                st.warning(f"⏱️ VNDB didn't answer within the {FETCH_BUDGET_SECONDS:g}s time budget. "
+                                           "Please try again.")
+                            else:
+                                st.error("❌ No VNs found with selected tags. Try different tag combinations.")
         
         # with tab2:
         #     st.header("🎲 Get Random SFW VN")
@@ -386,7 +505,7 @@ def main():
         #         if st.button("🎲 Fetch Random VN", type="primary"):
         #             with st.spinner("🔍 Searching for SFW visual novel..."):
         #                 try:
-        #                     vn = asyncio.run(fetch_vn_async(
+        #                     vn = async_runtime.run(fetch_vn_async(
         #                         max_attempts, strict_filtering, min_rating, max_id, min_votes
         #                     ))
         #                     if vn:
@@ -416,7 +535,7 @@ def main():
         #                 progress_bar = st.progress(0)
         #                 try:
         #                     for i in range(vn_count):
-        #                         vn = asyncio.run(fetch_vn_async(
+        #                         vn = async_runtime.run(fetch_vn_async(
         #                             max_attempts, strict_filtering, min_rating, max_id, min_votes
         #                         ))
         #                         if vn:
@@ -430,62 +549,61 @@ def main():
         with tab4:
             st.header("📊 Statistics & Data Export")
             
-            if st.session_state.fetched_vns:
-                total_vns = len(st.session_state.fetched_vns)
-                avg_rating = sum(vn.get('rating', 0) for vn in st.session_state.fetched_vns) / total_vns
-                avg_votes = sum(vn.get('votes', 0) for vn in st.session_state.fetched_vns) / total_vns
+            history = st.session_state.fetched_vns
+            if history:
+                # Running totals are maintained by the history as VNs are added/evicted
+                stats = history.stats
                 
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    st.metric("Total VNs Fetched", total_vns)
+                    st.metric("Total VNs Fetched", stats.count)
                 with col2:
-                    st.metric("Average Rating", f"{avg_rating:.1f}/10")
+                    st.metric("Average Rating", f"{stats.avg_rating:.1f}/10")
                 with col3:
-                    st.metric("Average Votes", f"{avg_votes:,.0f}")
-                
-                # Create DataFrame for export
-                df_data = []
-                for vn in st.session_state.fetched_vns:
-                    df_data.append({
-                        'Title': vn.get('title', 'Unknown'),
-                        'ID': vn.get('id', 'Unknown'),
-                        'Rating': vn.get('rating', 0),
-                        'Votes': vn.get('votes', 0),
-                        'Released': vn.get('released', 'Unknown'),
-                        'Languages': ', '.join(vn.get('languages', [])),
-                        'Tags': ', '.join(vn.get('tags', [])[:5]),
-                        'Image URL': vn.get('image_url', '')
-                    })
+                    st.metric("Average Votes", f"{stats.avg_votes:,.0f}")
                 
-                df = pd.DataFrame(df_data)
+                st.subheader("🏷️ Most Common Tags")
+                st.bar_chart(dict(history.top_tags(10)))
                 
                 # Display table
                 st.subheader("📋 VN Data Table")
-                st.dataframe(df, use_container_width=True)
+                st.dataframe(history.table_columns(), use_container_width=True)
                 
-                # Export options
+                # Export options (generated on click, cached until the history changes)
                 st.subheader("💾 Export Data")
                 col1, col2 = st.columns(2)
                 
                 with col1:
-                    csv = df.to_csv(index=False)
                     st.download_button(
                         "📄 Download as CSV",
-                        csv,
+                        history.export_csv if DEFERRED_DOWNLOADS else history.export_csv(),
                         f"vndb_sfw_vns_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
                         "text/csv"
                     )
                 
                 with col2:
-                    json_data = json.dumps(st.session_state.fetched_vns, indent=2, ensure_ascii=False)
                     st.download_button(
                         "📄 Download as JSON",
-                        json_data,
+                        history.export_json if DEFERRED_DOWNLOADS else history.export_json(),
                         f"vndb_sfw_vns_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
                         "application/json"
                     )
             else:
                 st.info("📊 No data to display. Fetch some VNs first!")
+            
+            # Cover thumbnail cache (shared by every session in this process)
+            st.subheader("🖼️ Image Cache")
+            image_metrics = get_thumbnail_cache().metrics()
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Hit Rate", f"{image_metrics['hit_rate']:.0%}")
+            with col2:
+                st.metric("Bytes Saved", f"{image_metrics['bytes_saved'] / 1024:,.0f} KiB")
+            with col3:
+                st.metric("Cached Covers", image_metrics['entries'])
+            
+            # Per-stage fetcher timings, payload sizes and rejection counts for this process
+            display_fetcher_metrics()
         
         with tab5:
             st.header("ℹ️ How to Use")
@@ -523,11 +641,7 @@ def main():
             """)
         
         # Display fetched VNs (common to all tabs)
-        if st.session_state.fetched_vns:
-            st.header(f"📚 Fetched VNs ({len(st.session_state.fetched_vns)})")
-            for i, vn in enumerate(reversed(st.session_state.fetched_vns)):
-                st.write(f"### VN #{len(st.session_state.fetched_vns) - i}")
-                display_vn_card(vn)
+        display_fetched_vns()
         
         # Footer
         st.markdown("---")
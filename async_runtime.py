@@ -0,0 +1,165 @@
+import asyncio
+import concurrent.futures
+import queue
+import threading
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Dict, Iterator, Optional, Tuple
+
+import httpx
+
+# Shared settings for the pooled client used by every session in this process
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """
+    Return the process-wide event loop, starting its thread on first use
+
+    Streamlit runs each rerun in its own thread, so instead of an asyncio.run
+    per click (which tears down connections every time) all coroutines are
+    submitted to this one long-lived loop.
+    """
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="vndb-async-runtime", daemon=True)
+                thread.start()
+                _loop = loop
+    return _loop
+
+
+def use_current_loop():
+    """
+    Make the running loop the shared loop (for processes that run their own
+    event loop, like the headless service) so the pooled client is used there
+    """
+    global _loop
+    with _loop_lock:
+        _loop = asyncio.get_running_loop()
+
+
+def submit(coro: Awaitable) -> concurrent.futures.Future:
+    """Schedule a coroutine on the shared loop without waiting for it"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run(coro: Awaitable, timeout: Optional[float] = None) -> Any:
+    """Run a coroutine on the shared loop and block until it finishes"""
+    return submit(coro).result(timeout)
+
+
+_session_futures: Dict[str, concurrent.futures.Future] = {}
+_session_lock = threading.Lock()
+
+
+def submit_for_session(session_key: str, coro: Awaitable) -> concurrent.futures.Future:
+    """
+    Schedule a coroutine for a UI session, cancelling that session's previous
+    call if it is still running
+
+    A new interaction supersedes whatever the session was waiting for, so the
+    old request stops holding a pooled connection and rate-limit tokens. The
+    returned future can be cancelled by the caller as well.
+    """
+    future = submit(coro)
+    with _session_lock:
+        previous = _session_futures.get(session_key)
+        _session_futures[session_key] = future
+    if previous is not None and not previous.done():
+        previous.cancel()
+
+    def forget(done: concurrent.futures.Future):
+        with _session_lock:
+            if _session_futures.get(session_key) is done:
+                del _session_futures[session_key]
+
+    future.add_done_callback(forget)
+    return future
+
+
+def iterate(agen: AsyncIterator, session_key: Optional[str] = None,
+            heartbeat: float = 0.25) -> Iterator[Any]:
+    """
+    Consume an async iterator on the shared loop and yield its items in the
+    calling (script) thread as they arrive
+
+    While waiting, None is yielded every `heartbeat` seconds so the caller can
+    update the UI, which also lets a Streamlit rerun interrupt the wait. With
+    session_key the consumption supersedes the session's previous call (see
+    submit_for_session). Closing the iterator early cancels the consumption.
+    """
+    items: "queue.Queue[Tuple[bool, Any]]" = queue.Queue()
+
+    async def pump():
+        try:
+            async for item in agen:
+                items.put((True, item))
+        except Exception as e:
+            items.put((False, e))
+        else:
+            items.put((False, None))
+
+    future = submit_for_session(session_key, pump()) if session_key else submit(pump())
+    try:
+        while True:
+            try:
+                is_item, value = items.get(timeout=heartbeat)
+            except queue.Empty:
+                if future.cancelled():
+                    raise concurrent.futures.CancelledError()
+                yield None
+                continue
+            if not is_item:
+                if value is not None:
+                    raise value
+                return
+            yield value
+    finally:
+        future.cancel()
+
+
+def cancel_session(session_key: str) -> bool:
+    """Cancel the session's in-flight call, if any; returns whether one was cancelled"""
+    with _session_lock:
+        future = _session_futures.pop(session_key, None)
+    return future is not None and future.cancel()
+
+
+def in_runtime_loop() -> bool:
+    """Whether the caller is running on the shared loop"""
+    try:
+        return asyncio.get_running_loop() is _loop
+    except RuntimeError:
+        return False
+
+
+def get_shared_client() -> httpx.AsyncClient:
+    """
+    Return the pooled HTTP client; only use it from coroutines on the shared loop
+    """
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=DEFAULT_TIMEOUT, limits=DEFAULT_LIMITS)
+    return _client
+
+
+@asynccontextmanager
+async def shared_client():
+    """
+    Yield the pooled client when running on the shared loop
+
+    Coroutines driven by some other loop (e.g. a plain asyncio.run) get a
+    short-lived client instead, since connections can't move between loops.
+    """
+    if in_runtime_loop():
+        yield get_shared_client()
+    else:
+        async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT) as client:
+            yield client
@@ -0,0 +1,7 @@
+"""
+Offline benchmarks for the VNDB fetcher
+
+Nothing here talks to the live Kana API: mock_vndb serves recorded or
+synthetic responses through an httpx mock transport. Run from the repository
+root, e.g. `python -m benchmarks.fetcher_benchmark --compare`.
+"""
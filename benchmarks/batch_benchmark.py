@@ -0,0 +1,93 @@
+"""
+"Top picks per genre" over every tag in VNDBFetcher.common_tags, fetched one
+query at a time versus through fetch_many, against a mock Kana API with
+simulated latency
+
+    python -m benchmarks.batch_benchmark --latency 0.1 --concurrency 8
+
+With enough concurrency the batch wall time should approach the slowest
+single query rather than the sum of all of them.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.mock_vndb import MockVNDB
+from vndb_fetcher import VNDBFetcher
+
+
+def genre_specs(fetcher: VNDBFetcher, max_results: int) -> List[Dict[str, Any]]:
+    """One tag query per tag in common_tags"""
+    return [{"kind": "tags", "required_tags": [tag], "max_results": max_results}
+            for tags in fetcher.common_tags.values() for tag in tags]
+
+
+def _fetcher(client) -> VNDBFetcher:
+    # No caching, so both passes send every query upstream
+    return VNDBFetcher(client=client, cache=False, rate_limiter=False, shared_cache=False,
+                       circuit_breaker=False)
+
+
+async def run(mock: MockVNDB, max_results: int, concurrency: int) -> Dict[str, Any]:
+    async with mock.client() as client:
+        fetcher = _fetcher(client)
+        specs = genre_specs(fetcher, max_results)
+
+        # Sequential: one query after the other
+        slowest = 0.0
+        start = time.perf_counter()
+        for spec in specs:
+            query_start = time.perf_counter()
+            await fetcher.fetch_vns_by_tags(required_tags=spec["required_tags"], max_results=max_results)
+            slowest = max(slowest, time.perf_counter() - query_start)
+        sequential = time.perf_counter() - start
+
+        # Batched
+        requests_before = mock.requests
+        first = None
+        errors = 0
+        start = time.perf_counter()
+        async for item in fetcher.fetch_many(specs, concurrency=concurrency):
+            if first is None:
+                first = time.perf_counter() - start
+            errors += item.error is not None
+        batched = time.perf_counter() - start
+
+    return {
+        "queries": len(specs),
+        "sequential_s": sequential,
+        "slowest_query_s": slowest,
+        "batched_s": batched,
+        "first_result_s": first or 0.0,
+        "upstream_requests": mock.requests - requests_before,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.1, help="Simulated upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Random +/- latency jitter in seconds")
+    parser.add_argument("--concurrency", type=int, default=8, help="fetch_many concurrency cap")
+    parser.add_argument("--max-results", type=int, default=5, help="VNs per genre")
+    args = parser.parse_args()
+
+    mock = MockVNDB(latency=args.latency, jitter=args.jitter)
+    result = asyncio.run(run(mock, args.max_results, args.concurrency))
+
+    print(f"queries             {result['queries']}")
+    print(f"sequential          {result['sequential_s']:.2f} s")
+    print(f"slowest query       {result['slowest_query_s']:.2f} s")
+    print(f"fetch_many          {result['batched_s']:.2f} s "
+          f"({result['sequential_s'] / result['batched_s']:.1f}x faster, concurrency {args.concurrency})")
+    print(f"first batch result  {result['first_result_s']:.2f} s")
+    print(f"upstream requests   {result['upstream_requests']}, errors {result['errors']}")
+
+
+if __name__ == "__main__":
+    main()
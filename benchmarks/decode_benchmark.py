@@ -0,0 +1,138 @@
+"""
+Benchmark response decoding for the fetch_random_vn path
+
+Compares the previous pipeline (response.json() into dicts, then the old
+is_content_safe and format_vn_info walking each dict) with the one-pass
+decoder that builds VNRecords straight from the response bytes. Run from the
+repository root:
+
+    python -m benchmarks.decode_benchmark --records 600 --max-results 200
+
+Each timed run starts from a cold record registry, so the one-pass path
+builds every record; --warm-registry keeps one decoded result alive instead,
+as when other sessions already hold the same VNs.
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.synthetic import make_response_body
+from vn_record import orjson
+from vndb_fetcher import VNDBFetcher
+
+
+def legacy_format_vn_info(vn):
+    """Copy of the previous VNDBFetcher.format_vn_info (fresh dict per VN)"""
+    formatted = {
+        'title': vn.get('title', 'Unknown'),
+        'id': vn.get('id', 'Unknown'),
+        'rating': vn.get('rating', 0) / 10,
+        'votes': vn.get('votecount', 0),
+        'released': vn.get('released', 'Unknown'),
+        'languages': vn.get('languages', []),
+        'description': vn.get('description', 'No description available'),
+        'image_url': None,
+        'tags': []
+    }
+    image_info = vn.get("image")
+    if image_info and isinstance(image_info, dict) and image_info.get("url"):
+        formatted['image_url'] = image_info['url']
+    tags = vn.get("tags", [])
+    if tags:
+        formatted['tags'] = [tag.get("name", "Unknown") for tag in tags[:15]]
+    return formatted
+
+
+def legacy_is_content_safe(fetcher, vn, strict=True):
+    """Copy of the previous VNDBFetcher.is_content_safe (no per-tag verdict cache)"""
+    tags = vn.get("tags", [])
+    tag_names = [tag.get("name", "").lower() for tag in tags]
+    description = vn.get("description", "").lower()
+    if strict:
+        for tag_name in tag_names:
+            if any(safe_tag in tag_name for safe_tag in fetcher.safe_keywords):
+                continue
+            for nsfw_keyword in fetcher.nsfw_keywords:
+                if nsfw_keyword in tag_name:
+                    return False, f"NSFW tag: '{tag_name}' contains '{nsfw_keyword}'"
+        explicit_desc_patterns = ["contains sexual", "features erotic", "includes adult content", "hentai game"]
+        for pattern in explicit_desc_patterns:
+            if pattern in description:
+                return False, f"NSFW description contains '{pattern}'"
+    else:
+        for tag_name in tag_names:
+            if any(safe_tag in tag_name for safe_tag in fetcher.safe_keywords):
+                continue
+            if any(explicit in tag_name for explicit in fetcher.explicit_nsfw):
+                return False, "Contains explicit content tags"
+    return True, ""
+
+
+def legacy_path(fetcher, content, max_results, strict):
+    data = json.loads(content)
+    results = []
+    if data.get("results"):
+        for vn in data["results"]:
+            if len(results) >= max_results:
+                break
+            is_safe, _ = legacy_is_content_safe(fetcher, vn, strict)
+            if is_safe:
+                results.append(legacy_format_vn_info(vn))
+    return results
+
+
+def fast_path(fetcher, content, max_results, strict):
+    return fetcher.collect_safe_records(content, max_results, strict)
+
+
+def time_path(func, repeat, *args):
+    """Return (best, mean) seconds per call"""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=600, help="Records in the response body")
+    parser.add_argument("--max-results", type=int, default=200, help="Safe results to keep")
+    parser.add_argument("--nsfw-ratio", type=float, default=0.1, help="Share of records with NSFW tags")
+    parser.add_argument("--repeat", type=int, default=30, help="Timed runs per path")
+    parser.add_argument("--lenient", action="store_true", help="Use non-strict filtering")
+    parser.add_argument("--warm-registry", action="store_true",
+                        help="Keep the sanity-check records alive, so the one-pass path reuses them")
+    args = parser.parse_args()
+
+    fetcher = VNDBFetcher()
+    content = make_response_body(args.records, args.nsfw_ratio)
+    strict = not args.lenient
+
+    legacy = legacy_path(fetcher, content, args.max_results, strict)
+    fast = fast_path(fetcher, content, args.max_results, strict)
+    assert [vn['id'] for vn in legacy] == [vn.id for vn in fast], "paths disagree on safe results"
+    if not args.warm_registry:
+        # Records live in a weak registry; holding them would turn every timed
+        # one-pass run into registry hits
+        del legacy, fast
+
+    print(f"records={args.records} max_results={args.max_results} nsfw_ratio={args.nsfw_ratio} "
+          f"body={len(content) / 1024:.0f} KiB decoder={'orjson' if orjson else 'json'} "
+          f"registry={'warm' if args.warm_registry else 'cold'}")
+    legacy_best, legacy_mean = time_path(legacy_path, args.repeat, fetcher, content, args.max_results, strict)
+    fast_best, fast_mean = time_path(fast_path, args.repeat, fetcher, content, args.max_results, strict)
+    print(f"response.json + walk : best {legacy_best * 1000:7.2f} ms  mean {legacy_mean * 1000:7.2f} ms")
+    print(f"one-pass decode      : best {fast_best * 1000:7.2f} ms  mean {fast_mean * 1000:7.2f} ms")
+    print(f"speedup (best)       : {legacy_best / fast_best:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
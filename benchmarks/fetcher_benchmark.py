@@ -0,0 +1,186 @@
+"""
+Repeatable VNDBFetcher scenarios against a mock Kana API
+
+Each scenario calls the fetcher through a MockVNDB-backed client and reports
+ops/sec, p50/p95/p99 latency and the peak memory allocated per call. Results
+can be saved as a baseline and later runs compared against it:
+
+    python -m benchmarks.fetcher_benchmark --save-baseline
+    python -m benchmarks.fetcher_benchmark --compare          # exit 1 on slowdowns
+
+The comparison gates on the median, mean and allocations, which are stable
+for these ~1 ms calls; the p95 tail only fails the gate beyond the wider
+--tail-tolerance, since a few scheduler or GC pauses move it a lot.
+
+Use --latency/--jitter to add simulated network time, --page-size and
+--nsfw-ratio to shape the responses, or --recorded to replay a saved Kana
+response body.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.mock_vndb import MockVNDB
+from vndb_fetcher import VNDBFetcher
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# name -> coroutine factory taking a fetcher
+SCENARIOS: Dict[str, Callable[[VNDBFetcher], Any]] = {
+    "single_tag": lambda fetcher: fetcher.fetch_vns_by_tags(
+        required_tags=["Romance"], max_results=10),
+    "multi_tag_all": lambda fetcher: fetcher.fetch_vns_by_tags(
+        required_tags=["Romance", "Drama", "School"], excluded_tags=["Horror"],
+        max_results=10, tag_logic="all"),
+    "random_pick": lambda fetcher: fetcher.fetch_random_vn(),
+    "popular": lambda fetcher: fetcher.fetch_popular_vns(max_results=20),
+    "text_search": lambda fetcher: fetcher.search_vns_by_query("school romance", max_results=10),
+}
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def _run_scenario(name: str, mock: MockVNDB, iterations: int, warmup: int) -> Dict[str, Any]:
+    async with mock.client() as client:
+        # Measure the fetch pipeline itself, not cache hits or rate-limit waits
+        fetcher = VNDBFetcher(client=client, cache=False, rate_limiter=False, shared_cache=False,
+                              circuit_breaker=False)
+        make_call = SCENARIOS[name]
+
+        for _ in range(warmup):
+            await make_call(fetcher)
+
+        # Timed pass
+        requests_before = mock.requests
+        timings = []
+        gc.collect()
+        wall_start = time.perf_counter()
+        for _ in range(iterations):
+            start = time.perf_counter()
+            result = await make_call(fetcher)
+            timings.append(time.perf_counter() - start)
+            del result
+        wall = time.perf_counter() - wall_start
+        upstream_requests = mock.requests - requests_before
+
+        # Separate allocation pass, since tracing slows everything down
+        alloc_peaks = []
+        tracemalloc.start()
+        for _ in range(max(1, iterations // 10)):
+            gc.collect()
+            baseline, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            result = await make_call(fetcher)
+            _, peak = tracemalloc.get_traced_memory()
+            alloc_peaks.append(peak - baseline)
+            del result
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        "iterations": iterations,
+        "ops_per_sec": iterations / wall if wall else 0.0,
+        "mean_ms": statistics.fmean(timings) * 1000,
+        "p50_ms": percentile(timings, 0.50) * 1000,
+        "p95_ms": percentile(timings, 0.95) * 1000,
+        "p99_ms": percentile(timings, 0.99) * 1000,
+        "alloc_kib_per_call": statistics.fmean(alloc_peaks) / 1024,
+        "upstream_requests_per_call": upstream_requests / iterations,
+    }
+
+
+def run_scenario(name: str, mock: MockVNDB, iterations: int, warmup: int = 3) -> Dict[str, Any]:
+    return asyncio.run(_run_scenario(name, mock, iterations, warmup))
+
+
+# Metrics checked by compare; p95 uses the tail tolerance
+GATED_METRICS = ("p50_ms", "mean_ms", "alloc_kib_per_call")
+TAIL_METRICS = ("p95_ms",)
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            tolerance: float, tail_tolerance: float = 1.0) -> List[str]:
+    """
+    Return a message for every scenario slower than the baseline by more than
+    tolerance (tail_tolerance for the p95)
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        limits = [(key, tolerance) for key in GATED_METRICS] + [(key, tail_tolerance) for key in TAIL_METRICS]
+        for key, allowed in limits:
+            if previous.get(key) and current[key] > previous[key] * (1 + allowed):
+                regressions.append(f"{name}: {key} {current[key]:.2f} vs baseline {previous[key]:.2f} "
+                                   f"(+{(current[key] / previous[key] - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="Scenario to run (repeatable, default: all)")
+    parser.add_argument("--iterations", type=int, default=1000, help="Timed calls per scenario")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random +/- latency jitter in seconds")
+    parser.add_argument("--page-size", type=int, default=100, help="Max results per mock response")
+    parser.add_argument("--nsfw-ratio", type=float, default=0.1, help="Share of NSFW VNs in the mock pool")
+    parser.add_argument("--recorded", help="Replay VNs from a recorded Kana response body (JSON file)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline file")
+    parser.add_argument("--save-baseline", action="store_true", help="Write results to the baseline file")
+    parser.add_argument("--compare", action="store_true", help="Compare with the baseline, exit 1 on slowdowns")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Allowed p50/mean/allocation increase before flagging (0.25 = 25%%)")
+    parser.add_argument("--tail-tolerance", type=float, default=1.0,
+                        help="Allowed p95 increase before flagging (1.0 = 100%%)")
+    args = parser.parse_args()
+
+    mock = MockVNDB(page_size=args.page_size, nsfw_ratio=args.nsfw_ratio, latency=args.latency,
+                    jitter=args.jitter, recorded=args.recorded)
+
+    results = {}
+    print(f"{'scenario':<15} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'KiB/call':>9} {'req/call':>9}")
+    for name in args.scenario or list(SCENARIOS):
+        result = results[name] = run_scenario(name, mock, args.iterations)
+        print(f"{name:<15} {result['ops_per_sec']:>9.1f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+              f"{result['p99_ms']:>8.2f} {result['alloc_kib_per_call']:>9.1f} {result['upstream_requests_per_call']:>9.2f}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"No baseline at {args.baseline}; run with --save-baseline first")
+            sys.exit(2)
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance, args.tail_tolerance)
+        if regressions:
+            print("Slower than baseline:")
+            for message in regressions:
+                print(f"  {message}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} of baseline ({args.tail_tolerance:.0%} for p95)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Concurrent-session load test for the Streamlit app's code paths
+
+Each virtual session mirrors one browser tab: its own VNDBFetcher, VNHistory
+and session key (as in init_session_state), tag checkbox toggles, "Get Random
+VN with Tags", "Search Multiple VNs" and CSV/JSON export. Fetches run from the
+session's own thread the way app.py runs them: the random pick through
+async_runtime.submit_for_session and the search streamed through
+async_runtime.iterate, both with the VN_FETCH_BUDGET deadline, so a session's
+new fetch cancels its previous one. Time to the first streamed VN is reported
+as "search_first_result". Requests go to a local stub VNDB server (started
+automatically unless --upstream is given).
+
+    python -m benchmarks.load_test --sessions 50 --duration 30
+    python -m benchmarks.load_test --ramp 1,5,10,25,50,100 --step-duration 15 --max-p95 2.0
+"""
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+# Keep thumbnails of the run away from the app's real cache
+os.environ.setdefault("VN_THUMBNAIL_DIR", tempfile.mkdtemp(prefix="vn_load_thumbs_"))
+# A fresh shared cache per run, so upstream counts aren't hidden by earlier runs
+os.environ.setdefault("VNDB_SHARED_CACHE", os.path.join(tempfile.mkdtemp(prefix="vn_load_cache_"), "cache.sqlite3"))
+# The stub has no real rate limit; keep the shared limiter from dominating latency
+# unless the caller sets VNDB_RATE_LIMIT explicitly
+os.environ.setdefault("VNDB_RATE_LIMIT", "1000")
+os.environ.setdefault("VNDB_RATE_BURST", "1000")
+
+import async_runtime
+from thumbnail_cache import get_thumbnail_cache
+from vn_record import VNHistory, VNResults
+from vndb_fetcher import VNDBFetcher
+
+# Per-fetch time budget, as in app.py
+FETCH_BUDGET_SECONDS = float(os.environ.get("VN_FETCH_BUDGET", "10"))
+
+# Relative frequency of each user action per interaction
+ACTION_WEIGHTS = {"random_with_tags": 45, "search_multiple": 45, "export": 10}
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class VirtualSession:
+    """One simulated user session driving the same calls as app.py"""
+
+    def __init__(self, session_num: int, api_url: str, max_results: int = 5):
+        self.rng = random.Random(session_num)
+        self.fetcher = VNDBFetcher(api_url=api_url)
+        self.history = VNHistory()
+        self.session_key = uuid.uuid4().hex
+        self.first_result_times: List[float] = []
+        self.max_results = max_results
+        self.selected_required_tags: List[str] = []
+        self.selected_excluded_tags: List[str] = []
+        self.all_tags = [tag for tags in self.fetcher.get_available_tags().values() for tag in tags]
+
+    def toggle_tags(self):
+        """Flip a few tag checkboxes like display_tag_selector does"""
+        for _ in range(self.rng.randint(1, 3)):
+            tag = self.rng.choice(self.all_tags)
+            selected = self.selected_required_tags if self.rng.random() < 0.8 else self.selected_excluded_tags
+            if tag in selected:
+                selected.remove(tag)
+            else:
+                selected.append(tag)
+        if not self.selected_required_tags:
+            self.selected_required_tags.append(self.rng.choice(self.all_tags))
+
+    def random_with_tags(self) -> bool:
+        vn = async_runtime.submit_for_session(self.session_key, self.fetcher.fetch_random_vn_with_tags(
+            required_tags=self.selected_required_tags,
+            excluded_tags=self.selected_excluded_tags,
+            max_attempts=50,
+            strict_filtering=True,
+            min_rating=60,
+            min_votes=50,
+            deadline=FETCH_BUDGET_SECONDS
+        )).result()
+        if vn:
+            get_thumbnail_cache().prefetch([vn])
+            self.history.append(vn)
+        return vn is not None
+
+    def search_multiple(self) -> bool:
+        vns = VNResults()
+        start = time.perf_counter()
+        first = True
+        for vn in async_runtime.iterate(self.fetcher.stream_vns_by_tags(
+            required_tags=self.selected_required_tags,
+            excluded_tags=self.selected_excluded_tags,
+            max_results=self.max_results,
+            min_rating=60,
+            min_votes=50,
+            strict_filtering=True,
+            sort_by="rating",
+            deadline=FETCH_BUDGET_SECONDS,
+            results=vns
+        ), self.session_key):
+            # None is a heartbeat while waiting
+            if vn is not None:
+                if first:
+                    self.first_result_times.append(time.perf_counter() - start)
+                    first = False
+                get_thumbnail_cache().prefetch([vn])
+        if vns:
+            get_thumbnail_cache().prefetch(vns)
+            self.history.extend(vns)
+        return bool(vns)
+
+    def export(self) -> bool:
+        self.history.export_csv()
+        self.history.export_json()
+        return True
+
+    def interact(self) -> tuple:
+        """Perform one interaction; returns (action, ok)"""
+        self.toggle_tags()
+        action = self.rng.choices(list(ACTION_WEIGHTS), weights=list(ACTION_WEIGHTS.values()))[0]
+        return action, getattr(self, action)()
+
+
+def upstream_stats(stats_url: str) -> Dict[str, Any]:
+    try:
+        return httpx.get(stats_url, timeout=5.0).json()
+    except Exception:
+        return {}
+
+
+def run_load(sessions: int, duration: float, api_url: str, stats_url: str,
+             think_time: float = 0.5, sample_interval: float = 1.0) -> Dict[str, Any]:
+    """Run `sessions` concurrent virtual sessions for `duration` seconds"""
+    stop = threading.Event()
+    lock = threading.Lock()
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors = defaultdict(int)
+    rss_samples = []
+
+    def session_loop(session_num: int):
+        session = VirtualSession(session_num, api_url)
+        # Stagger session start like users arriving
+        stop.wait(session.rng.uniform(0, think_time))
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                action, ok = session.interact()
+            except Exception:
+                action, ok = "exception", False
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies[action].append(elapsed)
+                if not ok:
+                    errors[action] += 1
+                latencies["search_first_result"].extend(session.first_result_times)
+            session.first_result_times.clear()
+            stop.wait(session.rng.expovariate(1 / think_time) if think_time else 0)
+
+    def sample_rss():
+        started = time.perf_counter()
+        while not stop.is_set():
+            rss_samples.append((time.perf_counter() - started, current_rss_bytes()))
+            stop.wait(sample_interval)
+
+    upstream_before = upstream_stats(stats_url)
+    threads = [threading.Thread(target=session_loop, args=(i,), daemon=True) for i in range(sessions)]
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=60)
+    elapsed = time.perf_counter() - started
+    sampler.join(timeout=5)
+    upstream_after = upstream_stats(stats_url)
+
+    # Time to first result is part of a search interaction, not an interaction of its own
+    all_latencies = sorted(value for action, values in latencies.items()
+                           if action != "search_first_result" for value in values)
+    total = len(all_latencies)
+
+    def pct(values, q):
+        return values[min(len(values) - 1, max(0, round(q * len(values)) - 1))] if values else 0.0
+
+    per_action = {
+        action: {
+            "count": len(values),
+            "errors": errors.get(action, 0),
+            "p50": pct(sorted(values), 0.50),
+            "p95": pct(sorted(values), 0.95),
+            "p99": pct(sorted(values), 0.99),
+        }
+        for action, values in latencies.items()
+    }
+    return {
+        "sessions": sessions,
+        "interactions": total,
+        "throughput": total / elapsed if elapsed else 0.0,
+        "error_rate": sum(errors.values()) / total if total else 0.0,
+        "mean": statistics.fmean(all_latencies) if all_latencies else 0.0,
+        "p50": pct(all_latencies, 0.50),
+        "p95": pct(all_latencies, 0.95),
+        "p99": pct(all_latencies, 0.99),
+        "upstream_requests": upstream_after.get("requests", 0) - upstream_before.get("requests", 0),
+        "upstream_image_requests": (upstream_after.get("image_requests", 0)
+                                    - upstream_before.get("image_requests", 0)),
+        "rss_samples": rss_samples,
+        "per_action": per_action,
+    }
+
+
+def start_stub(port: int, latency: float, jitter: float) -> subprocess.Popen:
+    """Start the stub VNDB server in a separate process and wait until it answers"""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.stub_vndb", "--port", str(port),
+         "--latency", str(latency), "--jitter", str(jitter)],
+        cwd=str(Path(__file__).resolve().parent.parent),
+    )
+    stats_url = f"http://127.0.0.1:{port}/stats"
+    for _ in range(100):
+        if process.poll() is not None:
+            raise RuntimeError("stub VNDB server exited during startup")
+        if upstream_stats(stats_url):
+            return process
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("stub VNDB server did not start")
+
+
+def print_result(result: Dict[str, Any], show_actions: bool = True):
+    rss = [value for _, value in result["rss_samples"]] or [0]
+    print(f"sessions={result['sessions']:<4} throughput={result['throughput']:7.1f}/s "
+          f"p50={result['p50'] * 1000:7.1f}ms p95={result['p95'] * 1000:7.1f}ms p99={result['p99'] * 1000:7.1f}ms "
+          f"errors={result['error_rate']:.1%} upstream_req={result['upstream_requests']} "
+          f"images={result['upstream_image_requests']} rss={rss[-1] / 2**20:.0f}MiB (max {max(rss) / 2**20:.0f}MiB)")
+    if show_actions:
+        for action, stats in sorted(result["per_action"].items()):
+            print(f"    {action:<17} n={stats['count']:<6} errors={stats['errors']:<4} "
+                  f"p50={stats['p50'] * 1000:7.1f}ms p95={stats['p95'] * 1000:7.1f}ms p99={stats['p99'] * 1000:7.1f}ms")
+
+
+def print_rss_timeline(result: Dict[str, Any]):
+    print("    RSS over time:")
+    for elapsed, value in result["rss_samples"]:
+        print(f"      t={elapsed:6.1f}s rss={value / 2**20:7.1f}MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="Concurrent virtual sessions")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per run")
+    parser.add_argument("--think-time", type=float, default=0.5, help="Mean pause between interactions (s)")
+    parser.add_argument("--ramp", help="Comma-separated session counts to step through, e.g. 1,5,10,25,50")
+    parser.add_argument("--step-duration", type=float, default=15.0, help="Seconds per ramp step")
+    parser.add_argument("--max-p95", type=float, default=2.0, help="Ramp stops once p95 exceeds this (s)")
+    parser.add_argument("--max-error-rate", type=float, default=0.05, help="Ramp stops above this error rate")
+    parser.add_argument("--upstream", help="Base URL of an already running stub (default: start one)")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the auto-started stub")
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub upstream latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Stub upstream latency jitter (s)")
+    parser.add_argument("--rss-timeline", action="store_true", help="Print every RSS sample")
+    args = parser.parse_args()
+
+    stub: Optional[subprocess.Popen] = None
+    base_url = args.upstream
+    if not base_url:
+        stub = start_stub(args.port, args.latency, args.jitter)
+        base_url = f"http://127.0.0.1:{args.port}"
+    api_url = f"{base_url.rstrip('/')}/kana/vn"
+    stats_url = f"{base_url.rstrip('/')}/stats"
+
+    try:
+        if args.ramp:
+            healthy = None
+            for sessions in [int(step) for step in args.ramp.split(",")]:
+                result = run_load(sessions, args.step_duration, api_url, stats_url, args.think_time)
+                print_result(result, show_actions=False)
+                if result["p95"] > args.max_p95 or result["error_rate"] > args.max_error_rate:
+                    print(f"Latency breaks down at {sessions} sessions "
+                          f"(p95 {result['p95']:.2f}s, errors {result['error_rate']:.1%}); "
+                          f"last healthy step: {healthy or 'none'}")
+                    break
+                healthy = sessions
+            else:
+                print(f"No breakdown up to {healthy} sessions")
+        else:
+            result = run_load(args.sessions, args.duration, api_url, stats_url, args.think_time)
+            print_result(result)
+            if args.rss_timeline:
+                print_rss_timeline(result)
+    finally:
+        if stub is not None:
+            stub.terminate()
+            stub.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""A replayable stand-in for the Kana /vn endpoint"""
+import asyncio
+import json
+import random
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.synthetic import make_results
+
+
+class MockVNDB:
+    """
+    Serve Kana-style /vn responses from a fixed pool of VNs
+
+    The pool is either loaded from a recorded response file (a Kana response
+    body or a plain list of VN dicts) or generated synthetically with the
+    given NSFW ratio. Requests honour "results" and "page" like the real API,
+    capped at page_size, and are delayed by latency (+/- jitter) seconds.
+    """
+
+    def __init__(self, pool_size: int = 1000, page_size: int = 100, nsfw_ratio: float = 0.1,
+                 latency: float = 0.0, jitter: float = 0.0, recorded: Optional[str] = None,
+                 seed: int = 0):
+        if recorded:
+            with open(recorded, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.pool: List[Dict[str, Any]] = data["results"] if isinstance(data, dict) else data
+        else:
+            self.pool = make_results(pool_size, nsfw_ratio, seed=seed)
+        self.page_size = page_size
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self.bytes_served = 0
+        self._rng = random.Random(seed)
+        self._bodies: Dict[tuple, bytes] = {}
+
+    def body_for(self, payload: Dict[str, Any]) -> bytes:
+        """Return the (cached) response body for a request payload"""
+        count = min(int(payload.get("results", 10)), self.page_size)
+        page = max(int(payload.get("page", 1)), 1)
+        key = (count, page)
+        body = self._bodies.get(key)
+        if body is None:
+            start = (page - 1) * count
+            results = self.pool[start:start + count]
+            more = start + count < len(self.pool)
+            body = self._bodies[key] = json.dumps({"results": results, "more": more}).encode("utf-8")
+        return body
+
+    async def respond(self, payload: Dict[str, Any]) -> bytes:
+        """Count the request, wait the simulated latency and return the body"""
+        self.requests += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter)))
+        body = self.body_for(payload)
+        self.bytes_served += len(body)
+        return body
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        body = await self.respond(json.loads(request.content or b"{}"))
+        return httpx.Response(200, content=body, headers={"content-type": "application/json"})
+
+    def transport(self) -> httpx.MockTransport:
+        return httpx.MockTransport(self.handle)
+
+    def client(self) -> httpx.AsyncClient:
+        """An AsyncClient whose requests are all answered by this mock"""
+        return httpx.AsyncClient(transport=self.transport())
@@ -0,0 +1,101 @@
+"""
+Measure per-session memory of the fetched-VN history
+
+Compares the old representation (a plain list of freshly built dicts that grows
+forever, duplicates included) against VNHistory holding shared VNRecord
+instances. Run from the repository root:
+
+    python -m benchmarks.session_memory --sessions 50 --picks 300
+"""
+import argparse
+import gc
+import random
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.synthetic import make_raw_vn
+from vn_record import VNHistory, get_or_create_record
+
+def old_format(vn: dict) -> dict:
+    """Copy of the previous VNDBFetcher.format_vn_info (fresh dict per call)"""
+    formatted = {
+        'title': vn.get('title', 'Unknown'),
+        'id': vn.get('id', 'Unknown'),
+        'rating': vn.get('rating', 0) / 10,
+        'votes': vn.get('votecount', 0),
+        'released': vn.get('released', 'Unknown'),
+        'languages': list(vn.get('languages', [])),
+        'description': vn.get('description', 'No description available'),
+        'image_url': vn['image']['url'],
+        'tags': [tag.get("name", "Unknown") for tag in vn.get("tags", [])[:15]],
+    }
+    # Strings decoded from separate JSON responses are distinct objects
+    formatted['description'] = "".join(list(formatted['description']))
+    formatted['tags'] = ["".join(list(tag)) for tag in formatted['tags']]
+    return formatted
+
+
+def new_format(vn: dict):
+    return get_or_create_record(
+        id=vn['id'],
+        title=vn['title'],
+        rating=vn['rating'] / 10,
+        votes=vn['votecount'],
+        released=vn['released'],
+        languages=vn['languages'],
+        description="".join(list(vn['description'])),
+        image_url=vn['image']['url'],
+        tags=["".join(list(tag['name'])) for tag in vn['tags'][:15]],
+    )
+
+
+def measure(build_session, sessions: int) -> int:
+    """Return traced bytes held by `sessions` session histories"""
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    held = [build_session(i) for i in range(sessions)]
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return current - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50, help="Number of simulated sessions")
+    parser.add_argument("--picks", type=int, default=300, help="VNs appended per session")
+    parser.add_argument("--pool", type=int, default=400, help="Distinct VN IDs to pick from")
+    parser.add_argument("--maxlen", type=int, default=200, help="VNHistory capacity")
+    args = parser.parse_args()
+
+    raw_pool = [make_raw_vn(i) for i in range(1, args.pool + 1)]
+
+    def picks(session_num):
+        rng = random.Random(session_num)
+        return [rng.choice(raw_pool) for _ in range(args.picks)]
+
+    def old_session(session_num):
+        return [old_format(vn) for vn in picks(session_num)]
+
+    def new_session(session_num):
+        history = VNHistory(maxlen=args.maxlen)
+        history.extend(new_format(vn) for vn in picks(session_num))
+        return history
+
+    old_bytes = measure(old_session, args.sessions)
+    new_bytes = measure(new_session, args.sessions)
+
+    print(f"sessions={args.sessions} picks/session={args.picks} pool={args.pool} maxlen={args.maxlen}")
+    print(f"list of dicts : {old_bytes / args.sessions / 1024:10.1f} KiB per session")
+    print(f"VNHistory     : {new_bytes / args.sessions / 1024:10.1f} KiB per session")
+    if new_bytes:
+        print(f"reduction     : {old_bytes / new_bytes:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Cold-start cost of a Streamlit worker: import time and time to first render
+
+Every run happens in a fresh interpreter, so nothing is warm from earlier
+runs. For each run the child process reports how long the app's own modules
+take to import on top of Streamlit, the slowest modules by self import time,
+how long one VNDBFetcher takes to construct (once per session), and the time
+until the first script run of app.py finishes (cold, new process) as well as
+a second session's first render in the same process (warm):
+
+    python -m benchmarks.startup_benchmark --runs 5
+    python -m benchmarks.startup_benchmark --no-bundle    # static data built from source
+
+Renders go through streamlit.testing (AppTest), so no browser or server is
+needed; nothing is fetched from VNDB until a button is pressed.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Modules app.py imports besides Streamlit
+APP_MODULES = ("vndb_fetcher", "async_runtime", "instrumentation", "service_client", "thumbnail_cache",
+               "vn_cards", "vn_record")
+
+CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+import streamlit
+streamlit_s = time.perf_counter() - start
+import httpx
+
+start = time.perf_counter()
+for name in MODULES:
+    __import__(name)
+app_modules_s = time.perf_counter() - start
+
+from vndb_fetcher import VNDBFetcher
+start = time.perf_counter()
+VNDBFetcher()
+fetcher_init_s = time.perf_counter() - start
+
+from streamlit.testing.v1 import AppTest
+renders = []
+for _ in range(2):
+    start = time.perf_counter()
+    at = AppTest.from_file(APP, default_timeout=60)
+    at.run()
+    renders.append(time.perf_counter() - start)
+    if at.exception:
+        raise SystemExit(f"app raised: {at.exception[0].value}")
+
+print(json.dumps({"streamlit_s": streamlit_s, "app_modules_s": app_modules_s,
+                  "fetcher_init_s": fetcher_init_s, "first_render_s": renders[0],
+                  "warm_render_s": renders[1]}))
+"""
+
+
+def _child_env(bundle: bool) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("VN_THUMBNAIL_DIR", tempfile.mkdtemp(prefix="vn_startup_thumbs_"))
+    env.setdefault("VNDB_SHARED_CACHE", os.path.join(tempfile.mkdtemp(prefix="vn_startup_cache_"),
+                                                     "cache.sqlite3"))
+    if not bundle:
+        env["VNDB_STATIC_BUNDLE"] = "off"
+    return env
+
+
+def run_once(bundle: bool) -> Dict[str, Any]:
+    """One fresh interpreter; returns its timings and the slowest app-module imports"""
+    code = f"MODULES = {APP_MODULES!r}\nAPP = {str(ROOT / 'app.py')!r}\n" + CHILD
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                          env=_child_env(bundle), capture_output=True, text=True, timeout=300)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "child failed")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    # -X importtime lines: "import time: <self us> | <cumulative us> | <indented module>"
+    self_times = {}
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "self [us]" not in line:
+            self_us, _, name = line[len("import time:"):].split("|")
+            self_times[name.strip()] = int(self_us)
+    result["self_us"] = self_times
+    return result
+
+
+def summarize(runs: List[Dict[str, Any]]) -> Dict[str, float]:
+    keys = ("streamlit_s", "app_modules_s", "fetcher_init_s", "first_render_s", "warm_render_s")
+    return {key: statistics.median(run[key] for run in runs) for key in keys}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters to start")
+    parser.add_argument("--no-bundle", action="store_true", help="Ignore the static data bundle")
+    parser.add_argument("--top", type=int, default=8, help="Slowest modules to list")
+    args = parser.parse_args()
+
+    runs = [run_once(bundle=not args.no_bundle) for _ in range(args.runs)]
+    result = summarize(runs)
+
+    print(f"runs                 {args.runs} (median, static bundle {'off' if args.no_bundle else 'on'})")
+    print(f"import streamlit     {result['streamlit_s'] * 1000:8.1f} ms")
+    print(f"import app modules   {result['app_modules_s'] * 1000:8.1f} ms")
+    print(f"VNDBFetcher()        {result['fetcher_init_s'] * 1000:8.2f} ms")
+    print(f"first render (cold)  {result['first_render_s'] * 1000:8.1f} ms")
+    print(f"first render (warm)  {result['warm_render_s'] * 1000:8.1f} ms")
+
+    # Slowest imports by self time, averaged over runs
+    totals: Dict[str, float] = {}
+    for run in runs:
+        for name, self_us in run["self_us"].items():
+            totals[name] = totals.get(name, 0) + self_us / len(runs)
+    print("slowest imports (self time)")
+    for name, self_us in sorted(totals.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<40} {self_us / 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Local HTTP stub of the Kana API for load tests
+
+Serves POST /kana/vn from a MockVNDB pool, cover images under /img/<id>.jpg
+(so thumbnail downloads stay local too) and request counters under /stats:
+
+    python -m benchmarks.stub_vndb --port 8765 --latency 0.05
+"""
+import argparse
+import asyncio
+import io
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.mock_vndb import MockVNDB
+from http_server import json_response, start_server, text_response
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+def make_cover(width: int = 600, height: int = 850) -> bytes:
+    """A full-size cover-like JPEG (or opaque bytes of similar size without Pillow)"""
+    if Image is None:
+        return bytes(range(256)) * 400
+    out = io.BytesIO()
+    Image.effect_noise((width, height), 64).convert("RGB").save(out, format="JPEG", quality=90)
+    return out.getvalue()
+
+
+class StubVNDB:
+    """HTTP front-end for MockVNDB"""
+
+    def __init__(self, mock: MockVNDB, base_url: str):
+        self.mock = mock
+        self.cover = make_cover()
+        self.image_requests = 0
+        # Point every cover at this stub instead of the real CDN
+        for vn in mock.pool:
+            vn["image"] = {"url": f"{base_url}/img/{vn['id']}.jpg"}
+
+    async def handle(self, method, path, query, body):
+        if path == "/kana/vn" and method == "POST":
+            payload = json.loads(body or b"{}")
+            return 200, await self.mock.respond(payload), "application/json"
+        if path.startswith("/img/") and method == "GET":
+            self.image_requests += 1
+            return 200, self.cover, "image/jpeg"
+        if path == "/stats":
+            return json_response({
+                "requests": self.mock.requests,
+                "bytes_served": self.mock.bytes_served,
+                "image_requests": self.image_requests,
+            })
+        return text_response("not found", 404)
+
+
+async def serve(host: str, port: int, mock: MockVNDB):
+    stub = StubVNDB(mock, f"http://{host}:{port}")
+    server = await start_server(stub.handle, host, port)
+    print(f"Stub VNDB listening on http://{host}:{port}/kana/vn", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Random +/- latency jitter in seconds")
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--nsfw-ratio", type=float, default=0.1)
+    parser.add_argument("--recorded", help="Replay VNs from a recorded Kana response body (JSON file)")
+    args = parser.parse_args()
+
+    mock = MockVNDB(page_size=args.page_size, nsfw_ratio=args.nsfw_ratio, latency=args.latency,
+                    jitter=args.jitter, recorded=args.recorded)
+    try:
+        asyncio.run(serve(args.host, args.port, mock))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
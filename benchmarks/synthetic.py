@@ -0,0 +1,47 @@
+"""Synthetic Kana API data shared by the benchmark scripts"""
+import json
+import random
+from typing import Any, Dict, List
+
+TAG_POOL = [
+    "Romance", "Mystery", "Drama", "Comedy", "School", "Male Protagonist",
+    "Female Protagonist", "Multiple Endings", "Fantasy", "Science Fiction",
+    "Slice of Life", "Modern Day", "Friendship", "Family", "Horror",
+    "Branching Plot", "Kinetic Novel", "Action", "Thriller", "Past",
+    "No Sexual Content", "Adult Protagonist", "Mature Themes", "Sexual Innuendo",
+]
+
+NSFW_TAG_POOL = ["Sexual Content", "Nukige", "Erotic Scenes", "Hentai"]
+
+
+def make_raw_vn(vn_num: int, nsfw: bool = False, tag_count: int = 25) -> Dict[str, Any]:
+    """Build a Kana-style VN dict like the ones returned by the API"""
+    rng = random.Random(vn_num)
+    tags = [{"name": rng.choice(TAG_POOL)} for _ in range(tag_count)]
+    if nsfw:
+        tags.insert(rng.randrange(len(tags) + 1), {"name": rng.choice(NSFW_TAG_POOL)})
+    return {
+        "id": f"v{vn_num}",
+        "title": f"Visual Novel {vn_num}",
+        "rating": rng.randint(600, 950),
+        "votecount": rng.randint(50, 20000),
+        "released": f"20{rng.randint(0, 24):02d}-01-01",
+        "languages": ["en", "ja"],
+        "description": "A story about " + " ".join(rng.choice(TAG_POOL).lower() for _ in range(120)),
+        "image": {"url": f"https://t.vndb.org/cv/{vn_num % 100}/{vn_num}.jpg"},
+        "tags": tags,
+    }
+
+
+def make_results(count: int, nsfw_ratio: float = 0.1, start: int = 1, seed: int = 0) -> List[Dict[str, Any]]:
+    """Build `count` VNs, roughly nsfw_ratio of them carrying an NSFW tag"""
+    rng = random.Random(seed)
+    return [make_raw_vn(vn_num, nsfw=rng.random() < nsfw_ratio) for vn_num in range(start, start + count)]
+
+
+def make_response_body(count: int, nsfw_ratio: float = 0.1, more: bool = False, **kwargs) -> bytes:
+    """Build a Kana /vn response body"""
+    return json.dumps({
+        "results": make_results(count, nsfw_ratio, **kwargs),
+        "more": more,
+    }).encode("utf-8")
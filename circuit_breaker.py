@@ -0,0 +1,162 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from instrumentation import log_event, registry
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker around the VNDB API, shared by every fetcher in the process
+
+    The outcomes of the last window_size calls are kept; errors, 429/5xx
+    answers and calls slower than slow_call_seconds count as failures. Once at
+    least min_calls are recorded and the failure rate reaches
+    failure_rate_threshold the breaker opens and calls fail fast for
+    open_seconds. It then half-opens and lets up to half_open_probes probe
+    requests through: if they all succeed it closes, any failure opens it again.
+    A probe that reports neither an outcome nor a cancellation within
+    probe_lease_seconds gives its slot back, so a lost probe can't keep the
+    breaker half-open forever.
+    """
+
+    def __init__(self, failure_rate_threshold: float = 0.5, slow_call_seconds: float = 5.0,
+                 window_size: int = 20, min_calls: int = 5, open_seconds: float = 30.0,
+                 half_open_probes: int = 2, probe_lease_seconds: float = 30.0):
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.probe_lease_seconds = probe_lease_seconds
+        self._outcomes = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_succeeded = 0
+        self._probe_leases = deque()  # start times of probes still waiting for an outcome
+        self._lock = threading.Lock()
+        self.times_opened = 0
+        self.rejected = 0
+        self.expired_probes = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_started = 0
+            self._probes_succeeded = 0
+            self._probe_leases.clear()
+            log_event(logging.WARNING, "circuit half-open, probing upstream")
+
+    def _expire_probe_leases(self):
+        now = time.monotonic()
+        while self._probe_leases and now - self._probe_leases[0] >= self.probe_lease_seconds:
+            self._probe_leases.popleft()
+            self._probes_started -= 1
+            self.expired_probes += 1
+            log_event(logging.WARNING, "circuit probe lease expired", lease_seconds=self.probe_lease_seconds)
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.times_opened += 1
+        log_event(logging.WARNING, "circuit opened", open_seconds=self.open_seconds,
+                  recent_failures=self._outcomes.count(False), window=len(self._outcomes))
+
+    def allow(self) -> bool:
+        """Whether a request may go upstream now (a half-open breaker admits probes)"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN:
+                self._expire_probe_leases()
+                if self._probes_started < self.half_open_probes:
+                    self._probes_started += 1
+                    self._probe_leases.append(time.monotonic())
+                    return True
+            self.rejected += 1
+            return False
+
+    def record(self, ok: bool, seconds: Optional[float] = None):
+        """Record the outcome of an allowed call; slow successes count as failures"""
+        if ok and seconds is not None and seconds > self.slow_call_seconds:
+            ok = False
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if self._probe_leases:
+                    self._probe_leases.popleft()
+                if not ok:
+                    self._open()
+                    return
+                self._probes_succeeded += 1
+                if self._probes_succeeded >= self.half_open_probes:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                    log_event(logging.WARNING, "circuit closed, upstream recovered")
+                return
+            if self._state == OPEN:
+                # A call that was in flight when the breaker opened
+                return
+            self._outcomes.append(ok)
+            if len(self._outcomes) >= self.min_calls:
+                failure_rate = self._outcomes.count(False) / len(self._outcomes)
+                if failure_rate >= self.failure_rate_threshold:
+                    self._open()
+
+    def cancel(self):
+        """Release an allowed call that was cancelled before it had an outcome"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probe_leases:
+                self._probe_leases.popleft()
+                self._probes_started -= 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            self._maybe_half_open()
+            return {
+                'state': self._state,
+                'open': int(self._state != CLOSED),
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+                'expired_probes': self.expired_probes,
+                'recent_failure_rate': (self._outcomes.count(False) / len(self._outcomes)
+                                        if self._outcomes else 0.0),
+            }
+
+
+_default_breaker: Optional[CircuitBreaker] = None
+_default_breaker_lock = threading.Lock()
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """
+    Return the process-wide breaker (VNDB_BREAKER_FAILURE_RATE,
+    VNDB_BREAKER_SLOW_SECONDS, VNDB_BREAKER_OPEN_SECONDS, VNDB_BREAKER_PROBE_LEASE)
+    """
+    global _default_breaker
+    if _default_breaker is None:
+        with _default_breaker_lock:
+            if _default_breaker is None:
+                _default_breaker = CircuitBreaker(
+                    failure_rate_threshold=float(os.environ.get("VNDB_BREAKER_FAILURE_RATE", "0.5")),
+                    slow_call_seconds=float(os.environ.get("VNDB_BREAKER_SLOW_SECONDS", "5")),
+                    open_seconds=float(os.environ.get("VNDB_BREAKER_OPEN_SECONDS", "30")),
+                    probe_lease_seconds=float(os.environ.get("VNDB_BREAKER_PROBE_LEASE", "30")),
+                )
+                registry.register_gauges("vndb_circuit_breaker", "VNDB circuit breaker state",
+                                         _default_breaker.metrics)
+    return _default_breaker
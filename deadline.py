@@ -0,0 +1,37 @@
+import time
+from typing import Optional, Union
+
+
+class Deadline:
+    """
+    Absolute time budget for one fetcher call, shared by its pages and retries
+
+    Steps take an equal share of whatever is left, so time a fast page didn't
+    use rolls over to the next one instead of being lost.
+    """
+
+    __slots__ = ("expires_at",)
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    @classmethod
+    def coerce(cls, value: Union["Deadline", float, None]) -> Optional["Deadline"]:
+        """Accept a Deadline, a budget in seconds or None (no deadline)"""
+        if value is None or isinstance(value, Deadline):
+            return value
+        return cls(float(value))
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def share(self, parts: int) -> "Deadline":
+        """A sub-deadline with 1/parts of the remaining budget, for the next of parts steps"""
+        return Deadline(self.remaining() / max(parts, 1))
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.3f}s)"
@@ -0,0 +1,95 @@
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from instrumentation import log_event
+
+# handler(method, path, query, body) -> (status, body, content_type)
+Handler = Callable[[str, str, Dict[str, str], bytes], Awaitable[Tuple[int, bytes, str]]]
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error",
+           503: "Service Unavailable", 504: "Gateway Timeout"}
+
+MAX_BODY_BYTES = 1024 * 1024
+# Idle keep-alive connections are closed after this many seconds
+KEEPALIVE_TIMEOUT = 30.0
+
+
+def json_response(data: Any, status: int = 200) -> Tuple[int, bytes, str]:
+    return status, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json"
+
+
+def text_response(text: str, status: int = 200, content_type: str = "text/plain; charset=utf-8") -> Tuple[int, bytes, str]:
+    return status, text.encode("utf-8"), content_type
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    request_line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+    if not request_line:
+        return None
+    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get("content-length", "0") or 0)
+    if length > MAX_BODY_BYTES:
+        raise ValueError("request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+async def _handle_connection(handler: Handler, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                break
+            except ValueError:
+                status, body, content_type = text_response("bad request", 400)
+                request = None
+                keep_alive = False
+            else:
+                if request is None:
+                    break
+                method, target, headers, request_body = request
+                url = urlsplit(target)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    status, body, content_type = await handler(method, url.path, query, request_body)
+                except Exception as e:
+                    log_event(logging.ERROR, "http handler failed", exc_info=True, path=url.path, error=str(e))
+                    status, body, content_type = text_response("internal error", 500)
+
+            head = (f"HTTP/1.1 {status} {REASONS.get(status, 'OK')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+            writer.write(head.encode("latin-1") + body)
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+
+async def start_server(handler: Handler, host: str = "127.0.0.1", port: int = 8080) -> asyncio.base_events.Server:
+    """
+    Start a minimal HTTP/1.1 server (keep-alive, Content-Length bodies only)
+    that dispatches every request to handler on the running event loop
+    """
+    return await asyncio.start_server(lambda r, w: _handle_connection(handler, r, w), host, port)
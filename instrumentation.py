@@ -0,0 +1,237 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# ---------------------------------------------------------------------------
+# Structured logging
+# ---------------------------------------------------------------------------
+
+logger = logging.getLogger("vndb")
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Render log records as `time level logger event key=value ...`"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = f"{self.formatTime(record)} {record.levelname} {record.name} {record.getMessage()}"
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{key}={value!r}" for key, value in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def configure_logging(level: Optional[str] = None):
+    """
+    Attach a key=value handler to the "vndb" logger
+
+    The level comes from VNDB_LOG_LEVEL (default WARNING), so debug events on
+    the request path cost a single isEnabledFor check in production.
+    """
+    level = (level or os.environ.get("VNDB_LOG_LEVEL", "WARNING")).upper()
+    logger.setLevel(level)
+    if not any(isinstance(handler.formatter, KeyValueFormatter) for handler in logger.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(KeyValueFormatter())
+        logger.addHandler(handler)
+    logger.propagate = False
+
+
+def log_event(level: int, event: str, exc_info: bool = False, **fields):
+    """
+    Log an event with structured fields; does nothing if the level is disabled
+
+    Field values are only formatted by the handler, so pass raw objects rather
+    than pre-built f-strings.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+
+# ---------------------------------------------------------------------------
+# In-process metrics
+# ---------------------------------------------------------------------------
+
+# Latency buckets in seconds, from sub-millisecond CPU stages up to the 30 s timeout
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Payload size buckets in bytes
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _label_str(labels: Tuple[Tuple[str, str], ...], extra: str = "") -> str:
+    parts = [f'{key}="{_escape_label(value)}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing counter with optional labels"""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {_escape_help(self.help)}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """A fixed-bucket histogram (Prometheus semantics) with optional labels"""
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple[Tuple[str, str], ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(sorted(labels.items())))
+        return int(sum(series[:-1])) if series else 0
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        """Approximate quantile (upper bucket bound) for one label set"""
+        series = self._series.get(tuple(sorted(labels.items())))
+        if not series:
+            return None
+        total = sum(series[:-1])
+        running = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), series[:-1]):
+            running += bucket_count
+            if running >= q * total:
+                return bound
+        return float("inf")
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {_escape_help(self.help)}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                running = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), series[:-1]):
+                    running += bucket_count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_label_str(labels, le)} {int(running)}")
+                lines.append(f"{self.name}_sum{_label_str(labels)} {_format_value(series[-1])}")
+                lines.append(f"{self.name}_count{_label_str(labels)} {int(running)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metrics and gauge callbacks and renders them as Prometheus text"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._gauge_callbacks: Dict[str, Tuple[str, Callable[[], Dict[str, float]]]] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str) -> Counter:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, help)
+            return self._metrics[name]
+
+    def histogram(self, name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help, buckets)
+            return self._metrics[name]
+
+    def register_gauges(self, prefix: str, help: str, callback: Callable[[], Dict[str, float]]):
+        """Expose the numeric values returned by callback() as `<prefix>_<key>` gauges"""
+        with self._lock:
+            self._gauge_callbacks[prefix] = (help, callback)
+
+    def render_prometheus(self) -> str:
+        """Return a Prometheus text-format snapshot of every metric"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+            gauges = list(self._gauge_callbacks.items())
+        for metric in metrics:
+            lines.extend(metric.render())
+        for prefix, (help, callback) in gauges:
+            try:
+                values = callback()
+            except Exception:
+                continue
+            for key, value in values.items():
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = f"{prefix}_{key}"
+                lines.append(f"# HELP {name} {_escape_help(help)}")
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "vndb_stage_seconds", "Time spent per fetcher stage (filter_build, network, decode, format, safety)")
+payload_bytes = registry.histogram(
+    "vndb_response_bytes", "Size of VNDB API response bodies", SIZE_BUCKETS)
+requests_total = registry.counter(
+    "vndb_requests_total", "VNDB API requests by operation and outcome")
+rejections_total = registry.counter(
+    "vndb_rejected_total", "VNs dropped by the SFW filter, by reason")
+first_result_seconds = registry.histogram(
+    "vndb_time_to_first_result_seconds", "Time from the start of a query until its first safe VN is ready")
+
+
+@contextmanager
+def time_stage(stage: str, operation: str):
+    """Record the wall time of a block in vndb_stage_seconds"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=stage, operation=operation)
+
+
+def render_prometheus() -> str:
+    return registry.render_prometheus()
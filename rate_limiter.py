@@ -0,0 +1,90 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from instrumentation import registry
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter shared by every fetcher in the process
+
+    VNDB allows roughly 200 requests per 5 minutes per client IP, so all
+    sessions have to draw from the same bucket rather than each keeping their
+    own budget.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.total_wait = 0.0
+        self.acquired = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available right now"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.acquired += 1
+                return True
+            return False
+
+    async def acquire(self) -> float:
+        """Wait for a token; returns the seconds spent waiting"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.acquired += 1
+                    self.total_wait += waited
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            await asyncio.sleep(delay)
+            waited += delay
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            'tokens_available': self.available,
+            'acquired': self.acquired,
+            'total_wait_seconds': self.total_wait,
+        }
+
+
+_default_limiter: Optional[TokenBucket] = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> TokenBucket:
+    """
+    Return the process-wide limiter (VNDB_RATE_LIMIT requests/second,
+    VNDB_RATE_BURST burst size)
+    """
+    global _default_limiter
+    if _default_limiter is None:
+        with _default_limiter_lock:
+            if _default_limiter is None:
+                rate = float(os.environ.get("VNDB_RATE_LIMIT", str(200 / 300)))
+                burst = float(os.environ.get("VNDB_RATE_BURST", "20"))
+                _default_limiter = TokenBucket(rate, burst)
+                registry.register_gauges("vndb_rate_limiter", "Shared VNDB rate limiter statistics",
+                                         _default_limiter.metrics)
+    return _default_limiter
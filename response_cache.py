@@ -0,0 +1,247 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from instrumentation import log_event, registry
+
+
+def cache_key(payload: Dict[str, Any]) -> str:
+    """Canonical key for a Kana query payload (key order and whitespace don't matter)"""
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+class StaleResponse(dict):
+    """Copy of a cached response served past its TTL while VNDB is failing (marked by .stale)"""
+    stale = True
+
+
+class ResponseCache:
+    """
+    In-process LRU of decoded Kana responses with a TTL, shared by all sessions
+
+    Concurrent misses for the same key on the same event loop are coalesced
+    into a single upstream request (single-flight). Entries past their TTL
+    but younger than ttl + stale_ttl are still served while a background
+    refresh replaces them (stale-while-revalidate), so a slow or unavailable
+    VNDB doesn't stall callers that have been answered before. They are
+    marked as a StaleResponse only while VNDB is failing: when the caller says
+    so (degraded) or the last refresh of the key failed. Cached values are
+    shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 300.0, stale_ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = {}
+        self._refreshing: Set[str] = set()
+        # Keys whose last background refresh raised or got no answer
+        self._failed_refreshes: Set[str] = set()
+        self._refresh_tasks: Set[asyncio.Task] = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+
+    def _lookup(self, key: str) -> Optional[Tuple[Any, bool]]:
+        """Return (value, stale) for key, or None if absent or too old to serve"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            age = time.monotonic() - stored_at
+            if age > self.ttl + self.stale_ttl:
+                del self._entries[key]
+                self._failed_refreshes.discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return value, age > self.ttl
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the fresh value for key, if any"""
+        entry = self._lookup(key)
+        if entry is None or entry[1]:
+            return None
+        return entry[0]
+
+    def set(self, key: str, value: Any, age: float = 0.0):
+        """Store value as fetched age seconds ago (e.g. read back from the shared cache)"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() - age, value)
+            self._entries.move_to_end(key)
+            self._failed_refreshes.discard(key)
+            while len(self._entries) > self.max_entries:
+                self._failed_refreshes.discard(self._entries.popitem(last=False)[0])
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]],
+                           degraded: bool = False) -> Any:
+        """
+        Return the cached value for key, or run fetch() once for all concurrent
+        callers; None results (errors) are not cached
+
+        An entry past its TTL is returned immediately and refreshed by a
+        background fetch(). Dict values are marked as a StaleResponse if
+        degraded is set (e.g. the circuit breaker isn't closed) or the last
+        refresh of the key failed.
+        """
+        entry = self._lookup(key)
+        if entry is not None:
+            value, stale = entry
+            if not stale:
+                self.hits += 1
+                return value
+            self.stale_hits += 1
+            self._start_refresh(key, fetch)
+            if isinstance(value, dict) and (degraded or key in self._failed_refreshes):
+                return StaleResponse(value)
+            return value
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            inflight = self._inflight.get(key)
+            if inflight is not None and inflight[0] is loop:
+                self.coalesced += 1
+                future = inflight[1]
+            else:
+                future = None
+                self.misses += 1
+                own_future = loop.create_future()
+                self._inflight[key] = (loop, own_future)
+
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # If the owner was cancelled (e.g. its caller's deadline passed)
+                # rather than this caller, take over the fetch
+                task = asyncio.current_task()
+                if future.cancelled() and not getattr(task, "cancelling", lambda: 0)():
+                    return await self.get_or_fetch(key, fetch, degraded)
+                raise
+
+        try:
+            value = await fetch()
+        except asyncio.CancelledError:
+            own_future.cancel()
+            raise
+        except Exception as e:
+            own_future.set_exception(e)
+            # Waiters get the exception; don't warn if nobody was waiting
+            own_future.exception()
+            raise
+        else:
+            own_future.set_result(value)
+            if value is not None:
+                self.set(key, value, getattr(value, "age", 0.0))
+            return value
+        finally:
+            with self._lock:
+                if self._inflight.get(key, (None, None))[1] is own_future:
+                    del self._inflight[key]
+
+    def _start_refresh(self, key: str, fetch: Callable[[], Awaitable[Any]]):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        task = asyncio.get_running_loop().create_task(self._refresh(key, fetch))
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    async def _refresh(self, key: str, fetch: Callable[[], Awaitable[Any]]):
+        try:
+            value = await fetch()
+            if value is not None:
+                self.set(key, value, getattr(value, "age", 0.0))
+                self.refreshes += 1
+            else:
+                with self._lock:
+                    self._failed_refreshes.add(key)
+        except Exception as e:
+            # The stale entry keeps being served, marked stale, until it ages out
+            with self._lock:
+                self._failed_refreshes.add(key)
+            log_event(logging.WARNING, "background refresh failed", error=str(e))
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """(key, value) of every entry that can still be served, oldest first"""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value) for key, (stored_at, value) in self._entries.items()
+                    if now - stored_at <= self.ttl + self.stale_ttl]
+
+    def seed(self, items: Iterable[Tuple[str, Any]]) -> int:
+        """
+        Add entries of unknown age (e.g. a snapshot shipped with the app) as
+        already stale, so the first lookup is answered from them while it
+        fetches a fresh copy; keys already cached are left alone
+        """
+        if self.max_entries <= 0:
+            return 0
+        # Just past the TTL: served stale from the first lookup on
+        stored_at = time.monotonic() - self.ttl - 1.0
+        added = 0
+        with self._lock:
+            for key, value in items:
+                if key not in self._entries:
+                    self._entries[key] = (stored_at, value)
+                    self._entries.move_to_end(key, last=False)
+                    added += 1
+            while len(self._entries) > self.max_entries:
+                self._failed_refreshes.discard(self._entries.popitem(last=False)[0])
+        return added
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._failed_refreshes.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced + self.stale_hits
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'stale_hits': self.stale_hits,
+            'refreshes': self.refreshes,
+            'hit_rate': (self.hits + self.coalesced + self.stale_hits) / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+        }
+
+
+_default_cache: Optional[ResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    Return the process-wide response cache (VNDB_CACHE_ENTRIES entries,
+    VNDB_CACHE_TTL seconds, served stale for up to VNDB_CACHE_STALE_TTL more)
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = ResponseCache(
+                    max_entries=int(os.environ.get("VNDB_CACHE_ENTRIES", "512")),
+                    ttl=float(os.environ.get("VNDB_CACHE_TTL", "300")),
+                    stale_ttl=float(os.environ.get("VNDB_CACHE_STALE_TTL", "3600")),
+                )
+                registry.register_gauges("vndb_response_cache", "Shared VNDB response cache statistics",
+                                         _default_cache.metrics)
+    return _default_cache
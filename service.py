@@ -0,0 +1,315 @@
+"""
+Headless JSON API for the VN recommender
+
+Runs VNDBFetcher on a single asyncio event loop, sharing the pooled HTTP
+client, response cache and rate limiter across every request:
+
+    python service.py --host 0.0.0.0 --port 8600
+
+Endpoints:
+    GET  /health                       liveness plus cache/limiter state
+    GET  /metrics                      Prometheus text snapshot
+    GET  /tags                         tag categories
+    GET  /search?q=...                 search_vns_by_query
+    POST /vns/by-tags                  fetch_vns_by_tags (JSON body with the same arguments)
+    GET  /vns/popular                  fetch_popular_vns
+    GET  /vns/<id>                     fetch_vn_by_id (e.g. /vns/v17)
+    POST /vns/random                   fetch_random_vn_with_tags if tags are given, else fetch_random_vn
+    POST /vns/batch                    fetch_many ({"queries": [spec, ...], "concurrency": 4})
+
+Invalid parameters answer 400. When VNDB fails (error status, network error
+or open circuit breaker) the answer is 503; a single VN that isn't fetched
+within its deadline is 504. Batch queries report these per query instead.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+import async_runtime
+from http_server import json_response, start_server, text_response
+from instrumentation import configure_logging, log_event, registry, render_prometheus
+from vn_record import VNRecord
+from vndb_fetcher import UpstreamError, VNDBFetcher
+
+service_requests = registry.histogram("vn_service_request_seconds", "Headless service request latency")
+
+# Upper bound on queries in one /vns/batch request
+MAX_BATCH_QUERIES = 50
+
+
+class BadRequest(ValueError):
+    """Raised for invalid request parameters (answered with HTTP 400)"""
+
+
+def _int_param(params: Dict[str, Any], name: str, default: int, low: int, high: int) -> int:
+    value = params.get(name, default)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f"{name} must be an integer")
+    if not low <= value <= high:
+        raise BadRequest(f"{name} must be between {low} and {high}")
+    return value
+
+
+def _bool_param(params: Dict[str, Any], name: str, default: bool) -> bool:
+    value = params.get(name, default)
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+
+def _choice_param(params: Dict[str, Any], name: str, default: str, choices: tuple) -> str:
+    value = params.get(name, default)
+    if value not in choices:
+        raise BadRequest(f"{name} must be {', '.join(choices[:-1])} or {choices[-1]}")
+    return value
+
+
+def _deadline_param(params: Dict[str, Any]) -> Optional[float]:
+    """Optional time budget in seconds for the whole call"""
+    value = params.get("deadline")
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise BadRequest("deadline must be a number of seconds")
+    if not 0 < value <= 120:
+        raise BadRequest("deadline must be between 0 and 120 seconds")
+    return value
+
+
+def _tag_list(params: Dict[str, Any], name: str) -> Optional[list]:
+    value = params.get(name)
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = [tag.strip() for tag in value.split(",") if tag.strip()]
+    if not isinstance(value, list) or not all(isinstance(tag, str) for tag in value):
+        raise BadRequest(f"{name} must be a list of tag names")
+    return value or None
+
+
+def _results_response(results):
+    """
+    JSON body for a list of VNs; stale marks results served from an expired
+    cache entry, partial ones cut short by the deadline
+    """
+    return json_response({"results": [vn.to_dict() for vn in results],
+                          "stale": getattr(results, "stale", False),
+                          "partial": getattr(results, "partial", False)})
+
+
+def _batch_answer(item) -> Dict[str, Any]:
+    """JSON entry for one fetch_many BatchResult"""
+    if item.error is not None:
+        return {"error": str(item.error) or type(item.error).__name__}
+    if item.result is None or isinstance(item.result, VNRecord):
+        return {"result": item.result.to_dict() if item.result else None}
+    return {"results": [vn.to_dict() for vn in item.result],
+            "stale": getattr(item.result, "stale", False),
+            "partial": getattr(item.result, "partial", False)}
+
+
+class RecommenderService:
+    """Maps HTTP requests onto a shared VNDBFetcher"""
+
+    def __init__(self, fetcher: Optional[VNDBFetcher] = None):
+        self.fetcher = fetcher or VNDBFetcher()
+        self.started_at = time.time()
+
+    async def handle(self, method: str, path: str, query: Dict[str, str], body: bytes):
+        start = time.perf_counter()
+        route = path.rstrip("/") or "/"
+        try:
+            params = dict(query)
+            if body:
+                try:
+                    data = json.loads(body)
+                except ValueError:
+                    raise BadRequest("request body must be JSON")
+                if not isinstance(data, dict):
+                    raise BadRequest("request body must be a JSON object")
+                params.update(data)
+            return await self.dispatch(method, route, params)
+        except BadRequest as e:
+            return json_response({"error": str(e)}, 400)
+        except (UpstreamError, httpx.HTTPError) as e:
+            log_event(logging.WARNING, "upstream failed", route=route, error=str(e) or type(e).__name__)
+            return json_response({"error": f"VNDB unavailable: {str(e) or type(e).__name__}"}, 503)
+        except asyncio.TimeoutError:
+            return json_response({"error": "VNDB didn't answer within the deadline"}, 504)
+        finally:
+            service_requests.observe(time.perf_counter() - start, route=route)
+
+    async def dispatch(self, method: str, route: str, params: Dict[str, Any]):
+        # The fetcher's underscored methods raise on upstream failures instead
+        # of answering with no VNs, so they can be told apart from empty results
+        fetcher = self.fetcher
+
+        if route == "/health":
+            return json_response({
+                "status": "ok",
+                "uptime_seconds": round(time.time() - self.started_at, 1),
+                "cache": fetcher.cache.metrics() if fetcher.cache else None,
+                "rate_limiter": fetcher.rate_limiter.metrics() if fetcher.rate_limiter else None,
+                "shared_cache": fetcher.shared_cache.metrics() if fetcher.shared_cache else None,
+                "circuit_breaker": fetcher.circuit_breaker.metrics() if fetcher.circuit_breaker else None,
+            })
+
+        if route == "/metrics":
+            return text_response(render_prometheus(), content_type="text/plain; version=0.0.4")
+
+        if route == "/tags":
+            return json_response({"tags": fetcher.get_available_tags()})
+
+        if route == "/search":
+            search_query = params.get("q") or params.get("query")
+            if not search_query:
+                raise BadRequest("q is required")
+            results = await fetcher._search_vns_by_query(
+                search_query,
+                max_results=_int_param(params, "max_results", 10, 1, 50),
+                min_rating=_int_param(params, "min_rating", 60, 0, 100),
+                min_votes=_int_param(params, "min_votes", 50, 0, 1000000),
+                strict_filtering=_bool_param(params, "strict_filtering", True),
+                deadline=_deadline_param(params)
+            )
+            return _results_response(results)
+
+        if route == "/vns/by-tags":
+            if method != "POST":
+                return json_response({"error": "use POST"}, 405)
+            required_tags = _tag_list(params, "required_tags")
+            excluded_tags = _tag_list(params, "excluded_tags")
+            if not required_tags and not excluded_tags:
+                raise BadRequest("at least one of required_tags or excluded_tags is required")
+            sort_by = _choice_param(params, "sort_by", "rating", ("rating", "votecount", "released"))
+            tag_logic = _choice_param(params, "tag_logic", "any", ("any", "all"))
+            results = await fetcher._fetch_vns_by_tags(
+                required_tags=required_tags,
+                excluded_tags=excluded_tags,
+                max_results=_int_param(params, "max_results", 10, 1, 50),
+                min_rating=_int_param(params, "min_rating", 60, 0, 100),
+                min_votes=_int_param(params, "min_votes", 50, 0, 1000000),
+                strict_filtering=_bool_param(params, "strict_filtering", True),
+                sort_by=sort_by,
+                tag_logic=tag_logic,
+                deadline=_deadline_param(params)
+            )
+            return _results_response(results)
+
+        if route == "/vns/popular":
+            results = await fetcher._fetch_popular_vns(
+                max_results=_int_param(params, "max_results", 10, 1, 50),
+                min_rating=_int_param(params, "min_rating", 70, 0, 100),
+                min_votes=_int_param(params, "min_votes", 100, 0, 1000000),
+                strict_filtering=_bool_param(params, "strict_filtering", True),
+                deadline=_deadline_param(params)
+            )
+            return _results_response(results)
+
+        if route == "/vns/random":
+            if method != "POST":
+                return json_response({"error": "use POST"}, 405)
+            required_tags = _tag_list(params, "required_tags")
+            excluded_tags = _tag_list(params, "excluded_tags")
+            strict_filtering = _bool_param(params, "strict_filtering", True)
+            min_rating = _int_param(params, "min_rating", 60, 0, 100)
+            if required_tags or excluded_tags:
+                vn = await fetcher._fetch_random_vn_with_tags(
+                    required_tags=required_tags,
+                    excluded_tags=excluded_tags,
+                    strict_filtering=strict_filtering,
+                    min_rating=min_rating,
+                    min_votes=_int_param(params, "min_votes", 50, 0, 1000000),
+                    tag_logic=_choice_param(params, "tag_logic", "any", ("any", "all")),
+                    deadline=_deadline_param(params)
+                )
+            else:
+                vn = await fetcher._fetch_random_vn(
+                    strict_filtering=strict_filtering,
+                    min_rating=min_rating,
+                    min_votes=_int_param(params, "min_votes", 100, 0, 1000000),
+                    deadline=_deadline_param(params)
+                )
+            return json_response({"result": vn.to_dict() if vn else None})
+
+        if route == "/vns/batch":
+            if method != "POST":
+                return json_response({"error": "use POST"}, 405)
+            queries = params.get("queries")
+            if not isinstance(queries, list) or not queries:
+                raise BadRequest("queries must be a non-empty list of query specs")
+            if len(queries) > MAX_BATCH_QUERIES:
+                raise BadRequest(f"at most {MAX_BATCH_QUERIES} queries per batch")
+            concurrency = _int_param(params, "concurrency", 4, 1, 16)
+            deadline = _deadline_param(params)
+
+            # A bad spec only fails its own answer; the caller's dicts are left as they are
+            answers = [None] * len(queries)
+            specs, positions = [], []
+            for index, spec in enumerate(queries):
+                if isinstance(spec, dict) and "max_results" in spec:
+                    try:
+                        spec = dict(spec, max_results=_int_param(spec, "max_results", 10, 1, 50))
+                    except BadRequest as e:
+                        answers[index] = {"error": str(e)}
+                        continue
+                specs.append(spec)
+                positions.append(index)
+
+            if specs:
+                async for item in fetcher.fetch_many(specs, concurrency=concurrency, deadline=deadline):
+                    answer = _batch_answer(item)
+                    for index in item.indices:
+                        answers[positions[index]] = answer
+            return json_response({"answers": answers})
+
+        if route.startswith("/vns/"):
+            vn_id = route[len("/vns/"):]
+            if not (vn_id[:1] == "v" and vn_id[1:].isdigit()):
+                raise BadRequest("VN IDs look like v17")
+            vn = await fetcher._fetch_vn_by_id(vn_id,
+                                               strict_filtering=_bool_param(params, "strict_filtering", True),
+                                               deadline=_deadline_param(params))
+            if vn is None:
+                return json_response({"error": f"{vn_id} not found"}, 404)
+            return json_response({"result": vn.to_dict()})
+
+        return json_response({"error": f"no route for {route}"}, 404)
+
+
+async def serve(host: str, port: int):
+    # This loop becomes the shared loop, so the pooled client, response cache
+    # single-flight and thumbnail downloads all run here
+    async_runtime.use_current_loop()
+    service = RecommenderService()
+    server = await start_server(service.handle, host, port)
+    log_event(logging.WARNING, "service listening", host=host, port=port)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--log-level", default=None, help="Overrides VNDB_LOG_LEVEL")
+    args = parser.parse_args()
+
+    configure_logging(args.log_level)
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+
+from async_runtime import shared_client
+from vn_record import VNRecord, VNResults, get_or_create_record
+
+
+def _to_record(data: Dict[str, Any]) -> VNRecord:
+    fields = dict(data)
+    return get_or_create_record(fields.pop('id'), **fields)
+
+
+def _to_results(data: Dict[str, Any]) -> VNResults:
+    return VNResults((_to_record(vn) for vn in data["results"]), stale=data.get("stale", False),
+                     partial=data.get("partial", False))
+
+
+class ServiceFetcher:
+    """
+    Thin client for the headless service (service.py) with the same async
+    interface app.py uses on VNDBFetcher, so several Streamlit replicas can
+    share one service's cache and rate limiter
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self._tags: Optional[Dict[str, List[str]]] = None
+
+    async def _call(self, method: str, path: str, **kwargs) -> Dict[str, Any]:
+        # The service enforces a request's deadline; allow a little extra for the round trip
+        deadline = (kwargs.get("json") or kwargs.get("params") or {}).get("deadline")
+        if deadline is not None:
+            kwargs["timeout"] = float(deadline) + 2.0
+        async with shared_client() as client:
+            response = await client.request(method, f"{self.base_url}{path}", **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def get_available_tags(self) -> Dict[str, List[str]]:
+        if self._tags is None:
+            response = httpx.get(f"{self.base_url}/tags", timeout=10.0)
+            response.raise_for_status()
+            self._tags = response.json()["tags"]
+        return self._tags
+
+    async def search_vns_by_query(self, query: str, **kwargs) -> VNResults:
+        data = await self._call("GET", "/search", params={"q": query, **kwargs})
+        return _to_results(data)
+
+    async def fetch_vns_by_tags(self, **kwargs) -> VNResults:
+        data = await self._call("POST", "/vns/by-tags", json=kwargs)
+        return _to_results(data)
+
+    async def stream_vns_by_tags(self, results: Optional[VNResults] = None, **kwargs) -> AsyncIterator[VNRecord]:
+        """The service answers in one response, so VNs are yielded once it arrives"""
+        found = await self.fetch_vns_by_tags(**kwargs)
+        if results is not None:
+            results.stale, results.partial = found.stale, found.partial
+        for vn in found:
+            if results is not None:
+                results.append(vn)
+            yield vn
+
+    async def fetch_popular_vns(self, **kwargs) -> VNResults:
+        data = await self._call("GET", "/vns/popular", params=kwargs)
+        return _to_results(data)
+
+    async def fetch_random_vn_with_tags(self, max_attempts: int = 3, **kwargs) -> Optional[VNRecord]:
+        data = await self._call("POST", "/vns/random", json=kwargs)
+        return _to_record(data["result"]) if data["result"] else None
+
+    async def fetch_random_vn(self, max_attempts: int = 200, max_id: int = 1000, **kwargs) -> Optional[VNRecord]:
+        data = await self._call("POST", "/vns/random", json=kwargs)
+        return _to_record(data["result"]) if data["result"] else None
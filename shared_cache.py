@@ -0,0 +1,390 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from instrumentation import log_event, registry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Bumped whenever the tables change; older caches are dropped and recreated
+SCHEMA_VERSION = 2
+
+# The value BLOB goes last: SQLite reads a row's columns in order, so the
+# bookkeeping columns don't pull in its overflow pages. The (last_access, size)
+# indexes cover SUM(size) and the eviction scan without touching the rows.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    value BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    stored_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    value BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS locks (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access, size);
+CREATE INDEX IF NOT EXISTS records_last_access ON records (last_access, size);
+"""
+
+# Reads only refresh last_access when it is older than this, to keep readers from writing
+ACCESS_REFRESH_SECONDS = 60.0
+# Size-bound eviction runs after this many writes
+EVICT_EVERY_WRITES = 50
+# Slack on top of the worst-case fetch time for a lock holder (429 back-off, SQLite writes)
+LOCK_TTL_MARGIN_SECONDS = 5.0
+
+
+def _dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class SharedResponse(dict):
+    """A response read back from the shared cache; .age is seconds since it was stored"""
+
+    def __init__(self, value: Dict[str, Any], age: float):
+        super().__init__(value)
+        self.age = age
+
+
+def fetch_lock_ttl(rate_limiter=None, timeout: Optional[float] = None) -> float:
+    """
+    Lease for a fetch lock: the longest a holder can take, i.e. draining a full
+    rate-limiter queue plus the HTTP client timeout and some slack, so a slow
+    holder's lock doesn't expire and let a second process fetch the same key
+    """
+    if rate_limiter is None:
+        from rate_limiter import get_rate_limiter
+        rate_limiter = get_rate_limiter()
+    if timeout is None:
+        from async_runtime import DEFAULT_TIMEOUT
+        timeout = DEFAULT_TIMEOUT
+    return rate_limiter.capacity / rate_limiter.rate + timeout + LOCK_TTL_MARGIN_SECONDS
+
+
+class SharedCache:
+    """
+    Cross-process cache of Kana responses and per-VN records in SQLite (WAL)
+
+    Every app replica on the host opens the same database file, so a response
+    fetched by one process is immediately served to all others. WAL mode lets
+    readers run concurrently with a writer. Entries expire after their TTL and
+    the least recently used rows are evicted once the stored values exceed
+    max_bytes. Lock rows give cross-process single-flight: only the process
+    holding a key's lock queries VNDB, the others wait for its result. The
+    lock lease (lock_ttl, by default fetch_lock_ttl()) outlasts the slowest
+    fetch, and waiters wait that long before fetching themselves.
+
+    Responses come back as SharedResponse carrying their age, so the
+    in-process cache in front expires them when the row was stored rather
+    than when it was read. Expired rows are never served: during an outage
+    only a process's own in-process cache can answer stale.
+
+    All methods are blocking; async callers go through get_or_fetch, which
+    runs them in a worker thread.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, ttl: float = 300.0,
+                 record_ttl: float = 3600.0, lock_ttl: Optional[float] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.record_ttl = record_ttl
+        self.lock_ttl = fetch_lock_ttl() if lock_ttl is None else lock_ttl
+        self.owner_prefix = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.waited = 0
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                # Only a cache: rebuild it rather than migrate rows
+                for table in ("responses", "records", "locks"):
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    conn.execute(statement)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread (sqlite3 connections can't be shared across threads)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=10000")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # -- generic table access -------------------------------------------------
+
+    def _get(self, table: str, key: str) -> Optional[Tuple[Any, float]]:
+        """(value, seconds since it was stored) for an unexpired row"""
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(f"SELECT expires_at, last_access, stored_at, value FROM {table} WHERE key = ?",
+                           (key,)).fetchone()
+        if row is None or row[0] < now:
+            return None
+        if now - row[1] > ACCESS_REFRESH_SECONDS:
+            conn.execute(f"UPDATE {table} SET last_access = ? WHERE key = ?", (now, key))
+        return _loads(row[3]), max(0.0, now - row[2])
+
+    def _put_many(self, table: str, items: Iterable[tuple], ttl: float):
+        now = time.time()
+        rows = []
+        for key, value in items:
+            data = _dumps(value)
+            rows.append((key, len(data), now, now + ttl, now, data))
+        if not rows:
+            return
+        conn = self._connect()
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {table} (key, size, stored_at, expires_at, last_access, value) "
+            f"VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self._writes += 1
+        if self._writes % EVICT_EVERY_WRITES == 0:
+            self.evict()
+
+    # -- responses and records ------------------------------------------------
+
+    def get_response(self, key: str) -> Optional[Any]:
+        """The cached response for key (a SharedResponse for dict bodies), or None"""
+        found = self._get("responses", key)
+        if found is None:
+            return None
+        value, age = found
+        return SharedResponse(value, age) if isinstance(value, dict) else value
+
+    def put_response(self, key: str, value: Any):
+        self._put_many("responses", [(key, value)], self.ttl)
+        # Also index every VN of the response by ID
+        results = value.get("results") if isinstance(value, dict) else None
+        if results:
+            self.put_records(results)
+
+    def get_record(self, vn_id: str) -> Optional[Dict[str, Any]]:
+        """Return the raw Kana dict of a VN seen in any cached response"""
+        found = self._get("records", vn_id)
+        return found[0] if found is not None else None
+
+    def put_records(self, vns: Iterable[Dict[str, Any]]):
+        self._put_many("records", ((vn["id"], vn) for vn in vns if vn.get("id")), self.record_ttl)
+
+    # -- cross-process single-flight -------------------------------------------
+
+    def acquire_lock(self, key: str, owner: str) -> bool:
+        """Take the fetch lock for key (stealing it if its holder's lease expired)"""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT owner, expires_at FROM locks WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > now and row[0] != owner:
+                conn.execute("COMMIT")
+                return False
+            conn.execute("INSERT OR REPLACE INTO locks (key, owner, expires_at) VALUES (?, ?, ?)",
+                         (key, owner, now + self.lock_ttl))
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def release_lock(self, key: str, owner: str):
+        self._connect().execute("DELETE FROM locks WHERE key = ? AND owner = ?", (key, owner))
+
+    def is_locked(self, key: str) -> bool:
+        row = self._connect().execute("SELECT expires_at FROM locks WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] > time.time()
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]],
+                           wait_timeout: Optional[float] = None) -> Any:
+        """
+        Return the shared value for key, or fetch it with at most one process
+        on the host querying upstream at a time; None results aren't stored
+
+        Waiters fetch themselves after wait_timeout (default lock_ttl) if the
+        holder hasn't stored a result by then.
+        """
+        value = await asyncio.to_thread(self.get_response, key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        owner = f"{self.owner_prefix}-{uuid.uuid4().hex[:8]}"
+        give_up_at = time.monotonic() + (self.lock_ttl if wait_timeout is None else wait_timeout)
+        locked = waited = False
+        try:
+            while True:
+                locked = await self._acquire_lock(key, owner)
+                if locked:
+                    break
+                # Someone else is fetching it: wait for their result
+                if not waited:
+                    self.waited += 1
+                    waited = True
+                value = await self._wait_for_holder(key, give_up_at)
+                if value is not None:
+                    return value
+                if time.monotonic() >= give_up_at:
+                    # The holder is stuck; fetch without the lock rather than stall the caller
+                    break
+                # The holder gave up without a result: one waiter takes over, the others
+                # go back to waiting for it
+
+            value = await fetch()
+            if value is not None:
+                await asyncio.to_thread(self.put_response, key, value)
+            return value
+        finally:
+            if locked:
+                # Shielded so a cancellation can't skip the release and block the key for lock_ttl
+                await asyncio.shield(asyncio.to_thread(self.release_lock, key, owner))
+
+    async def _acquire_lock(self, key: str, owner: str) -> bool:
+        """acquire_lock in a worker thread; if the caller is cancelled meanwhile, a lock it took is released"""
+        attempt = asyncio.ensure_future(asyncio.to_thread(self.acquire_lock, key, owner))
+        try:
+            return await asyncio.shield(attempt)
+        except asyncio.CancelledError:
+            loop = asyncio.get_running_loop()
+
+            def release_if_taken(future: asyncio.Future):
+                if not future.cancelled() and future.exception() is None and future.result():
+                    loop.run_in_executor(None, self.release_lock, key, owner)
+
+            attempt.add_done_callback(release_if_taken)
+            raise
+
+    async def _wait_for_holder(self, key: str, give_up_at: float) -> Optional[Any]:
+        """Poll for the lock holder's result; None once the lock is free or at give_up_at"""
+        delay = 0.02
+        while time.monotonic() < give_up_at:
+            await asyncio.sleep(min(delay, max(0.0, give_up_at - time.monotonic())))
+            delay = min(delay * 2, 0.5)
+            value = await asyncio.to_thread(self.get_response, key)
+            if value is not None:
+                return value
+            if not await asyncio.to_thread(self.is_locked, key):
+                return None
+        return None
+
+    # -- maintenance -----------------------------------------------------------
+
+    def evict(self):
+        """Drop expired rows, then least recently used rows until under max_bytes"""
+        conn = self._connect()
+        now = time.time()
+        for table in ("responses", "records"):
+            conn.execute(f"DELETE FROM {table} WHERE expires_at < ?", (now,))
+        conn.execute("DELETE FROM locks WHERE expires_at < ?", (now,))
+
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        # Evict across both tables by access time until ~90% of the budget is used
+        excess = total - int(self.max_bytes * 0.9)
+        doomed = {"responses": [], "records": []}
+        rows = conn.execute(
+            "SELECT 'responses', key, size, last_access FROM responses "
+            "UNION ALL SELECT 'records', key, size, last_access FROM records "
+            "ORDER BY last_access")
+        for table, key, size, _ in rows:
+            if excess <= 0:
+                break
+            doomed[table].append((key,))
+            excess -= size
+        for table, keys in doomed.items():
+            conn.executemany(f"DELETE FROM {table} WHERE key = ?", keys)
+        log_event(logging.INFO, "shared cache evicted", path=self.path, bytes_before=total)
+
+    def total_bytes(self) -> int:
+        conn = self._connect()
+        return sum(conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+                   for table in ("responses", "records"))
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'waited_on_other_process': self.waited,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'bytes_stored': self.total_bytes(),
+        }
+
+
+_default_cache: Optional[SharedCache] = None
+_default_cache_checked = False
+_default_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """
+    Return the host-wide cache at VNDB_SHARED_CACHE (default <tmp>/vndb_shared_cache.sqlite3),
+    or None if it is set to "off" or can't be opened; rows live for
+    VNDB_SHARED_CACHE_TTL seconds, capped at VNDB_CACHE_TTL
+    """
+    global _default_cache, _default_cache_checked
+    if not _default_cache_checked:
+        with _default_cache_lock:
+            if not _default_cache_checked:
+                path = os.environ.get("VNDB_SHARED_CACHE",
+                                      os.path.join(tempfile.gettempdir(), "vndb_shared_cache.sqlite3"))
+                if path and path.lower() not in ("off", "0", "false", "none"):
+                    # Never longer than the in-process TTL, or a background refresh could
+                    # be answered from an old row and then count as fresh in-process
+                    cache_ttl = float(os.environ.get("VNDB_CACHE_TTL", "300"))
+                    shared_ttl = min(float(os.environ.get("VNDB_SHARED_CACHE_TTL", cache_ttl)), cache_ttl)
+                    try:
+                        _default_cache = SharedCache(
+                            path,
+                            max_bytes=int(float(os.environ.get("VNDB_SHARED_CACHE_MB", "256")) * 1024 * 1024),
+                            ttl=shared_ttl,
+                        )
+                        registry.register_gauges("vndb_shared_cache", "Host-wide SQLite cache statistics",
+                                                 _default_cache.metrics)
+                    except sqlite3.Error as e:
+                        log_event(logging.WARNING, "shared cache disabled", path=path, error=str(e))
+                _default_cache_checked = True
+    return _default_cache
@@ -0,0 +1,294 @@
+"""
+Static lookup data shared by every VNDBFetcher in the process
+
+The tag map, tag categories and NSFW keyword lists don't change between
+sessions, so they are loaded once per process from a prebuilt, versioned
+bundle (static_data.bundle.json next to this file,
+or VNDB_STATIC_BUNDLE) instead of being rebuilt for every session. The bundle
+can also carry a snapshot of the responses behind the app's default queries,
+which seeds the response cache of a fresh process:
+
+    python static_data.py --build              # tables only
+    python static_data.py --build --popular    # plus a snapshot from VNDB_API_URL
+
+A missing bundle, or one built from different tables or by another bundle
+version, is ignored with a warning and the data is built from this module.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from instrumentation import configure_logging, log_event
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Bumped whenever the bundle layout changes; older bundles are ignored
+BUNDLE_VERSION = 1
+DEFAULT_BUNDLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static_data.bundle.json")
+
+# NSFW keywords that indicate adult content
+NSFW_KEYWORDS = (
+    "sex", "erotic", "hentai", "nukige", "18+",
+    "adult only", "explicit", "pornographic", "nudity"
+)
+
+# Safe keywords that should NOT be flagged as NSFW
+SAFE_KEYWORDS = (
+    "no sexual content", "adult protagonist", "adult heroine",
+    "mature protagonist", "mature heroine", "adult romance",
+    "mature themes", "mature content", "low sexual content",
+    "sexual innuendo", "sex change"
+)
+
+# Explicit NSFW tags for simple filtering
+EXPLICIT_NSFW = ("hentai", "nukige", "18+", "erotic", "pornographic")
+
+# Description phrases rejected by strict filtering
+EXPLICIT_DESCRIPTION_PATTERNS = ("contains sexual", "features erotic", "includes adult content", "hentai game")
+
+# IMPROVED: Fixed and expanded tag mapping with verified VNDB tag IDs
+TAG_MAP = {
+    # Story genres
+    "Mystery": "g19",
+    "Horror": "g7",
+    "Comedy": "g104",
+    "Drama": "g147",
+    "Slice of Life": "g454",
+    "Thriller": "g789",
+    "Romance": "g96",
+    "Action": "g12",
+    "Fantasy": "g2",
+    "Science Fiction": "g105",
+
+    # Protagonist types - FIXED: Removed duplicate tag IDs
+    "Male Protagonist": "g133",
+    "Female Protagonist": "g134",
+    "Multiple Protagonists": "g136",
+    "Adult Protagonist": "g137",
+    "Student Protagonist": "g544",
+
+    # Gameplay
+    "Multiple Endings": "g148",
+    "Kinetic Novel": "g709",
+    "Linear Plot": "g145",
+    "Branching Plot": "g606",
+
+    # Setting
+    "School": "g47",
+    "Modern Day": "g143",
+    "Past": "g141",
+    "Future": "g140",
+    # FIXED: Removed duplicate mapping for Historical
+
+    # NEW: Additional useful tags
+    "Friendship": "710",
+    "Family": "g215",
+    "Military": "g46"
+}
+
+# Common VN tags for easy reference
+COMMON_TAGS = {
+    "story": ["Mystery", "Horror", "Comedy", "Drama", "Slice of Life",
+              "Thriller", "Romance", "Action", "Fantasy", "Science Fiction"],
+    "protagonist": ["Male Protagonist", "Female Protagonist", "Multiple Protagonists",
+                    "Adult Protagonist", "Student Protagonist"],
+    "gameplay": ["Multiple Endings", "Linear Plot", "Kinetic Novel",
+                 "Branching Plot"],
+    "setting": ["School", "Modern Day", "Past", "Future"],
+    "themes": ["Friendship", "Family", "Military"]
+}
+
+# fetch_many specs for the popular pools random picks draw from (the app's
+# fallback with the sidebar defaults, and fetch_random_vn); their responses
+# make up the snapshot
+SNAPSHOT_SPECS = (
+    {"kind": "popular", "max_results": 20, "min_rating": 60, "min_votes": 50},
+    {"kind": "popular", "max_results": 200, "min_rating": 60, "min_votes": 100, "max_pages": 1},
+)
+
+
+def _tables() -> Dict[str, Any]:
+    return {
+        "nsfw_keywords": list(NSFW_KEYWORDS),
+        "safe_keywords": list(SAFE_KEYWORDS),
+        "explicit_nsfw": list(EXPLICIT_NSFW),
+        "description_patterns": list(EXPLICIT_DESCRIPTION_PATTERNS),
+        "tag_map": TAG_MAP,
+        "common_tags": COMMON_TAGS,
+    }
+
+
+def source_hash() -> str:
+    """Fingerprint of the tables above, stored in the bundle to detect stale builds"""
+    canonical = json.dumps(_tables(), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def build_bundle(snapshot: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """The bundle contents: the tables and an optional response snapshot"""
+    return {
+        "version": BUNDLE_VERSION,
+        "source_hash": source_hash(),
+        "built_at": time.time(),
+        **_tables(),
+        "snapshot": snapshot,
+    }
+
+
+def write_bundle(bundle: Dict[str, Any], path: str = DEFAULT_BUNDLE):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        if orjson is not None:
+            f.write(orjson.dumps(bundle))
+        else:
+            f.write(json.dumps(bundle, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    os.replace(tmp_path, path)
+
+
+def read_bundle(path: str) -> Optional[Dict[str, Any]]:
+    """
+    Decode the bundle at path straight from a read-only memory map, or return
+    None (with a warning) if it is missing, unreadable or out of date
+    """
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if orjson is not None:
+                with memoryview(mapped) as view:
+                    bundle = orjson.loads(view)
+            else:
+                bundle = json.loads(mapped[:])
+    except (OSError, ValueError) as e:
+        log_event(logging.WARNING, "static bundle not loaded", path=path, error=str(e))
+        return None
+    if bundle.get("version") != BUNDLE_VERSION or bundle.get("source_hash") != source_hash():
+        log_event(logging.WARNING, "static bundle out of date, rebuild it", path=path,
+                  version=bundle.get("version"))
+        return None
+    return bundle
+
+
+class StaticData:
+    """
+    Read-only lookup tables, one instance per process
+
+    tag_verdicts caches the NSFW verdict per lowercased tag name (keyed by
+    the strict flag first); since verdicts only depend on the tables, every
+    fetcher in the process shares it.
+    """
+
+    def __init__(self, bundle: Dict[str, Any], source: str):
+        self.source = source
+        self.tag_map: Dict[str, str] = bundle["tag_map"]
+        self.common_tags: Dict[str, List[str]] = bundle["common_tags"]
+        self.nsfw_keywords: Tuple[str, ...] = tuple(bundle["nsfw_keywords"])
+        self.safe_keywords: Tuple[str, ...] = tuple(bundle["safe_keywords"])
+        self.explicit_nsfw: Tuple[str, ...] = tuple(bundle["explicit_nsfw"])
+        self.description_patterns: Tuple[str, ...] = tuple(bundle["description_patterns"])
+
+        self.tag_verdicts: Dict[bool, Dict[str, str]] = {True: {}, False: {}}
+        self.snapshot: Optional[Dict[str, Any]] = bundle.get("snapshot")
+        self._seeded = set()
+        self._lock = threading.Lock()
+
+    def seed_cache(self, cache, api_url: str) -> int:
+        """
+        Seed cache (a ResponseCache) with the bundled snapshot, once per cache,
+        if the snapshot was taken from api_url; returns the entries added
+        """
+        if cache is None or not self.snapshot or self.snapshot.get("api_url") != api_url:
+            return 0
+        with self._lock:
+            if id(cache) in self._seeded:
+                return 0
+            self._seeded.add(id(cache))
+        added = cache.seed((key, response) for key, response in self.snapshot["responses"])
+        log_event(logging.INFO, "response cache seeded from static bundle", entries=added,
+                  snapshot_age_s=round(time.time() - self.snapshot.get("taken_at", 0)))
+        return added
+
+
+_default_data: Optional[StaticData] = None
+_default_data_lock = threading.Lock()
+
+
+def get_static_data() -> StaticData:
+    """
+    Return the process-wide static data, loaded from the bundle at
+    VNDB_STATIC_BUNDLE (default static_data.bundle.json; "off" skips it)
+    """
+    global _default_data
+    if _default_data is None:
+        with _default_data_lock:
+            if _default_data is None:
+                path = os.environ.get("VNDB_STATIC_BUNDLE", DEFAULT_BUNDLE)
+                bundle = None
+                if path and path.lower() not in ("off", "0", "false", "none"):
+                    bundle = read_bundle(path)
+                if bundle is not None:
+                    _default_data = StaticData(bundle, source=path)
+                else:
+                    _default_data = StaticData(build_bundle(), source="module")
+    return _default_data
+
+
+async def take_snapshot(api_url: Optional[str] = None) -> Dict[str, Any]:
+    """Run SNAPSHOT_SPECS against the API and capture the responses they were answered from"""
+    import httpx
+    from response_cache import ResponseCache
+    from vndb_fetcher import VNDBFetcher
+
+    recorder = ResponseCache(max_entries=1024, ttl=3600.0, stale_ttl=0.0)
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        fetcher = VNDBFetcher(client=client, api_url=api_url, cache=recorder, shared_cache=False,
+                              circuit_breaker=False)
+        async for item in fetcher.fetch_many([dict(spec) for spec in SNAPSHOT_SPECS]):
+            if item.error is not None:
+                raise item.error
+    responses = recorder.items()
+    if not responses:
+        raise RuntimeError(f"no responses from {fetcher.api_url}")
+    return {"api_url": fetcher.api_url, "taken_at": time.time(), "responses": responses}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--build", action="store_true", help="Write the bundle")
+    parser.add_argument("--popular", action="store_true",
+                        help="Include a snapshot of the default queries (needs the API to be reachable)")
+    parser.add_argument("--output", default=DEFAULT_BUNDLE, help="Bundle path")
+    args = parser.parse_args()
+
+    configure_logging()
+    if not args.build:
+        data = get_static_data()
+        snapshot = data.snapshot
+        print(f"source     {data.source}")
+        print(f"tags       {len(data.tag_map)} mapped, {sum(map(len, data.common_tags.values()))} listed")
+        print(f"snapshot   {len(snapshot['responses']) if snapshot else 0} responses")
+        return
+
+    snapshot = None
+    if args.popular:
+        try:
+            snapshot = asyncio.run(take_snapshot())
+        except Exception as e:
+            # A bundle without a snapshot still saves building the tables
+            log_event(logging.WARNING, "snapshot skipped", error=str(e) or type(e).__name__)
+    write_bundle(build_bundle(snapshot), args.output)
+    print(f"Bundle v{BUNDLE_VERSION} written to {args.output} "
+          f"({os.path.getsize(args.output) / 1024:.1f} KiB, "
+          f"{len(snapshot['responses']) if snapshot else 0} snapshot responses)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import asyncio
+import inspect
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+# Tests import the app's modules from the repository root, like the benchmarks do
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vndb_fetcher import VNDBFetcher  # noqa: E402
+
+
+@pytest.fixture
+def make_fetcher():
+    """
+    Factory for VNDBFetchers whose requests are answered by respond(request)
+    (returning an httpx.Response, or awaitable for one) after latency seconds
+
+    Caches, rate limiter and circuit breaker are off unless passed as keyword
+    arguments, so every call reaches respond.
+    """
+    clients = []
+
+    def factory(respond, latency: float = 0.0, **options) -> VNDBFetcher:
+        async def handler(request: httpx.Request) -> httpx.Response:
+            if latency:
+                await asyncio.sleep(latency)
+            response = respond(request)
+            if inspect.isawaitable(response):
+                response = await response
+            return response
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        clients.append(client)
+        settings = dict(cache=False, rate_limiter=False, shared_cache=False, circuit_breaker=False)
+        settings.update(options)
+        return VNDBFetcher(client=client, **settings)
+
+    yield factory
+    for client in clients:
+        asyncio.run(client.aclose())
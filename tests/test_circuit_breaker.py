@@ -0,0 +1,124 @@
+import asyncio
+import types
+
+import httpx
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from rate_limiter import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(circuit_breaker, "time", types.SimpleNamespace(monotonic=fake))
+    return fake
+
+
+def _opened(clock, **kwargs) -> CircuitBreaker:
+    breaker = CircuitBreaker(min_calls=2, open_seconds=10, half_open_probes=2, probe_lease_seconds=5,
+                             **kwargs)
+    breaker.record(False)
+    breaker.record(False)
+    assert breaker.state == OPEN
+    return breaker
+
+
+def test_opens_at_failure_rate(clock):
+    breaker = CircuitBreaker(min_calls=4, failure_rate_threshold=0.5)
+    for ok in (True, True, False):
+        breaker.record(ok)
+    assert breaker.state == CLOSED
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.metrics()["rejected"] == 1
+
+
+def test_slow_calls_count_as_failures(clock):
+    breaker = CircuitBreaker(min_calls=2, slow_call_seconds=1)
+    breaker.record(True, seconds=2)
+    breaker.record(True, seconds=3)
+    assert breaker.state == OPEN
+
+
+def test_half_open_probes_close_the_breaker(clock):
+    breaker = _opened(clock)
+    clock.now += 10
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() and breaker.allow()
+    assert not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == HALF_OPEN
+    breaker.record(True)
+    assert breaker.state == CLOSED
+    assert breaker.allow()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = _opened(clock)
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert breaker.metrics()["times_opened"] == 2
+
+
+def test_cancelled_probe_frees_its_slot(clock):
+    breaker = _opened(clock)
+    clock.now += 10
+    assert breaker.allow() and breaker.allow()
+    breaker.cancel()
+    breaker.cancel()
+    assert breaker.allow() and breaker.allow()
+    assert not breaker.allow()
+
+
+def test_cancel_after_outcome_keeps_other_probes(clock):
+    breaker = _opened(clock)
+    clock.now += 10
+    assert breaker.allow() and breaker.allow()
+    breaker.record(True)
+    breaker.cancel()
+    # Only the cancelled probe's slot came back
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_lost_probes_expire(clock):
+    breaker = _opened(clock)
+    clock.now += 10
+    assert breaker.allow() and breaker.allow()
+    clock.now += 4
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow() and breaker.allow()
+    assert breaker.metrics()["expired_probes"] == 2
+
+
+def test_deadline_while_waiting_for_token_releases_probe(make_fetcher):
+    """Probes cancelled while queued on the rate limiter don't wedge the breaker half-open"""
+    breaker = CircuitBreaker(min_calls=1, open_seconds=0, half_open_probes=2)
+    breaker.record(False)
+    limiter = TokenBucket(rate=0.5, capacity=1)
+    assert limiter.try_acquire()
+    fetcher = make_fetcher(lambda request: httpx.Response(200, json={"results": [], "more": False}),
+                           rate_limiter=limiter, circuit_breaker=breaker)
+
+    async def run():
+        for _ in range(3):
+            results = await fetcher.fetch_popular_vns(max_results=5, deadline=0.05)
+            assert results.partial
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow()
+
+    asyncio.run(run())
@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+from benchmarks.synthetic import make_raw_vn, make_results
+from vn_record import iter_vn_results
+from vndb_fetcher import VNDBFetcher
+
+# The per-VN is_content_safe/format_vn_info path that the one-pass decode replaced,
+# as it was before it; null fields count as absent (this path raised on them)
+DESCRIPTION_PATTERNS = ["contains sexual", "features erotic", "includes adult content", "hentai game"]
+
+
+def _present(vn):
+    return {key: value for key, value in vn.items() if value is not None}
+
+
+def _baseline_is_content_safe(fetcher, vn, strict):
+    vn = _present(vn)
+    tag_names = [tag.get("name", "").lower() for tag in vn.get("tags", [])]
+    description = vn.get("description", "").lower()
+    for tag_name in tag_names:
+        if any(safe_tag in tag_name for safe_tag in fetcher.safe_keywords):
+            continue
+        if strict:
+            for nsfw_keyword in fetcher.nsfw_keywords:
+                if nsfw_keyword in tag_name:
+                    return False, f"NSFW tag: '{tag_name}' contains '{nsfw_keyword}'"
+        elif any(explicit in tag_name for explicit in fetcher.explicit_nsfw):
+            return False, "Contains explicit content tags"
+    if strict:
+        for pattern in DESCRIPTION_PATTERNS:
+            if pattern in description:
+                return False, f"NSFW description contains '{pattern}'"
+    return True, ""
+
+
+def _baseline_format_vn_info(vn):
+    vn = _present(vn)
+    image_info = vn.get("image")
+    tags = vn.get("tags", [])
+    return {
+        "title": vn.get("title", "Unknown"),
+        "id": vn.get("id", "Unknown"),
+        "rating": vn.get("rating", 0) / 10,
+        "votes": vn.get("votecount", 0),
+        "released": vn.get("released", "Unknown"),
+        "languages": vn.get("languages", []),
+        "description": vn.get("description", "No description available"),
+        "image_url": image_info["url"] if isinstance(image_info, dict) and image_info.get("url") else None,
+        "tags": [tag.get("name", "Unknown") for tag in tags[:15]] if tags else [],
+    }
+
+
+def _body(vns):
+    return json.dumps({"results": vns, "more": False}).encode("utf-8")
+
+
+def _page():
+    vns = make_results(60, nsfw_ratio=0.3, start=910001, seed=7)
+    vns.append(dict(make_raw_vn(910101), rating=None, description=None, tags=None, image=None))
+    vns.append(dict(make_raw_vn(910102), description="It contains sexual themes", image={"url": None}))
+    vns.append(dict(make_raw_vn(910103, nsfw=True), rating=None))
+    vns.append(dict(make_raw_vn(910104), tags=[{"name": "Sexual Innuendo"}, {"name": "No Sexual Content"}]))
+    vns.append(dict(make_raw_vn(910105), tags=[]))
+    return vns
+
+
+@pytest.fixture
+def fetcher():
+    return VNDBFetcher()
+
+
+@pytest.mark.parametrize("strict", [True, False])
+def test_record_decisions_and_fields_match_baseline(fetcher, strict):
+    vns = _page()
+    decoded = list(iter_vn_results(_body(vns)))
+    assert len(decoded) == len(vns)
+
+    for vn, (record, tag_names) in zip(vns, decoded):
+        assert fetcher.is_record_safe(record, tag_names, strict) == _baseline_is_content_safe(fetcher, vn, strict)
+        assert record.to_dict() == _baseline_format_vn_info(vn)
+
+
+@pytest.mark.parametrize("strict", [True, False])
+def test_dict_path_matches_baseline(fetcher, strict):
+    for vn in _page():
+        if vn.get("rating") is None or vn.get("tags") is None or vn.get("description") is None:
+            continue
+        assert fetcher.is_content_safe(vn, strict) == _baseline_is_content_safe(fetcher, vn, strict)
+        assert fetcher.format_vn_info(vn).to_dict() == _baseline_format_vn_info(vn)
+
+
+@pytest.mark.parametrize("strict", [True, False])
+@pytest.mark.parametrize("max_results", [5, 1000])
+def test_collect_safe_records_keeps_the_baseline_selection(fetcher, strict, max_results):
+    vns = _page()
+    expected = [_baseline_format_vn_info(vn) for vn in vns
+                if _baseline_is_content_safe(fetcher, vn, strict)[0]][:max_results]
+
+    selected = fetcher.collect_safe_records(_body(vns), max_results, strict)
+    assert [record.to_dict() for record in selected] == expected
+    # The synthetic page has both outcomes, and strict drops more than non-strict
+    assert 0 < len(expected) < len(vns)
+
+
+def test_strict_mode_is_stricter_on_the_page(fetcher):
+    decoded = list(iter_vn_results(_body(_page())))
+    strict = [fetcher.is_record_safe(record, names, True)[0] for record, names in decoded]
+    relaxed = [fetcher.is_record_safe(record, names, False)[0] for record, names in decoded]
+    assert sum(strict) < sum(relaxed)
+    assert all(ok_relaxed for ok_strict, ok_relaxed in zip(strict, relaxed) if ok_strict)
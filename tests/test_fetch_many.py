@@ -0,0 +1,67 @@
+import asyncio
+import json
+
+import httpx
+
+from benchmarks.mock_vndb import MockVNDB
+from vndb_fetcher import UpstreamError
+
+
+def _batch(make_fetcher, specs, respond):
+    fetcher = make_fetcher(respond)
+
+    async def run():
+        items = [item async for item in fetcher.fetch_many(specs)]
+        # The public methods still swallow the same failures
+        single = await fetcher.fetch_popular_vns(max_results=5)
+        return items, single
+
+    return asyncio.run(run())
+
+
+def test_upstream_failures_reach_batch_errors(make_fetcher):
+    mock = MockVNDB(nsfw_ratio=0.0)
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        payload = json.loads(request.content)
+        if payload.get("sort") == "rating" and "search" not in json.dumps(payload["filters"]):
+            return httpx.Response(503, text="down")
+        if payload["filters"][0] == "id":
+            raise httpx.ConnectError("refused", request=request)
+        return await mock.handle(request)
+
+    specs = [
+        {"kind": "popular", "max_results": 5},
+        {"kind": "by_id", "vn_id": "v17"},
+        {"kind": "search", "query": "steins", "max_results": 5},
+        {"kind": "nope"},
+    ]
+    items, single = _batch(make_fetcher, specs, handler)
+    errors = {item.indices[0]: item.error for item in items}
+    assert isinstance(errors[0], UpstreamError)
+    assert isinstance(errors[1], httpx.ConnectError)
+    assert errors[2] is None
+    assert isinstance(errors[3], ValueError)
+    assert single == []
+    search = next(item for item in items if item.indices == (2,))
+    assert len(search.result) == 5
+
+
+def test_later_page_failure_keeps_partial_results(make_fetcher):
+    # The first page is all NSFW, so nothing is found before the second one fails
+    mock = MockVNDB(nsfw_ratio=1.0)
+
+    def respond(request: httpx.Request):
+        if json.loads(request.content).get("page", 1) > 1:
+            return httpx.Response(502, text="bad gateway")
+        return mock.handle(request)
+
+    fetcher = make_fetcher(respond)
+
+    async def run():
+        item = [item async for item in fetcher.fetch_many([{"kind": "popular", "max_results": 40}])][0]
+        return item
+
+    item = asyncio.run(run())
+    assert item.error is None
+    assert item.result == [] and item.result.partial
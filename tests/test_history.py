@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+
+from vn_record import VNHistory, VNRecord
+
+
+def _vn(num: int) -> VNRecord:
+    return VNRecord(id=f"v{num}", title=f"VN {num}", rating=80.0, votes=100, released="2020-01-01",
+                    languages=["en"], description="", image_url=None, tags=["Mystery"])
+
+
+def _orders(history: VNHistory):
+    shown = [vn['id'] for vn in history]
+    table = history.table_columns()['ID']
+    exported_csv = [row['ID'] for row in csv.DictReader(io.StringIO(history.export_csv().decode("utf-8")))]
+    exported_json = [vn['id'] for vn in json.loads(history.export_json())]
+    return shown, table, exported_csv, exported_json
+
+
+def test_lru_move_keeps_table_and_exports_in_history_order():
+    history = VNHistory(maxlen=3, eviction="lru")
+    vns = [_vn(num) for num in range(1, 5)]
+    history.extend(vns[:3])
+    history.export_csv()
+    assert not history.append(vns[0])
+    # v1 is the newest now, so adding v4 evicts v2
+    history.append(vns[3])
+    for order in _orders(history):
+        assert order == ["v3", "v1", "v4"]
+
+
+def test_totals_and_tags_follow_evictions():
+    history = VNHistory(maxlen=2)
+    vns = [_vn(num) for num in range(1, 4)]
+    vns[2] = VNRecord(id="v3", title="VN 3", rating=60.0, votes=400, released="2020-01-01",
+                      languages=["en"], description="", image_url=None, tags=["Horror"])
+    history.extend(vns)
+    assert history.stats.count == 2
+    assert history.stats.avg_rating == 70.0 and history.stats.avg_votes == 250
+    assert history.top_tags() == [("Mystery", 1), ("Horror", 1)]
+
+
+def test_fifo_keeps_first_position():
+    history = VNHistory(maxlen=3, eviction="fifo")
+    vns = [_vn(num) for num in range(1, 4)]
+    history.extend(vns)
+    history.append(vns[0])
+    for order in _orders(history):
+        assert order == ["v1", "v2", "v3"]
@@ -0,0 +1,98 @@
+import logging
+
+import pytest
+
+from instrumentation import KeyValueFormatter, MetricsRegistry, log_event, logger
+
+
+def test_counter_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("vndb_test_requests_total", "Requests by outcome")
+    requests.inc(operation="search", outcome="ok")
+    requests.inc(2, operation="search", outcome="ok")
+    requests.inc(outcome="error", operation="search")
+
+    assert registry.render_prometheus() == (
+        "# HELP vndb_test_requests_total Requests by outcome\n"
+        "# TYPE vndb_test_requests_total counter\n"
+        'vndb_test_requests_total{operation="search",outcome="error"} 1\n'
+        'vndb_test_requests_total{operation="search",outcome="ok"} 3\n'
+    )
+
+
+def test_label_values_and_help_are_escaped():
+    registry = MetricsRegistry()
+    counter = registry.counter("vndb_test_total", "Help with a \\ backslash\nand a newline")
+    counter.inc(query='say "hi"\\now\nplease')
+
+    lines = registry.render_prometheus().splitlines()
+    assert lines[0] == "# HELP vndb_test_total Help with a \\\\ backslash\\nand a newline"
+    assert lines[2] == 'vndb_test_total{query="say \\"hi\\"\\\\now\\nplease"} 1'
+
+
+def test_histogram_buckets_sum_and_count():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("vndb_test_seconds", "Stage time", buckets=(0.1, 1.0))
+    # A value on a bound falls in that bucket (le is inclusive)
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.observe(value, stage="decode")
+
+    assert registry.render_prometheus().splitlines() == [
+        "# HELP vndb_test_seconds Stage time",
+        "# TYPE vndb_test_seconds histogram",
+        'vndb_test_seconds_bucket{stage="decode",le="0.1"} 2',
+        'vndb_test_seconds_bucket{stage="decode",le="1.0"} 3',
+        'vndb_test_seconds_bucket{stage="decode",le="+Inf"} 4',
+        'vndb_test_seconds_sum{stage="decode"} 2.65',
+        'vndb_test_seconds_count{stage="decode"} 4',
+    ]
+    assert histogram.count(stage="decode") == 4
+    assert histogram.quantile(0.5, stage="decode") == 0.1
+
+
+def test_gauges_skip_non_numeric_values_and_failing_callbacks():
+    registry = MetricsRegistry()
+    registry.register_gauges("vndb_test_cache", "Cache state", lambda: {"entries": 3, "enabled": True, "name": "x"})
+
+    def broken():
+        raise RuntimeError("gone")
+
+    registry.register_gauges("vndb_test_broken", "Broken", broken)
+
+    assert registry.render_prometheus() == (
+        "# HELP vndb_test_cache_entries Cache state\n"
+        "# TYPE vndb_test_cache_entries gauge\n"
+        "vndb_test_cache_entries 3\n"
+    )
+
+
+@pytest.fixture
+def log_lines():
+    lines = []
+
+    class ListHandler(logging.Handler):
+        def emit(self, record):
+            lines.append(self.format(record))
+
+    handler = ListHandler()
+    handler.setFormatter(KeyValueFormatter())
+    previous = logger.level
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    yield lines
+    logger.removeHandler(handler)
+    logger.setLevel(previous)
+
+
+def test_log_event_quotes_field_values(log_lines):
+    log_event(logging.INFO, "query done", operation="search", query="key = value here", results=3)
+
+    assert len(log_lines) == 1
+    assert log_lines[0].endswith(
+        " INFO vndb query done operation='search' query='key = value here' results=3")
+
+
+def test_log_event_skipped_below_level(log_lines):
+    logger.setLevel(logging.WARNING)
+    log_event(logging.DEBUG, "noisy", value=1)
+    assert log_lines == []
@@ -0,0 +1,140 @@
+import asyncio
+
+from response_cache import ResponseCache, StaleResponse
+
+
+def _expired_cache(**kwargs) -> ResponseCache:
+    # With no TTL every entry is past it on the next lookup, but still servable
+    return ResponseCache(ttl=0.0, stale_ttl=3600.0, **kwargs)
+
+
+async def _refreshed(cache: ResponseCache):
+    while cache._refresh_tasks:
+        await asyncio.gather(*cache._refresh_tasks)
+
+
+def test_expired_entry_served_unmarked_and_replaced_while_healthy():
+    async def run():
+        cache = _expired_cache()
+        cache.set("k", {"v": 1})
+
+        async def fetch():
+            return {"v": 2}
+
+        served = await cache.get_or_fetch("k", fetch)
+        await _refreshed(cache)
+        return served, cache._entries["k"][1], cache.metrics()
+
+    served, stored, metrics = asyncio.run(run())
+    assert served == {"v": 1} and not isinstance(served, StaleResponse)
+    assert stored == {"v": 2}
+    assert metrics["stale_hits"] == 1 and metrics["refreshes"] == 1
+
+
+def test_expired_entry_marked_stale_while_degraded():
+    async def run():
+        cache = _expired_cache()
+        cache.set("k", {"v": 1})
+
+        async def fetch():
+            return {"v": 2}
+
+        served = await cache.get_or_fetch("k", fetch, degraded=True)
+        await _refreshed(cache)
+        return served
+
+    served = asyncio.run(run())
+    assert isinstance(served, StaleResponse) and served.stale
+    assert served == {"v": 1}
+
+
+def test_failed_refresh_marks_later_answers_stale():
+    async def run():
+        cache = _expired_cache()
+        cache.set("k", {"v": 1})
+        calls = []
+
+        async def failing():
+            calls.append(1)
+            raise RuntimeError("down")
+
+        first = await cache.get_or_fetch("k", failing)
+        await _refreshed(cache)
+        second = await cache.get_or_fetch("k", failing)
+        await _refreshed(cache)
+
+        async def fetch():
+            return {"v": 2}
+
+        await cache.get_or_fetch("k", fetch)
+        await _refreshed(cache)
+        cache.ttl = 60.0
+        third = await cache.get_or_fetch("k", fetch)
+        return first, second, third, len(calls)
+
+    first, second, third, calls = asyncio.run(run())
+    # Seeded snapshot entries aren't an outage by themselves
+    assert not isinstance(first, StaleResponse)
+    assert isinstance(second, StaleResponse)
+    assert third == {"v": 2} and not isinstance(third, StaleResponse)
+    assert calls == 2
+
+
+def test_no_answer_counts_as_failed_refresh():
+    async def run():
+        cache = _expired_cache()
+        cache.set("k", {"v": 1})
+
+        async def no_answer():
+            return None
+
+        await cache.get_or_fetch("k", no_answer)
+        await _refreshed(cache)
+        return await cache.get_or_fetch("k", no_answer)
+
+    assert isinstance(asyncio.run(run()), StaleResponse)
+
+
+def test_concurrent_misses_share_one_fetch():
+    async def run():
+        cache = ResponseCache()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"v": len(calls)}
+
+        results = await asyncio.gather(*(cache.get_or_fetch("k", fetch) for _ in range(5)))
+        return results, calls, cache.metrics()
+
+    results, calls, metrics = asyncio.run(run())
+    assert results == [{"v": 1}] * 5
+    assert len(calls) == 1
+    assert metrics["misses"] == 1 and metrics["coalesced"] == 4
+
+
+def test_waiter_takes_over_when_the_owner_is_cancelled():
+    async def run():
+        cache = ResponseCache()
+        started = asyncio.Event()
+        calls = []
+
+        async def fetch():
+            calls.append(1)
+            started.set()
+            await asyncio.sleep(0.05)
+            return {"v": len(calls)}
+
+        owner = asyncio.ensure_future(cache.get_or_fetch("k", fetch))
+        await started.wait()
+        waiter = asyncio.ensure_future(cache.get_or_fetch("k", fetch))
+        await asyncio.sleep(0)
+        owner.cancel()
+        result = await waiter
+        return owner.cancelled(), result, len(calls), cache.get("k")
+
+    owner_cancelled, result, calls, cached = asyncio.run(run())
+    assert owner_cancelled
+    assert result == {"v": 2} and calls == 2
+    assert cached == {"v": 2}
@@ -0,0 +1,113 @@
+import asyncio
+import json
+
+import httpx
+
+from benchmarks.mock_vndb import MockVNDB
+from circuit_breaker import CircuitBreaker
+from service import RecommenderService
+
+
+def _call(service, method, path, query=None, body=None):
+    status, payload, _ = asyncio.run(service.handle(method, path, query or {},
+                                                    json.dumps(body).encode() if body is not None else b""))
+    return status, json.loads(payload)
+
+
+def _service(make_fetcher, respond=None, **options):
+    return RecommenderService(make_fetcher(respond or MockVNDB(nsfw_ratio=0.0).handle, **options))
+
+
+def _down(request):
+    return httpx.Response(503, text="maintenance")
+
+
+def test_routes_answer_from_vndb(make_fetcher):
+    service = _service(make_fetcher)
+    assert _call(service, "GET", "/health")[1]["status"] == "ok"
+    assert "story" in _call(service, "GET", "/tags")[1]["tags"]
+
+    status, data = _call(service, "GET", "/search", {"q": "novel", "max_results": "3"})
+    assert status == 200 and len(data["results"]) == 3 and not data["stale"]
+    status, data = _call(service, "POST", "/vns/by-tags", body={"required_tags": ["Mystery"], "max_results": 4})
+    assert status == 200 and len(data["results"]) == 4
+    status, data = _call(service, "GET", "/vns/popular", {"max_results": "2"})
+    assert status == 200 and len(data["results"]) == 2
+    status, data = _call(service, "POST", "/vns/random", body={"required_tags": ["Mystery"]})
+    assert status == 200 and data["result"]["id"].startswith("v")
+    assert _call(service, "GET", "/vns/v1")[1]["result"]["id"] == "v1"
+    assert _call(service, "GET", "/nope")[0] == 404
+
+
+def test_invalid_parameters_are_rejected(make_fetcher):
+    service = _service(make_fetcher)
+    assert _call(service, "GET", "/search")[0] == 400
+    assert _call(service, "GET", "/search", {"q": "x", "max_results": "500"})[0] == 400
+    assert _call(service, "GET", "/vns/by-tags")[0] == 405
+    assert _call(service, "POST", "/vns/by-tags", body={})[0] == 400
+    status, data = _call(service, "POST", "/vns/by-tags", body={"required_tags": ["Mystery"], "tag_logic": "xor"})
+    assert status == 400 and "tag_logic" in data["error"]
+    status, data = _call(service, "POST", "/vns/random", body={"required_tags": ["Mystery"], "tag_logic": "xor"})
+    assert status == 400 and "tag_logic" in data["error"]
+    assert _call(service, "GET", "/vns/17")[0] == 400
+    assert _call(service, "POST", "/vns/batch", body={"queries": []})[0] == 400
+
+
+def test_batch_reports_bad_specs_per_query(make_fetcher):
+    service = _service(make_fetcher)
+    queries = [{"kind": "popular", "max_results": 3}, {"kind": "popular", "max_results": 500}, {"kind": "nope"}]
+    original = json.loads(json.dumps(queries))
+    status, payload, _ = asyncio.run(service.dispatch("POST", "/vns/batch", {"queries": queries}))
+    answers = json.loads(payload)["answers"]
+    assert status == 200
+    assert len(answers[0]["results"]) == 3
+    assert "max_results" in answers[1]["error"]
+    assert "unknown query kind" in answers[2]["error"]
+    assert queries == original
+
+
+def test_upstream_failures_answer_503(make_fetcher):
+    service = _service(make_fetcher, _down)
+    for method, path, query, body in (
+        ("GET", "/search", {"q": "novel"}, None),
+        ("POST", "/vns/by-tags", None, {"required_tags": ["Mystery"]}),
+        ("GET", "/vns/popular", None, None),
+        ("POST", "/vns/random", None, {}),
+        ("POST", "/vns/random", None, {"required_tags": ["Mystery"]}),
+        ("GET", "/vns/v17", None, None),
+    ):
+        status, data = _call(service, method, path, query, body)
+        assert status == 503, path
+        assert "VNDB unavailable" in data["error"]
+
+    status, data = _call(service, "POST", "/vns/batch", body={"queries": [{"kind": "popular"}]})
+    assert status == 200 and "failed" in data["answers"][0]["error"]
+
+
+def test_network_errors_and_open_breaker_answer_503(make_fetcher):
+    def refused(request):
+        raise httpx.ConnectError("refused", request=request)
+
+    assert _call(_service(make_fetcher, refused), "GET", "/vns/popular")[0] == 503
+
+    breaker = CircuitBreaker(min_calls=1)
+    breaker.record(False)
+    requests = []
+    service = _service(make_fetcher, lambda request: requests.append(request) or _down(request),
+                       circuit_breaker=breaker)
+    assert _call(service, "GET", "/vns/v17")[0] == 503
+    assert requests == []
+
+
+def test_single_vn_deadline_answers_504(make_fetcher):
+    service = _service(make_fetcher, MockVNDB(latency=1.0).handle)
+    status, data = _call(service, "GET", "/vns/v17", {"deadline": "0.05"})
+    assert status == 504
+    # List endpoints return what they found, marked partial
+    status, data = _call(service, "GET", "/vns/popular", {"deadline": "0.05"})
+    assert status == 200 and data["partial"]
+
+
+def test_missing_vn_is_404(make_fetcher):
+    service = _service(make_fetcher, lambda request: httpx.Response(200, json={"results": [], "more": False}))
+    assert _call(service, "GET", "/vns/v999999")[0] == 404
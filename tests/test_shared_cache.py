@@ -0,0 +1,129 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+import shared_cache
+from rate_limiter import TokenBucket
+from response_cache import ResponseCache
+from shared_cache import SCHEMA_VERSION, SharedCache, SharedResponse, fetch_lock_ttl
+
+
+class SlowLockCache(SharedCache):
+    """Takes its time acquiring locks, so callers can be cancelled mid-acquire"""
+
+    def acquire_lock(self, key: str, owner: str) -> bool:
+        time.sleep(0.2)
+        return super().acquire_lock(key, owner)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache.sqlite3")
+
+
+def test_roundtrip_and_records(path):
+    cache = SharedCache(path)
+    cache.put_response("k", {"results": [{"id": "v1", "title": "A"}]})
+    assert cache.get_response("k") == {"results": [{"id": "v1", "title": "A"}]}
+    assert cache.get_record("v1") == {"id": "v1", "title": "A"}
+    assert cache.total_bytes() > 0
+
+
+def test_old_layout_is_rebuilt(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE responses (key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+                 "stored_at REAL NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)")
+    conn.commit()
+    conn.close()
+
+    cache = SharedCache(path)
+    columns = [row[1] for row in cache._connect().execute("PRAGMA table_info(responses)")]
+    assert columns[-1] == "value"
+    assert cache._connect().execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    cache.put_response("k", {"results": []})
+    assert cache.get_response("k") == {"results": []}
+
+
+def test_cancelled_while_acquiring_does_not_leak_lock(path):
+    cache = SlowLockCache(path)
+
+    async def fetch():
+        return {"results": []}
+
+    async def run():
+        task = asyncio.ensure_future(cache.get_or_fetch("k", fetch))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # Let the worker thread finish taking the lock, and the release run
+        await asyncio.sleep(0.4)
+        assert not cache.is_locked("k")
+
+    asyncio.run(run())
+
+
+def test_waiters_take_over_one_at_a_time_when_holder_fails(path):
+    cache = SharedCache(path)
+    calls = []
+
+    async def failing():
+        calls.append("holder")
+        await asyncio.sleep(0.1)
+        raise RuntimeError("upstream down")
+
+    async def fetch():
+        calls.append("waiter")
+        await asyncio.sleep(0.1)
+        return {"results": []}
+
+    async def run():
+        holder = asyncio.ensure_future(cache.get_or_fetch("k", failing))
+        await asyncio.sleep(0.02)
+        waiters = [asyncio.ensure_future(cache.get_or_fetch("k", fetch)) for _ in range(4)]
+        with pytest.raises(RuntimeError):
+            await holder
+        return await asyncio.gather(*waiters)
+
+    results = asyncio.run(run())
+    assert results == [{"results": []}] * 4
+    assert calls == ["holder", "waiter"]
+
+
+def test_age_of_shared_rows_carries_into_the_response_cache(path):
+    cache = SharedCache(path, ttl=300)
+    cache.put_response("k", {"results": []})
+    cache._connect().execute("UPDATE responses SET stored_at = stored_at - 250")
+    value = cache.get_response("k")
+    assert isinstance(value, SharedResponse) and 249 < value.age < 260
+
+    local = ResponseCache(ttl=300)
+
+    async def no_upstream():
+        raise AssertionError("answered from the shared cache")
+
+    async def run():
+        return await local.get_or_fetch("k", lambda: cache.get_or_fetch("k", no_upstream))
+
+    assert asyncio.run(run()) == {"results": []}
+    stored_at, _ = local._entries["k"]
+    # Expires in-process 300 s after the row was stored, not after it was read
+    assert time.monotonic() - stored_at > 249
+
+
+def test_lock_lease_outlasts_a_full_limiter_queue_and_the_timeout(path):
+    limiter = TokenBucket(rate=0.5, capacity=10)
+    assert fetch_lock_ttl(limiter, timeout=30) == 10 / 0.5 + 30 + shared_cache.LOCK_TTL_MARGIN_SECONDS
+    assert SharedCache(path).lock_ttl == fetch_lock_ttl()
+
+
+def test_shared_ttl_capped_at_in_process_ttl(path, monkeypatch):
+    monkeypatch.setenv("VNDB_SHARED_CACHE", path)
+    monkeypatch.setenv("VNDB_CACHE_TTL", "120")
+    monkeypatch.setenv("VNDB_SHARED_CACHE_TTL", "600")
+    monkeypatch.setattr(shared_cache, "_default_cache", None)
+    monkeypatch.setattr(shared_cache, "_default_cache_checked", False)
+    monkeypatch.setattr(shared_cache.registry, "register_gauges", lambda *args: None)
+    assert shared_cache.get_shared_cache().ttl == 120
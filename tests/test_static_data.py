@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+import static_data
+from response_cache import ResponseCache, StaleResponse
+from static_data import StaticData, build_bundle, get_static_data, read_bundle, write_bundle
+
+API_URL = "http://vndb.test/kana/vn"
+
+
+def _snapshot(api_url=API_URL):
+    return {"api_url": api_url, "taken_at": 0.0,
+            "responses": [("popular-key", {"results": [{"id": "v1"}], "more": False})]}
+
+
+def _load(monkeypatch, path):
+    monkeypatch.setattr(static_data, "_default_data", None)
+    monkeypatch.setenv("VNDB_STATIC_BUNDLE", str(path))
+    return get_static_data()
+
+
+def test_current_bundle_is_loaded(tmp_path, monkeypatch):
+    path = tmp_path / "bundle.json"
+    write_bundle(build_bundle(_snapshot()), str(path))
+
+    data = _load(monkeypatch, path)
+    assert data.source == str(path)
+    assert data.tag_map == static_data.TAG_MAP
+    assert data.snapshot["api_url"] == API_URL
+
+
+@pytest.mark.parametrize("field, value", [
+    ("version", static_data.BUNDLE_VERSION + 1),
+    ("source_hash", "0" * 64),
+])
+def test_out_of_date_bundle_falls_back_to_module(tmp_path, monkeypatch, field, value):
+    path = tmp_path / "bundle.json"
+    bundle = build_bundle(_snapshot())
+    bundle[field] = value
+    # Tables that no longer match the module must not be used
+    bundle["tag_map"] = {"Mystery": "g0"}
+    write_bundle(bundle, str(path))
+
+    assert read_bundle(str(path)) is None
+    data = _load(monkeypatch, path)
+    assert data.source == "module"
+    assert data.tag_map == static_data.TAG_MAP
+    assert data.snapshot is None
+
+
+def test_missing_or_corrupt_bundle_falls_back_to_module(tmp_path, monkeypatch):
+    assert _load(monkeypatch, tmp_path / "missing.json").source == "module"
+
+    corrupt = tmp_path / "corrupt.json"
+    corrupt.write_bytes(b"{not json")
+    assert read_bundle(str(corrupt)) is None
+    assert _load(monkeypatch, corrupt).source == "module"
+
+
+def test_seed_cache_once_per_cache_and_only_for_its_api_url():
+    data = StaticData(build_bundle(_snapshot()), source="test")
+    cache = ResponseCache()
+
+    assert data.seed_cache(cache, "http://elsewhere.test/kana/vn") == 0
+    assert data.seed_cache(cache, API_URL) == 1
+    assert data.seed_cache(cache, API_URL) == 0
+    assert data.seed_cache(ResponseCache(), API_URL) == 1
+    assert StaticData(build_bundle(), source="test").seed_cache(ResponseCache(), API_URL) == 0
+
+
+def test_seeded_entries_are_expired_and_served_unmarked_while_healthy():
+    async def run():
+        data = StaticData(build_bundle(_snapshot()), source="test")
+        cache = ResponseCache(ttl=300.0, stale_ttl=3600.0)
+        data.seed_cache(cache, API_URL)
+        fetched = []
+
+        async def fetch():
+            fetched.append(True)
+            return {"results": [{"id": "v2"}], "more": False}
+
+        served = await cache.get_or_fetch("popular-key", fetch)
+        while cache._refresh_tasks:
+            await asyncio.gather(*cache._refresh_tasks)
+        return served, cache._entries["popular-key"][1], fetched, cache.metrics()
+
+    served, stored, fetched, metrics = asyncio.run(run())
+    # Answered from the snapshot straight away, without an outage marker...
+    assert served["results"] == [{"id": "v1"}]
+    assert not isinstance(served, StaleResponse)
+    # ...while a background fetch replaces it
+    assert fetched == [True]
+    assert stored["results"] == [{"id": "v2"}]
+    assert metrics["stale_hits"] == 1
+
+
+def test_seeded_entries_marked_stale_while_degraded():
+    async def run():
+        data = StaticData(build_bundle(_snapshot()), source="test")
+        cache = ResponseCache(ttl=300.0, stale_ttl=3600.0)
+        data.seed_cache(cache, API_URL)
+
+        async def fetch():
+            return None
+
+        served = await cache.get_or_fetch("popular-key", fetch, degraded=True)
+        while cache._refresh_tasks:
+            await asyncio.gather(*cache._refresh_tasks)
+        return served
+
+    served = asyncio.run(run())
+    assert isinstance(served, StaleResponse)
+    assert served["results"] == [{"id": "v1"}]
@@ -0,0 +1,43 @@
+import asyncio
+import json
+
+import httpx
+
+from benchmarks.mock_vndb import MockVNDB
+from vn_record import VNResults
+
+
+def _run(make_fetcher, max_results: int, nsfw_ratio: float):
+    mock = MockVNDB(nsfw_ratio=nsfw_ratio)
+    sizes = []
+
+    def respond(request: httpx.Request):
+        payload = json.loads(request.content)
+        sizes.append((payload["results"], payload.get("page", 1)))
+        return mock.handle(request)
+
+    fetcher = make_fetcher(respond)
+
+    async def run():
+        results = VNResults()
+        streamed = [vn.id async for vn in fetcher.stream_vns_by_tags(
+            required_tags=["Romance"], max_results=max_results, results=results)]
+        stream_sizes = list(sizes)
+        collected = await fetcher.fetch_vns_by_tags(required_tags=["Romance"], max_results=max_results)
+        return streamed, [vn.id for vn in results], [vn.id for vn in collected], stream_sizes
+
+    return asyncio.run(run())
+
+
+def test_small_first_page_then_normal_paging(make_fetcher):
+    streamed, results, collected, sizes = _run(make_fetcher, max_results=10, nsfw_ratio=0.3)
+    assert sizes == [(10, 1), (30, 1)]
+    # Same VNs, in the same order, as the non-streaming call, with none repeated
+    assert streamed == results == collected
+    assert len(set(streamed)) == len(streamed) == 10
+
+
+def test_first_page_alone_when_it_is_enough(make_fetcher):
+    streamed, _, collected, sizes = _run(make_fetcher, max_results=5, nsfw_ratio=0.0)
+    assert sizes == [(5, 1)]
+    assert streamed == collected
@@ -0,0 +1,30 @@
+import time
+
+from thumbnail_cache import ThumbnailCache
+
+# Nothing listens on port 1, so downloads fail immediately
+UNREACHABLE = "http://127.0.0.1:1/cover.jpg"
+
+
+def test_uncached_cover_returns_url_without_waiting(tmp_path):
+    cache = ThumbnailCache(str(tmp_path))
+    start = time.monotonic()
+    assert cache.image_for({"id": "v1", "image_url": UNREACHABLE}) == UNREACHABLE
+    assert time.monotonic() - start < 0.5
+
+
+def test_failed_download_is_not_retried(tmp_path):
+    cache = ThumbnailCache(str(tmp_path))
+    vn = {"id": "v1", "image_url": UNREACHABLE}
+    future = cache.prefetch([vn])["v1"]
+    assert future.result(timeout=10) is None
+    assert cache.metrics()["recent_failures"] == 1
+    assert cache.prefetch([vn]) == {}
+    assert cache.image_for(vn, wait=5) == UNREACHABLE
+    assert cache.metrics()["download_errors"] == 1
+
+
+def test_cached_cover_is_served_locally(tmp_path):
+    cache = ThumbnailCache(str(tmp_path))
+    cache.put("v1", b"jpeg bytes")
+    assert cache.image_for({"id": "v1", "image_url": UNREACHABLE}) == b"jpeg bytes"
@@ -0,0 +1,26 @@
+import json
+
+from benchmarks.synthetic import make_raw_vn
+from vn_cards import get_card_parts
+from vn_record import iter_vn_results
+
+
+def _decode(vn):
+    return next(iter_vn_results(json.dumps({"results": [vn]}).encode("utf-8")))[0]
+
+
+def test_card_is_memoized_per_record():
+    record = _decode(make_raw_vn(11))
+    assert get_card_parts(record) is get_card_parts(record)
+
+
+def test_refreshed_record_gets_a_new_card():
+    vn = make_raw_vn(12)
+    old = _decode(vn)
+    old_parts = get_card_parts(old)
+    new = _decode(dict(vn, rating=99, votecount=123456))
+    new_parts = get_card_parts(new)
+    assert new is not old
+    assert "9.9/10" in new_parts['rating_html']
+    assert "123,456" in new_parts['info_markdown']
+    assert "123,456" not in old_parts['info_markdown']
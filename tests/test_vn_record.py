@@ -0,0 +1,34 @@
+import json
+
+from benchmarks.synthetic import make_raw_vn
+from vn_record import get_or_create_record, iter_vn_results
+
+
+def _decode(vn):
+    return next(iter_vn_results(json.dumps({"results": [vn]}).encode("utf-8")))[0]
+
+
+def test_unchanged_vn_shares_one_record():
+    vn = make_raw_vn(1)
+    first = _decode(vn)
+    assert _decode(dict(vn)) is first
+
+
+def test_fresh_vndb_data_replaces_the_shared_record():
+    vn = make_raw_vn(2)
+    old = _decode(vn)
+    updated = dict(vn, rating=vn["rating"] + 5, votecount=vn["votecount"] + 1, description="Rewritten")
+    new = _decode(updated)
+    assert new is not old
+    assert (new.rating, new.votes, new.description) == ((vn["rating"] + 5) / 10, vn["votecount"] + 1, "Rewritten")
+    # The session holding the old record keeps it; later lookups get the new one
+    assert old.description != "Rewritten"
+    assert _decode(updated) is new
+
+
+def test_get_or_create_record_compares_fields():
+    fields = dict(title="VN", rating=80.0, votes=10, released="2020-01-01", languages=["en"],
+                  description="", image_url=None, tags=["Mystery"])
+    record = get_or_create_record("v900001", **fields)
+    assert get_or_create_record("v900001", **fields) is record
+    assert get_or_create_record("v900001", **dict(fields, votes=11)).votes == 11
@@ -0,0 +1,278 @@
+import asyncio
+import concurrent.futures
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Iterable, Union
+
+import async_runtime
+from instrumentation import log_event, registry
+
+# Pillow is optional; without it covers are cached at their original size.
+# It is imported on the first thumbnail rather than at startup, since it
+# adds about 0.1 s to every process's import time.
+_pil_image = None
+_pil_checked = False
+
+
+def _image_module():
+    """PIL.Image, or None if Pillow isn't installed"""
+    global _pil_image, _pil_checked
+    if not _pil_checked:
+        try:
+            from PIL import Image
+            _pil_image = Image
+        except ImportError:
+            pass
+        _pil_checked = True
+    return _pil_image
+
+# Card-sized thumbnail bounds (the card image column is roughly this wide)
+THUMBNAIL_SIZE = (320, 480)
+THUMBNAIL_QUALITY = 80
+# Covers whose download failed aren't retried for this long
+FAILURE_TTL_SECONDS = 300.0
+MAX_REMEMBERED_FAILURES = 1024
+
+
+def _make_thumbnail(data: bytes, size=THUMBNAIL_SIZE, quality: int = THUMBNAIL_QUALITY) -> bytes:
+    """Downscale cover art to a JPEG thumbnail; returns the input if it can't be decoded"""
+    Image = _image_module()
+    if Image is None:
+        return data
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail(size)
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            out = io.BytesIO()
+            image.save(out, format="JPEG", quality=quality, optimize=True)
+            thumbnail = out.getvalue()
+    except Exception:
+        return data
+    return thumbnail if len(thumbnail) < len(data) else data
+
+
+class ThumbnailCache:
+    """
+    Size-bounded on-disk LRU of VN cover thumbnails, keyed by VN ID
+
+    Covers are downloaded concurrently through the shared HTTP client as soon
+    as a VN is chosen (prefetch), downscaled, and written to cache_dir. Cards
+    then hand the local bytes to st.image instead of the remote VNDB URL;
+    until a cover is cached (or after its download failed) they get the URL.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 64 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # vn_id -> bytes on disk, oldest first
+        self._original_sizes: Dict[str, int] = {}
+        self._pending: Dict[str, concurrent.futures.Future] = {}
+        self._failed: "OrderedDict[str, float]" = OrderedDict()  # vn_id -> time of the last failed download
+        self._total_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.bytes_downloaded = 0
+        self.download_errors = 0
+
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuild the LRU order from files left by a previous process"""
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".jpg"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, vn_id, size in sorted(files):
+            self._entries[vn_id] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _path(self, vn_id: str) -> str:
+        safe_id = re.sub(r"[^A-Za-z0-9_-]", "_", str(vn_id))
+        return os.path.join(self.cache_dir, f"{safe_id}.jpg")
+
+    def _evict(self):
+        """Drop least recently used thumbnails until the cache fits max_bytes (lock held)"""
+        while self._total_bytes > self.max_bytes and self._entries:
+            vn_id, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self._original_sizes.pop(vn_id, None)
+            try:
+                os.remove(self._path(vn_id))
+            except OSError:
+                pass
+
+    def get(self, vn_id: str) -> Optional[bytes]:
+        """Return cached thumbnail bytes, or None on a miss"""
+        with self._lock:
+            if vn_id not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(vn_id)
+            path = self._path(vn_id)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                size = self._entries.pop(vn_id, 0)
+                self._total_bytes -= size
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += self._original_sizes.get(vn_id, len(data))
+        return data
+
+    def put(self, vn_id: str, data: bytes, original_size: Optional[int] = None):
+        """Store a thumbnail and evict old entries if the cache is over budget"""
+        path = self._path(vn_id)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._total_bytes -= self._entries.pop(vn_id, 0)
+            self._entries[vn_id] = len(data)
+            self._total_bytes += len(data)
+            self._original_sizes[vn_id] = original_size or len(data)
+            self._evict()
+
+    async def _download(self, vn_id: str, url: str) -> Optional[bytes]:
+        try:
+            async with async_runtime.shared_client() as client:
+                response = await client.get(url)
+            if response.status_code != 200:
+                self.download_errors += 1
+                self._remember_failure(vn_id)
+                return None
+            original = response.content
+            self.bytes_downloaded += len(original)
+            thumbnail = await asyncio.to_thread(_make_thumbnail, original)
+            await asyncio.to_thread(self.put, vn_id, thumbnail, len(original))
+            return thumbnail
+        except Exception as e:
+            log_event(logging.WARNING, "cover download failed", vn_id=vn_id, url=url, error=str(e))
+            self.download_errors += 1
+            self._remember_failure(vn_id)
+            return None
+        finally:
+            with self._lock:
+                self._pending.pop(vn_id, None)
+
+    def _remember_failure(self, vn_id: str):
+        with self._lock:
+            self._failed[vn_id] = time.monotonic()
+            self._failed.move_to_end(vn_id)
+            while len(self._failed) > MAX_REMEMBERED_FAILURES:
+                self._failed.popitem(last=False)
+
+    def _recently_failed(self, vn_id: str) -> bool:
+        """Whether vn_id's cover failed to download within FAILURE_TTL_SECONDS (lock held)"""
+        failed_at = self._failed.get(vn_id)
+        if failed_at is None:
+            return False
+        if time.monotonic() - failed_at < FAILURE_TTL_SECONDS:
+            return True
+        del self._failed[vn_id]
+        return False
+
+    def prefetch(self, vns: Iterable[Any]) -> Dict[str, concurrent.futures.Future]:
+        """
+        Start downloading covers for VNs that aren't cached yet, without blocking
+
+        Returns the in-flight download futures by VN ID (already cached or
+        already downloading covers are not requested twice, recently failed
+        ones not at all).
+        """
+        started = {}
+        for vn in vns:
+            vn_id = vn.get('id')
+            url = vn.get('image_url')
+            if not vn_id or not url:
+                continue
+            with self._lock:
+                if vn_id in self._entries or self._recently_failed(vn_id):
+                    continue
+                future = self._pending.get(vn_id)
+                if future is None:
+                    future = self._pending[vn_id] = async_runtime.submit(self._download(vn_id, url))
+            started[vn_id] = future
+        return started
+
+    def image_for(self, vn: Any, wait: float = 0.0) -> Union[bytes, str, None]:
+        """
+        Return something st.image can show for a VN: local thumbnail bytes when
+        cached, otherwise the remote URL while the download runs in the
+        background (optionally waiting up to wait seconds for it first)
+        """
+        vn_id = vn.get('id')
+        url = vn.get('image_url')
+        if not url:
+            return None
+
+        data = self.get(vn_id)
+        if data is not None:
+            return data
+
+        future = self.prefetch([vn]).get(vn_id)
+        if future is not None and wait > 0:
+            try:
+                data = future.result(timeout=wait)
+            except Exception:
+                data = None
+        return data or url
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'bytes_downloaded': self.bytes_downloaded,
+                'download_errors': self.download_errors,
+                'entries': len(self._entries),
+                'bytes_on_disk': self._total_bytes,
+                'pending': len(self._pending),
+                'recent_failures': len(self._failed),
+            }
+
+
+_default_cache: Optional[ThumbnailCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_thumbnail_cache() -> ThumbnailCache:
+    """Return the process-wide thumbnail cache (configured from the environment)"""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                cache_dir = os.environ.get("VN_THUMBNAIL_DIR",
+                                           os.path.join(tempfile.gettempdir(), "vn_thumbnails"))
+                max_mb = float(os.environ.get("VN_THUMBNAIL_CACHE_MB", "64"))
+                _default_cache = ThumbnailCache(cache_dir, max_bytes=int(max_mb * 1024 * 1024))
+                registry.register_gauges("vn_thumbnail_cache", "Cover thumbnail cache statistics",
+                                         _default_cache.metrics)
+    return _default_cache
@@ -0,0 +1,73 @@
+import html
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+# Characters of description shown before the "read full description" expander
+DESCRIPTION_PREVIEW_CHARS = 400
+# Tags shown as chips before the "show all tags" expander
+VISIBLE_TAG_COUNT = 10
+# Precomputed cards kept per process (records are shared per VN ID, so are their cards)
+CARD_CACHE_SIZE = 2048
+
+# VN ID -> (record the card was built from, card parts)
+_card_cache: "OrderedDict[str, Tuple[Any, Dict[str, Any]]]" = OrderedDict()
+_card_cache_lock = threading.Lock()
+
+
+def _tag_chips(tags) -> str:
+    return "".join(f'<span class="tag">{html.escape(tag)}</span>' for tag in tags)
+
+
+def _build_card_parts(vn: Any) -> Dict[str, Any]:
+    title = vn.get("title", "Unknown Title")
+    rating = vn.get("rating", 0)
+    votes = vn.get("votes", 0)
+    vn_id = vn.get("id", "Unknown")
+    released = vn.get("released", "Unknown")
+    languages = vn.get("languages", [])
+    description = vn.get('description', 'No description available')
+    tags = vn.get('tags', [])
+
+    info_lines = [
+        f"🗳️ **Votes:** {votes:,}",
+        f"🆔 **ID:** {vn_id}",
+        f"📅 **Released:** {released}",
+        f"🌐 **Languages:** {', '.join(languages) if languages else 'Unknown'}",
+    ]
+
+    return {
+        'title': title,
+        'title_html': f'<div class="vn-title">🎮 {html.escape(title)}</div>',
+        'rating_html': f'<div class="vn-rating">⭐ Rating: {rating:.1f}/10</div>',
+        'info_markdown': "  \n".join(info_lines),
+        'description': description,
+        'description_preview': (description[:DESCRIPTION_PREVIEW_CHARS] + "..."
+                                if len(description) > DESCRIPTION_PREVIEW_CHARS else None),
+        'tags_html': f'<div class="vn-tags">{_tag_chips(tags[:VISIBLE_TAG_COUNT])}</div>' if tags else "",
+        'extra_tags_html': (f'<div class="vn-tags">{_tag_chips(tags[VISIBLE_TAG_COUNT:])}</div>'
+                            if len(tags) > VISIBLE_TAG_COUNT else ""),
+        'tag_count': len(tags),
+    }
+
+
+def get_card_parts(vn: Any) -> Dict[str, Any]:
+    """
+    Return the precomputed HTML/markdown pieces of a VN card, memoized by VN ID
+    for as long as the same record is passed in (a refreshed record replaces
+    the shared one, so its card is rebuilt)
+    """
+    vn_id = vn.get("id")
+    with _card_cache_lock:
+        cached = _card_cache.get(vn_id)
+        if cached is not None and cached[0] is vn:
+            _card_cache.move_to_end(vn_id)
+            return cached[1]
+
+    parts = _build_card_parts(vn)
+    with _card_cache_lock:
+        _card_cache[vn_id] = (vn, parts)
+        _card_cache.move_to_end(vn_id)
+        while len(_card_cache) > CARD_CACHE_SIZE:
+            _card_cache.popitem(last=False)
+    return parts
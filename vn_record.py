@@ -0,0 +1,287 @@
+import json
+import sys
+import weakref
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Iterable, Iterator, Tuple
+
+from vn_stats import HistoryStats, export_csv_bytes, export_json_bytes, table_columns, top_tags
+
+# orjson is optional; it decodes Kana responses several times faster than json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Process-wide registry of live records, keyed by VN ID. Every session that
+# fetches the same VN gets a reference to the same immutable instance until
+# VNDB returns different data for it; the entry disappears once no session
+# history holds it anymore.
+_registry: "weakref.WeakValueDictionary[str, VNRecord]" = weakref.WeakValueDictionary()
+
+
+def _intern_all(values: Iterable[str]) -> tuple:
+    """Intern short repeated strings (tag names, language codes) so they are stored once per process"""
+    return tuple(sys.intern(value) for value in values if isinstance(value, str))
+
+
+class VNRecord:
+    """A compact, immutable Visual Novel record shared across sessions"""
+
+    __slots__ = ('id', 'title', 'rating', 'votes', 'released', 'languages',
+                 'description', 'image_url', 'tags', '__weakref__')
+
+    # Keys exposed through the dict-style interface, in display/export order
+    FIELDS = ('title', 'id', 'rating', 'votes', 'released', 'languages',
+              'description', 'image_url', 'tags')
+
+    def __init__(self, id: str, title: str, rating: float, votes: int, released: str,
+                 languages: Iterable[str], description: str, image_url: Optional[str],
+                 tags: Iterable[str]):
+        setattr_ = object.__setattr__
+        setattr_(self, 'id', id)
+        setattr_(self, 'title', title)
+        setattr_(self, 'rating', rating)
+        setattr_(self, 'votes', votes)
+        setattr_(self, 'released', released)
+        setattr_(self, 'languages', _intern_all(languages))
+        setattr_(self, 'description', description)
+        setattr_(self, 'image_url', image_url)
+        setattr_(self, 'tags', _intern_all(tags))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("VNRecord is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("VNRecord is immutable")
+
+    def __repr__(self) -> str:
+        return f"VNRecord(id={self.id!r}, title={self.title!r})"
+
+    # Dict-style access so existing display/export code keeps working
+    def __getitem__(self, key: str) -> Any:
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        value = getattr(self, key)
+        return list(value) if isinstance(value, tuple) else value
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.FIELDS
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self.FIELDS
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a plain dict copy (e.g. for JSON export)"""
+        return {key: self[key] for key in self.FIELDS}
+
+    def _has_fields(self, fields: Dict[str, Any]) -> bool:
+        """Whether the record was built from exactly these field values"""
+        for name, value in fields.items():
+            if name in ('languages', 'tags'):
+                value = _intern_all(value)
+            if getattr(self, name) != value:
+                return False
+        return True
+
+
+def get_or_create_record(id: str, **fields) -> VNRecord:
+    """
+    Return the shared record for a VN ID, creating it if no session holds one
+    yet or if the fields differ from it (e.g. the rating changed on VNDB)
+
+    A new record replaces the shared one for later lookups; sessions keep the
+    record they already hold.
+    """
+    record = _registry.get(id)
+    if record is None or not record._has_fields(fields):
+        record = VNRecord(id=id, **fields)
+        if isinstance(id, str):
+            _registry[id] = record
+    return record
+
+
+def loads(content: bytes) -> Any:
+    """Decode a JSON response body, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+# Lowercased tag names, computed once per distinct tag name per process
+_lower_tag_names: Dict[str, str] = {}
+
+# Number of tags kept on a record for display
+RECORD_TAG_LIMIT = 15
+
+
+def iter_vn_results(content: bytes) -> Iterator[Tuple[VNRecord, List[str]]]:
+    """
+    Decode a Kana /vn response body straight into VNRecords
+
+    Yields (record, tag_names) pairs, where tag_names holds every tag name of
+    the VN lowercased for the NSFW check. Records are built lazily, so callers
+    that stop after enough safe results skip the rest of the page.
+    """
+    return iter_vn_records(loads(content))
+
+
+def iter_vn_records(data: Any) -> Iterator[Tuple[VNRecord, List[str]]]:
+    """Like iter_vn_results, for a response body that was already decoded with loads()"""
+    results = data.get("results") if isinstance(data, dict) else None
+    if not results:
+        return
+
+    lower_cache = _lower_tag_names
+    for vn in results:
+        names = [tag.get("name") or "" for tag in vn.get("tags") or ()]
+        tag_names = []
+        for name in names:
+            lowered = lower_cache.get(name)
+            if lowered is None:
+                lowered = lower_cache[name] = sys.intern(name.lower())
+            tag_names.append(lowered)
+
+        image_info = vn.get("image")
+        image_url = image_info.get("url") if isinstance(image_info, dict) else None
+        # Always built from the response, so a shared record never outlives a change on VNDB
+        record = get_or_create_record(
+            id=vn.get("id", "Unknown"),
+            title=vn.get("title", "Unknown"),
+            rating=(vn.get("rating") or 0) / 10,
+            votes=vn.get("votecount", 0),
+            released=vn.get("released", "Unknown"),
+            languages=vn.get("languages") or (),
+            description=vn.get("description") or "No description available",
+            image_url=image_url or None,
+            tags=[name or "Unknown" for name in names[:RECORD_TAG_LIMIT]]
+        )
+        yield record, tag_names
+
+
+class VNResults(list):
+    """
+    List of VNRecords returned by a fetch; stale is True when they came from
+    a cached response past its TTL while VNDB is failing (circuit breaker not
+    closed, or refreshing the response failed), and
+    partial when the call's deadline ran out or a later page failed before
+    all pages were fetched
+    """
+    __slots__ = ("stale", "partial")
+
+    def __init__(self, records: Iterable[VNRecord] = (), stale: bool = False, partial: bool = False):
+        super().__init__(records)
+        self.stale = stale
+        self.partial = partial
+
+
+def live_record_count() -> int:
+    """Number of distinct VN records currently referenced by any session"""
+    return len(_registry)
+
+
+class VNHistory:
+    """
+    Bounded, ID-deduplicated history of fetched VNs for one session
+
+    Only references to shared VNRecord instances are kept. When the history is
+    full the oldest entry is evicted. Re-adding a VN that is already present
+    either keeps its original position (eviction="fifo") or moves it to the
+    newest position (eviction="lru").
+    """
+
+    EVICTION_POLICIES = ("fifo", "lru")
+
+    def __init__(self, maxlen: int = 200, eviction: str = "lru"):
+        if maxlen < 1:
+            raise ValueError("maxlen must be at least 1")
+        if eviction not in self.EVICTION_POLICIES:
+            raise ValueError(f"eviction must be one of {self.EVICTION_POLICIES}")
+        self.maxlen = maxlen
+        self.eviction = eviction
+        self._items: "OrderedDict[str, VNRecord]" = OrderedDict()
+
+        # Kept up to date on every add/evict so the Statistics tab never rescans
+        self.stats = HistoryStats()
+        # Bumped on every change; exports are cached against it
+        self.version = 0
+        self._export_cache: Dict[str, Tuple[int, bytes]] = {}
+
+    def append(self, vn: VNRecord) -> bool:
+        """Add a VN; returns False if it was already in the history"""
+        vn_id = vn.get('id')
+        if vn_id in self._items:
+            if self.eviction == "lru":
+                self._items.move_to_end(vn_id)
+                self.version += 1
+            return False
+
+        self._items[vn_id] = vn
+        self.stats.add(vn)
+        while len(self._items) > self.maxlen:
+            _, evicted = self._items.popitem(last=False)
+            self.stats.remove(evicted)
+        self.version += 1
+        return True
+
+    def extend(self, vns: Iterable[VNRecord]) -> int:
+        """Add several VNs; returns how many were new"""
+        added = 0
+        for vn in vns:
+            if self.append(vn):
+                added += 1
+        return added
+
+    def clear(self):
+        self._items.clear()
+        self.stats = HistoryStats()
+        self.version += 1
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __bool__(self) -> bool:
+        return bool(self._items)
+
+    def __iter__(self) -> Iterator[VNRecord]:
+        return iter(self._items.values())
+
+    def __reversed__(self) -> Iterator[VNRecord]:
+        return reversed(self._items.values())
+
+    def __contains__(self, vn_id: str) -> bool:
+        return vn_id in self._items
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Return plain dicts for every VN, oldest first"""
+        return [vn.to_dict() for vn in self._items.values()]
+
+    def table_columns(self) -> Dict[str, List[Any]]:
+        """Statistics table columns, oldest first, built from the shared records"""
+        return table_columns(self._items.values())
+
+    def top_tags(self, n: int = 10) -> List[tuple]:
+        """Most common tags in the history as (tag, count) pairs"""
+        return top_tags(self._items.values(), n)
+
+    def _cached_export(self, fmt: str, build) -> bytes:
+        cached = self._export_cache.get(fmt)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        version = self.version
+        data = build()
+        self._export_cache[fmt] = (version, data)
+        return data
+
+    def export_csv(self) -> bytes:
+        """CSV export of the history table, regenerated only when the history changed"""
+        return self._cached_export("csv", lambda: export_csv_bytes(self._items.values()))
+
+    def export_json(self) -> bytes:
+        """Indented JSON export of every VN, regenerated only when the history changed"""
+        return self._cached_export("json", lambda: export_json_bytes(list(self._items.values())))
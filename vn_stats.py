@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+from collections import Counter
+from typing import Any, Dict, IO, Iterable, Iterator, List
+
+# Columns of the Statistics tab table and of the CSV export, in order
+TABLE_COLUMNS = ('Title', 'ID', 'Rating', 'Votes', 'Released', 'Languages', 'Tags', 'Image URL')
+
+
+def _table_row(vn: Any) -> tuple:
+    return (
+        vn.get('title', 'Unknown'),
+        vn.get('id', 'Unknown'),
+        vn.get('rating', 0),
+        vn.get('votes', 0),
+        vn.get('released', 'Unknown'),
+        ', '.join(vn.get('languages', [])),
+        ', '.join(vn.get('tags', [])[:5]),
+        vn.get('image_url', '') or '',
+    )
+
+
+class HistoryStats:
+    """
+    Running totals for a session history, updated as VNs are added or evicted
+
+    Only scalars are kept per session; anything per VN (table rows, tag
+    counts) is derived from the shared records when it is shown.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.rating_sum = 0.0
+        self.votes_sum = 0
+
+    def add(self, vn: Any):
+        self.count += 1
+        self.rating_sum += vn.get('rating', 0)
+        self.votes_sum += vn.get('votes', 0)
+
+    def remove(self, vn: Any):
+        self.count -= 1
+        self.rating_sum -= vn.get('rating', 0)
+        self.votes_sum -= vn.get('votes', 0)
+
+    @property
+    def avg_rating(self) -> float:
+        return self.rating_sum / self.count if self.count else 0.0
+
+    @property
+    def avg_votes(self) -> float:
+        return self.votes_sum / self.count if self.count else 0.0
+
+
+def top_tags(vns: Iterable[Any], n: int = 10) -> List[tuple]:
+    """Most common tags over vns as (tag, count) pairs"""
+    counts: Counter = Counter()
+    for vn in vns:
+        counts.update(vn.get('tags', []))
+    return counts.most_common(n)
+
+
+def iter_table_rows(vns: Iterable[Any]) -> Iterator[tuple]:
+    """Rows of the Statistics table / CSV export, built from the records on demand"""
+    return map(_table_row, vns)
+
+
+def table_columns(vns: Iterable[Any]) -> Dict[str, List[Any]]:
+    """The table as column lists (e.g. for st.dataframe)"""
+    rows = list(iter_table_rows(vns))
+    return {name: [row[index] for row in rows] for index, name in enumerate(TABLE_COLUMNS)}
+
+
+def write_csv(vns: Iterable[Any], fp: IO[str]):
+    """Stream the table to a text file object as CSV, one row at a time"""
+    writer = csv.writer(fp, lineterminator='\n')
+    writer.writerow(TABLE_COLUMNS)
+    writer.writerows(iter_table_rows(vns))
+
+
+def iter_json_chunks(vns) -> Iterator[str]:
+    """
+    Yield a JSON array of VN dicts piece by piece
+
+    The output is identical to json.dumps(list_of_dicts, indent=2,
+    ensure_ascii=False) without holding the whole document in memory.
+    """
+    first = True
+    yield "["
+    for vn in vns:
+        item = json.dumps(vn.to_dict(), indent=2, ensure_ascii=False)
+        yield ("\n  " if first else ",\n  ") + item.replace("\n", "\n  ")
+        first = False
+    yield "]" if first else "\n]"
+
+
+def write_json(vns, fp: IO[str]):
+    """Stream VNs to a text file object as an indented JSON array"""
+    for chunk in iter_json_chunks(vns):
+        fp.write(chunk)
+
+
+def export_csv_bytes(vns: Iterable[Any]) -> bytes:
+    out = io.StringIO()
+    write_csv(vns, out)
+    return out.getvalue().encode("utf-8")
+
+
+def export_json_bytes(vns) -> bytes:
+    return "".join(iter_json_chunks(vns)).encode("utf-8")
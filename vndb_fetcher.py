@@ -1,83 +1,115 @@
 import httpx
 import asyncio
+import inspect
+import logging
+import os
 import random
-from typing import Optional, Dict, Any, List
+import time
+from typing import Optional, Dict, Any, AsyncIterator, Iterable, Iterator, List, NamedTuple, Tuple, Union
 import json
+from contextlib import nullcontext
+
+from async_runtime import shared_client
+from circuit_breaker import CLOSED, CircuitBreaker, get_circuit_breaker
+from deadline import Deadline
+from rate_limiter import TokenBucket, get_rate_limiter
+from response_cache import ResponseCache, cache_key, get_response_cache
+from shared_cache import SharedCache, get_shared_cache
+from static_data import get_static_data
+from instrumentation import (
+    logger, log_event, time_stage, stage_seconds, payload_bytes, requests_total, rejections_total,
+    first_result_seconds
+)
+from vn_record import VNRecord, VNResults, get_or_create_record, iter_vn_records, loads
+
+
+# Kana returns at most this many VNs per page
+KANA_PAGE_LIMIT = 100
+
+# fetch_many query kinds -> VNDBFetcher method; batches run its raising
+# counterpart (same name, leading underscore) so failures reach BatchResult.error
+BATCH_KINDS = {
+    "tags": "fetch_vns_by_tags",
+    "popular": "fetch_popular_vns",
+    "search": "search_vns_by_query",
+    "by_id": "fetch_vn_by_id",
+}
+# Spec arguments that don't change a query's results (left out of its canonical key)
+_BATCH_KEY_EXCLUDED = ("deadline",)
+
+
+class BatchResult(NamedTuple):
+    """
+    Outcome of one distinct fetch_many query
+
+    indices are the positions of every spec it answers (duplicates share one
+    query). result is what the matching fetcher method returned, or None if
+    error is set.
+    """
+    key: Optional[str]
+    indices: Tuple[int, ...]
+    spec: Dict[str, Any]
+    result: Any
+    error: Optional[BaseException]
+
+
+class UpstreamError(RuntimeError):
+    """Kana answered a query with an error status, or the circuit breaker refused it"""
+
+
+def _rejection_kind(reason: str) -> str:
+    """Collapse a rejection reason into a low-cardinality metric label"""
+    if reason.startswith("NSFW tag"):
+        return "nsfw_tag"
+    if reason.startswith("NSFW description"):
+        return "nsfw_description"
+    return "explicit_tag"
+
 
 class VNDBFetcher:
     """A class to fetch Safe-for-Work Visual Novels from VNDB API with improved tag-based filtering"""
     
-    def __init__(self):
-        self.api_url = "https://api.vndb.org/kana/vn"
+    def __init__(self, client: Optional[httpx.AsyncClient] = None, api_url: Optional[str] = None,
+                 cache: Union[ResponseCache, None, bool] = None,
+                 rate_limiter: Union[TokenBucket, None, bool] = None,
+                 shared_cache: Union[SharedCache, None, bool] = None,
+                 circuit_breaker: Union[CircuitBreaker, None, bool] = None):
+        """
+        Args:
+            client: Dedicated HTTP client (e.g. with a mock transport); defaults to the pooled client
+            api_url: Kana /vn endpoint; defaults to VNDB_API_URL or the public API
+            cache: Response cache; None uses the process-wide cache, False disables caching
+            rate_limiter: Upstream rate limiter; None uses the process-wide limiter, False disables it
+            shared_cache: Cross-process second tier behind cache; None uses the host-wide
+                SQLite cache (if enabled), False disables it
+            circuit_breaker: Upstream circuit breaker; None uses the process-wide breaker, False disables it
+        """
+        # VNDB_API_URL lets test/load setups point every session at a local stub
+        self.api_url = api_url or os.environ.get("VNDB_API_URL", "https://api.vndb.org/kana/vn")
+        self.cache = get_response_cache() if cache is None else (cache or None)
+        self.rate_limiter = get_rate_limiter() if rate_limiter is None else (rate_limiter or None)
+        self.shared_cache = get_shared_cache() if shared_cache is None else (shared_cache or None)
+        self.circuit_breaker = get_circuit_breaker() if circuit_breaker is None else (circuit_breaker or None)
+        self.vn_fields = "id, title, rating, votecount, released, languages, image.url, description, tags.name"
         
-        # NSFW keywords that indicate adult content
-        self.nsfw_keywords = [
-            "sex", "erotic", "hentai", "nukige", "18+", 
-            "adult only", "explicit", "pornographic", "nudity"
-        ]
+        # Optional dedicated client (e.g. with a mock transport); by default the
+        # process-wide pooled client from async_runtime is used
+        self.client = client
         
-        # Safe keywords that should NOT be flagged as NSFW
-        self.safe_keywords = [
-            "no sexual content", "adult protagonist", "adult heroine", 
-            "mature protagonist", "mature heroine", "adult romance", 
-            "mature themes", "mature content", "low sexual content", 
-            "sexual innuendo", "sex change"
-        ]
+        # Tag map, keyword lists and the per-tag verdict cache are loaded once per
+        # process and shared by every fetcher
+        self.static = get_static_data()
+        self.tag_map = self.static.tag_map
+        self.common_tags = self.static.common_tags
+        self.nsfw_keywords = self.static.nsfw_keywords
+        self.safe_keywords = self.static.safe_keywords
+        self.explicit_nsfw = self.static.explicit_nsfw
+        self._tag_verdicts = self.static.tag_verdicts
         
-        # Explicit NSFW tags for simple filtering
-        self.explicit_nsfw = ["hentai", "nukige", "18+", "erotic", "pornographic"]
-        
-        # IMPROVED: Fixed and expanded tag mapping with verified VNDB tag IDs
-        self.tag_map = {
-            # Story genres
-            "Mystery": "g19",
-            "Horror": "g7", 
-            "Comedy": "g104",
-            "Drama": "g147",
-            "Slice of Life": "g454",
-            "Thriller": "g789",
-            "Romance": "g96",
-            "Action": "g12",
-            "Fantasy": "g2",
-            "Science Fiction": "g105",
-            
-            # Protagonist types - FIXED: Removed duplicate tag IDs
-            "Male Protagonist": "g133",
-            "Female Protagonist": "g134", 
-            "Multiple Protagonists": "g136",
-            "Adult Protagonist": "g137",
-            "Student Protagonist": "g544",
-            
-            # Gameplay
-            "Multiple Endings": "g148",
-            "Kinetic Novel": "g709",
-            "Linear Plot": "g145",
-            "Branching Plot": "g606",
-            
-            # Setting
-            "School": "g47",
-            "Modern Day": "g143",
-            "Past": "g141",
-            "Future": "g140",
-            # FIXED: Removed duplicate mapping for Historical
-            
-            # NEW: Additional useful tags
-            "Friendship": "710",
-            "Family": "g215",
-            "Military": "g46"
-        }
-        
-        # Common VN tags for easy reference
-        self.common_tags = {
-            "story": ["Mystery", "Horror", "Comedy", "Drama", "Slice of Life", 
-                      "Thriller", "Romance", "Action", "Fantasy", "Science Fiction"],
-            "protagonist": ["Male Protagonist", "Female Protagonist", "Multiple Protagonists",
-                           "Adult Protagonist", "Student Protagonist"],
-            "gameplay": ["Multiple Endings", "Linear Plot", "Kinetic Novel",
-                        "Branching Plot"],
-            "setting": ["School", "Modern Day", "Past", "Future"],
-            "themes": ["Friendship", "Family", "Military"]
-        }
+        # A fresh process answers the default queries from the bundled snapshot
+        # (served stale and refreshed in the background) instead of waiting on VNDB
+        if cache is None:
+            self.static.seed_cache(self.cache, self.api_url)
 
     def is_content_safe(self, vn: Dict[str, Any], strict: bool = True) -> tuple[bool, str]:
         """
@@ -86,64 +118,310 @@ class VNDBFetcher:
         """
         tags = vn.get("tags", [])
         tag_names = [tag.get("name", "").lower() for tag in tags]
-        description = vn.get("description", "").lower()
+        description = vn.get("description", "")
+        return self._check_safety(tag_names, description, strict)
+
+    def is_record_safe(self, record: VNRecord, tag_names: List[str], strict: bool = True) -> tuple[bool, str]:
+        """
+        Check if a decoded VNRecord is safe for work
+        
+        Args:
+            record: Record built by vn_record.iter_vn_results
+            tag_names: All lowercased tag names of the VN (the record only keeps the first few)
+            strict: Whether to use strict NSFW filtering
+        """
+        return self._check_safety(tag_names, record.description, strict)
+
+    def _check_safety(self, tag_names: List[str], description: str, strict: bool) -> tuple[bool, str]:
+        """Shared NSFW check on lowercased tag names and the raw description"""
+        # Tag names repeat across almost every VN, so the verdict per name is cached
+        verdicts = self._tag_verdicts[strict]
+        for tag_name in tag_names:
+            reason = verdicts.get(tag_name)
+            if reason is None:
+                reason = verdicts[tag_name] = self._tag_rejection_reason(tag_name, strict)
+            if reason:
+                return False, reason
         
         if strict:
-            # First check if tag is explicitly safe (like "no sexual content")
-            for tag_name in tag_names:
-                # Skip tags that are explicitly marking content as safe
-                if any(safe_tag in tag_name for safe_tag in self.safe_keywords):
-                    continue
-                
-                # Now check for NSFW keywords in remaining tags
-                for nsfw_keyword in self.nsfw_keywords:
-                    if nsfw_keyword in tag_name:
-                        return False, f"NSFW tag: '{tag_name}' contains '{nsfw_keyword}'"
-            
             # Check description - but be more careful about context
-            explicit_desc_patterns = ["contains sexual", "features erotic", "includes adult content", "hentai game"]
-            for pattern in explicit_desc_patterns:
+            description = description.lower()
+            for pattern in self.static.description_patterns:
                 if pattern in description:
                     return False, f"NSFW description contains '{pattern}'"
-                    
+        
+        return True, ""
+
+    def _tag_rejection_reason(self, tag_name: str, strict: bool) -> str:
+        """Return why a single lowercased tag name is NSFW, or "" if it is fine"""
+        # Skip tags that are explicitly marking content as safe (like "no sexual content")
+        if any(safe_tag in tag_name for safe_tag in self.safe_keywords):
+            return ""
+        
+        if strict:
+            # Now check for NSFW keywords in remaining tags
+            for nsfw_keyword in self.nsfw_keywords:
+                if nsfw_keyword in tag_name:
+                    return f"NSFW tag: '{tag_name}' contains '{nsfw_keyword}'"
         else:
             # Simple filtering - only exclude obviously explicit content
-            for tag_name in tag_names:
-                # Skip safe tags
-                if any(safe_tag in tag_name for safe_tag in self.safe_keywords):
-                    continue
-                    
-                # Check for explicit content
-                if any(explicit in tag_name for explicit in self.explicit_nsfw):
-                    return False, "Contains explicit content tags"
+            if any(explicit in tag_name for explicit in self.explicit_nsfw):
+                return "Contains explicit content tags"
         
-        return True, ""
+        return ""
 
-    def format_vn_info(self, vn: Dict[str, Any]) -> Dict[str, Any]:
-        """Format VN information for display"""
-        formatted = {
-            'title': vn.get('title', 'Unknown'),
-            'id': vn.get('id', 'Unknown'),
-            'rating': vn.get('rating', 0) / 10,
-            'votes': vn.get('votecount', 0),
-            'released': vn.get('released', 'Unknown'),
-            'languages': vn.get('languages', []),
-            'description': vn.get('description', 'No description available'),
-            'image_url': None,
-            'tags': []
-        }
+    def select_safe_records(self, data: Any, max_results: int, strict_filtering: bool = True,
+                            operation: str = "query") -> VNResults:
+        """
+        Keep up to max_results safe VNs from a decoded Kana response
         
+        Records are built in a single pass over the decoded results and the NSFW
+        check runs directly on them, so nothing past max_results is formatted.
+        Format and safety time and rejections are recorded per operation. The
+        result is marked stale if data is a stale cached response.
+        """
+        return VNResults(self.iter_safe_records(data, max_results, strict_filtering, operation),
+                         stale=getattr(data, "stale", False))
+
+    def iter_safe_records(self, data: Any, max_results: int, strict_filtering: bool = True,
+                          operation: str = "query") -> Iterator[VNRecord]:
+        """
+        Yield up to max_results safe VNs from a decoded Kana response, each as
+        soon as it is built and checked (see select_safe_records)
+        """
+        debug = logger.isEnabledFor(logging.DEBUG)
+        found = 0
+        format_time = 0.0
+        safety_time = 0.0
+        records = iter_vn_records(data)
+        
+        try:
+            while found < max_results:
+                start = time.perf_counter()
+                item = next(records, None)
+                formatted = time.perf_counter()
+                format_time += formatted - start
+                if item is None:
+                    break
+                
+                record, tag_names = item
+                is_safe, reason = self.is_record_safe(record, tag_names, strict_filtering)
+                safety_time += time.perf_counter() - formatted
+                if is_safe:
+                    found += 1
+                    if debug:
+                        log_event(logging.DEBUG, "vn accepted", operation=operation, id=record.id,
+                                  title=record.title, tags=record.tags[:5])
+                    yield record
+                else:
+                    rejections_total.inc(operation=operation, reason=_rejection_kind(reason))
+                    if debug:
+                        log_event(logging.DEBUG, "vn filtered", operation=operation, id=record.id,
+                                  title=record.title, reason=reason)
+        finally:
+            stage_seconds.observe(format_time, stage="format", operation=operation)
+            stage_seconds.observe(safety_time, stage="safety", operation=operation)
+
+    def collect_safe_records(self, content: bytes, max_results: int,
+                             strict_filtering: bool = True) -> VNResults:
+        """Decode a Kana response body and keep up to max_results safe VNs"""
+        return self.select_safe_records(loads(content), max_results, strict_filtering)
+
+    def format_vn_info(self, vn: Dict[str, Any]) -> VNRecord:
+        """Format VN information for display as a shared, compact VNRecord"""
         # Handle image
+        image_url = None
         image_info = vn.get("image")
         if image_info and isinstance(image_info, dict) and image_info.get("url"):
-            formatted['image_url'] = image_info['url']
+            image_url = image_info['url']
         
         # Handle tags
         tags = vn.get("tags", [])
-        if tags:
-            formatted['tags'] = [tag.get("name", "Unknown") for tag in tags[:15]]
+        tag_names = [tag.get("name", "Unknown") for tag in tags[:15]] if tags else []
         
-        return formatted
+        return get_or_create_record(
+            id=vn.get('id', 'Unknown'),
+            title=vn.get('title', 'Unknown'),
+            rating=vn.get('rating', 0) / 10,
+            votes=vn.get('votecount', 0),
+            released=vn.get('released', 'Unknown'),
+            languages=vn.get('languages', []),
+            description=vn.get('description', 'No description available'),
+            image_url=image_url,
+            tags=tag_names
+        )
+
+    def _client_session(self):
+        """Async context manager yielding the HTTP client for one request"""
+        if self.client is not None:
+            return nullcontext(self.client)
+        return shared_client()
+
+    async def _query(self, payload: Dict[str, Any], operation: str,
+                     deadline: Optional[Deadline] = None) -> Optional[Any]:
+        """
+        Run a Kana query through the response cache, the cross-process shared
+        cache and the rate limiter and return the decoded JSON body, or None if
+        the API answered with an error
+
+        Raises asyncio.TimeoutError if the deadline passes first; the abandoned
+        request is cancelled, releasing its connection and rate-limit wait.
+        """
+        if deadline is None:
+            return await self._cached_query(payload, operation)
+        if deadline.expired:
+            raise asyncio.TimeoutError()
+        return await asyncio.wait_for(self._cached_query(payload, operation), deadline.remaining())
+
+    async def _cached_query(self, payload: Dict[str, Any], operation: str) -> Optional[Any]:
+        key = cache_key(payload)
+        if self.cache is None:
+            return await self._shared_post(key, payload, operation)
+        # Expired entries only count as stale while VNDB is failing
+        degraded = self.circuit_breaker is not None and self.circuit_breaker.state != CLOSED
+        return await self.cache.get_or_fetch(key, lambda: self._shared_post(key, payload, operation), degraded)
+
+    async def _shared_post(self, key: str, payload: Dict[str, Any], operation: str) -> Optional[Any]:
+        if self.shared_cache is None:
+            return await self._limited_post(payload, operation)
+        return await self.shared_cache.get_or_fetch(key, lambda: self._limited_post(payload, operation))
+
+    async def _collect_pages(self, payload: Dict[str, Any], max_results: int, candidates: int,
+                             strict_filtering: bool, operation: str, deadline: Optional[Deadline],
+                             max_pages: Optional[int] = None) -> VNResults:
+        """
+        Page through a Kana query until max_results safe VNs are found or
+        `candidates` VNs were scanned (Kana caps a page at KANA_PAGE_LIMIT)
+
+        Each page gets an equal share of the deadline left for the pages still
+        to come. If it runs out, the safe VNs found so far are returned marked
+        partial.
+        """
+        results = VNResults()
+        async for _ in self._iter_pages(payload, max_results, candidates, strict_filtering, operation,
+                                        deadline, max_pages, results):
+            pass
+        return results
+
+    async def _iter_pages(self, payload: Dict[str, Any], max_results: int, candidates: int,
+                          strict_filtering: bool, operation: str, deadline: Optional[Deadline],
+                          max_pages: Optional[int], results: VNResults,
+                          first_page: Optional[int] = None) -> AsyncIterator[VNRecord]:
+        """
+        Streaming core of _collect_pages: yields each safe VN as soon as its
+        page is decoded, appending it to results and setting results.stale and
+        results.partial; the time to the first VN is recorded per operation
+
+        With first_page set, a small page of that many VNs is requested first
+        so the first results arrive sooner. Paging then continues at the
+        normal page size from the start, skipping the VNs already scanned.
+
+        Raises UpstreamError if the first page fails; a later failure ends the
+        results early, marked partial like a deadline cut.
+        """
+        per_page = min(candidates, KANA_PAGE_LIMIT)
+        pages = -(-candidates // per_page)
+        if max_pages is not None:
+            pages = min(pages, max_pages)
+        # (results per page, page number, leading VNs already scanned)
+        requests = [(per_page, page, 0) for page in range(1, pages + 1)]
+        if first_page and first_page < per_page:
+            requests[0] = (per_page, 1, first_page)
+            requests.insert(0, (first_page, 1, 0))
+        start = time.perf_counter()
+        found = 0
+        seen = set()
+        
+        for index, (page_size, page, skip) in enumerate(requests):
+            page_payload = dict(payload, results=page_size)
+            if page > 1:
+                page_payload["page"] = page
+            try:
+                data = await self._query(page_payload, operation,
+                                         deadline.share(len(requests) - index) if deadline else None)
+            except asyncio.TimeoutError:
+                results.partial = True
+                log_event(logging.WARNING, "deadline exceeded", operation=operation, page=page,
+                          found=found)
+                break
+            if data is None:
+                if index == 0:
+                    raise UpstreamError(f"VNDB {operation} query failed")
+                results.partial = True
+                log_event(logging.WARNING, "page failed, returning partial results", operation=operation,
+                          page=page, found=found)
+                break
+            
+            results.stale = results.stale or getattr(data, "stale", False)
+            more = data.get("more")
+            if skip:
+                data = {"results": data.get("results", [])[skip:]}
+            for record in self.iter_safe_records(data, max_results - found, strict_filtering, operation):
+                # Kana may reorder ties between requests; never yield a VN twice
+                if record.id in seen:
+                    continue
+                seen.add(record.id)
+                if not found:
+                    first_result_seconds.observe(time.perf_counter() - start, operation=operation)
+                found += 1
+                results.append(record)
+                yield record
+            if found >= max_results or not more:
+                break
+
+    async def _limited_post(self, payload: Dict[str, Any], operation: str) -> Optional[Any]:
+        # Fail fast while VNDB is known to be down; callers fall back to stale cache entries
+        breaker = self.circuit_breaker
+        if breaker is not None and not breaker.allow():
+            requests_total.inc(operation=operation, status="circuit_open")
+            log_event(logging.WARNING, "circuit open, skipping upstream", operation=operation)
+            return None
+        try:
+            if self.rate_limiter is not None:
+                waited = await self.rate_limiter.acquire()
+                stage_seconds.observe(waited, stage="rate_limit_wait", operation=operation)
+            return await self._post(payload, operation)
+        except asyncio.CancelledError:
+            # Cancelled (deadline or superseded fetch) before an outcome, possibly
+            # still waiting for a token: give a half-open probe slot back
+            if breaker is not None:
+                breaker.cancel()
+            raise
+
+    async def _post(self, payload: Dict[str, Any], operation: str) -> Optional[Any]:
+        """
+        Send a query to the Kana API and return the decoded JSON body, or None if
+        the API answered with an error status
+        """
+        breaker = self.circuit_breaker
+        start = time.perf_counter()
+        try:
+            async with self._client_session() as client:
+                with time_stage("network", operation):
+                    response = await client.post(self.api_url, json=payload)
+        except Exception:
+            requests_total.inc(operation=operation, status="error")
+            if breaker is not None:
+                breaker.record(False)
+            raise
+        
+        if breaker is not None:
+            healthy = response.status_code != 429 and response.status_code < 500
+            breaker.record(healthy, time.perf_counter() - start)
+        requests_total.inc(operation=operation, status=str(response.status_code))
+        payload_bytes.observe(len(response.content), operation=operation)
+        
+        if response.status_code == 200:
+            with time_stage("decode", operation):
+                return loads(response.content)
+        
+        if response.status_code == 429:
+            log_event(logging.WARNING, "rate limited, waiting", operation=operation)
+            await asyncio.sleep(2)
+        else:
+            log_event(logging.WARNING, "api error", operation=operation,
+                      status=response.status_code, body=response.text[:500])
+        return None
 
     def get_available_tags(self) -> Dict[str, List[str]]:
         """Return common VN tags organized by category"""
@@ -153,14 +431,9 @@ class VNDBFetcher:
         """
         Convert tag names to tag IDs if available in tag_map, otherwise return as-is
         """
-        resolved_tags = []
-        for tag_name in tag_names:
-            if tag_name in self.tag_map:
-                resolved_tags.append(self.tag_map[tag_name])
-                print(f"Debug: Resolved '{tag_name}' -> '{self.tag_map[tag_name]}'")
-            else:
-                resolved_tags.append(tag_name)
-                print(f"Debug: Using tag name as-is: '{tag_name}'")
+        resolved_tags = [self.tag_map.get(tag_name, tag_name) for tag_name in tag_names]
+        if logger.isEnabledFor(logging.DEBUG):
+            log_event(logging.DEBUG, "tags resolved", names=tag_names, resolved=resolved_tags)
         return resolved_tags
 
     def build_tag_filters(self, required_tags: List[str] = None, excluded_tags: List[str] = None, 
@@ -177,7 +450,6 @@ class VNDBFetcher:
         
         if required_tags:
             resolved_required = self.resolve_tag_names(required_tags)
-            print(f"Debug: Required tags resolved to: {resolved_required}")
             
             if len(resolved_required) == 1:
                 filters.append(["tag", "=", resolved_required[0]])
@@ -195,11 +467,10 @@ class VNDBFetcher:
         
         if excluded_tags:
             resolved_excluded = self.resolve_tag_names(excluded_tags)
-            print(f"Debug: Excluded tags resolved to: {resolved_excluded}")
             for tag in resolved_excluded:
                 filters.append(["tag", "!=", tag])
         
-        print(f"Debug: Built tag filters: {filters}")
+        log_event(logging.DEBUG, "tag filters built", filters=filters)
         return filters
 
     def validate_tag_mapping(self) -> Dict[str, Any]:
@@ -230,58 +501,46 @@ class VNDBFetcher:
 
     async def search_vns_by_query(self, query: str, max_results: int = 10, 
                                  min_rating: int = 60, min_votes: int = 50,
-                                 strict_filtering: bool = True) -> List[Dict[str, Any]]:
+                                 strict_filtering: bool = True,
+                                 deadline: Union[Deadline, float, None] = None) -> List[VNRecord]:
         """
         Search VNs by title/description query
         """
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            try:
-                filters = [
-                    ["and",
-                        ["lang", "=", "en"],
-                        ["rating", ">=", min_rating],
-                        ["votecount", ">=", min_votes],
-                        ["search", "=", query]
-                    ]
-                ]
-                
-                payload = {
-                    "filters": filters,
-                    "fields": "id, title, rating, votecount, released, languages, image.url, description, tags.name",
-                    "results": max_results * 2,
-                    "sort": "rating",
-                    "reverse": True
-                }
-                
-                response = await client.post(self.api_url, json=payload)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    results = []
-                    
-                    if data.get("results"):
-                        for vn in data["results"]:
-                            if len(results) >= max_results:
-                                break
-                                
-                            is_safe, _ = self.is_content_safe(vn, strict_filtering)
-                            if is_safe:
-                                results.append(self.format_vn_info(vn))
-                    
-                    return results
-                
-                else:
-                    print(f"Search failed with status {response.status_code}: {response.text}")
-                    return []
-                    
-            except Exception as e:
-                print(f"Error searching VNs: {e}")
-                return []
+        try:
+            return await self._search_vns_by_query(query, max_results, min_rating, min_votes,
+                                                   strict_filtering, deadline)
+        except Exception as e:
+            log_event(logging.ERROR, "search failed", exc_info=True, query=query, error=str(e))
+            return []
+
+    async def _search_vns_by_query(self, query: str, max_results: int = 10, min_rating: int = 60,
+                                   min_votes: int = 50, strict_filtering: bool = True,
+                                   deadline: Union[Deadline, float, None] = None) -> VNResults:
+        """search_vns_by_query, raising errors instead of returning no VNs"""
+        filters = [
+            ["and",
+                ["lang", "=", "en"],
+                ["rating", ">=", min_rating],
+                ["votecount", ">=", min_votes],
+                ["search", "=", query]
+            ]
+        ]
+        
+        payload = {
+            "filters": filters,
+            "fields": self.vn_fields,
+            "sort": "rating",
+            "reverse": True
+        }
+        
+        return await self._collect_pages(payload, max_results, max_results * 2, strict_filtering,
+                                         "search", Deadline.coerce(deadline))
 
     async def fetch_vns_by_tags(self, required_tags: List[str] = None, excluded_tags: List[str] = None,
                                max_results: int = 10, min_rating: int = 60, min_votes: int = 50,
                                strict_filtering: bool = True, sort_by: str = "rating",
-                               tag_logic: str = "any") -> List[Dict[str, Any]]:
+                               tag_logic: str = "any",
+                               deadline: Union[Deadline, float, None] = None) -> List[VNRecord]:
         """
         Fetch VNs based on tag selection with improved filtering
         
@@ -294,149 +553,299 @@ class VNDBFetcher:
             strict_filtering: Whether to use strict NSFW filtering
             sort_by: Sort criteria ("rating", "votecount", "released")
             tag_logic: "any" (OR logic) or "all" (AND logic) for required tags
+            deadline: Time budget (seconds or a Deadline) for all pages; on expiry
+                the VNs found so far are returned with .partial set
         """
         if not required_tags and not excluded_tags:
             raise ValueError("At least one of required_tags or excluded_tags must be provided")
         
-        print(f"Debug: Searching for VNs with required_tags={required_tags}, excluded_tags={excluded_tags}, logic={tag_logic}")
+        try:
+            return await self._fetch_vns_by_tags(required_tags, excluded_tags, max_results, min_rating,
+                                                 min_votes, strict_filtering, sort_by, tag_logic, deadline)
+        except Exception as e:
+            log_event(logging.ERROR, "tag search failed", exc_info=True, required_tags=required_tags,
+                      excluded_tags=excluded_tags, error=str(e))
+            return []
+
+    async def _fetch_vns_by_tags(self, required_tags: List[str] = None, excluded_tags: List[str] = None,
+                                 max_results: int = 10, min_rating: int = 60, min_votes: int = 50,
+                                 strict_filtering: bool = True, sort_by: str = "rating",
+                                 tag_logic: str = "any",
+                                 deadline: Union[Deadline, float, None] = None) -> VNResults:
+        """fetch_vns_by_tags, raising errors instead of returning no VNs"""
+        log_event(logging.DEBUG, "tag search", required_tags=required_tags,
+                  excluded_tags=excluded_tags, logic=tag_logic)
+        payload = self._tags_payload(required_tags, excluded_tags, min_rating, min_votes, sort_by, tag_logic)
+        results = await self._collect_pages(payload, max_results, max_results * 3, strict_filtering,
+                                            "tags", Deadline.coerce(deadline))
+        log_event(logging.DEBUG, "tag search done", safe=len(results), partial=results.partial)
+        return results
+
+    async def stream_vns_by_tags(self, required_tags: List[str] = None, excluded_tags: List[str] = None,
+                                 max_results: int = 10, min_rating: int = 60, min_votes: int = 50,
+                                 strict_filtering: bool = True, sort_by: str = "rating",
+                                 tag_logic: str = "any", deadline: Union[Deadline, float, None] = None,
+                                 results: Optional[VNResults] = None) -> AsyncIterator[VNRecord]:
+        """
+        Like fetch_vns_by_tags, but yields each safe VN as soon as its page
+        arrives instead of returning them all at the end
+
+        Pass a VNResults as results to also collect the VNs together with the
+        stale/partial flags. Errors are raised to the consumer.
+        """
+        payload = self._tags_payload(required_tags, excluded_tags, min_rating, min_votes, sort_by, tag_logic)
+        # A first page of just max_results gets the first cards on screen sooner
+        async for record in self._iter_pages(payload, max_results, max_results * 3, strict_filtering, "tags",
+                                             Deadline.coerce(deadline), None,
+                                             VNResults() if results is None else results,
+                                             first_page=max_results):
+            yield record
+
+    def _tags_payload(self, required_tags: Optional[List[str]], excluded_tags: Optional[List[str]],
+                      min_rating: int, min_votes: int, sort_by: str, tag_logic: str) -> Dict[str, Any]:
+        """Kana query payload (without paging) for a tag search"""
+        if not required_tags and not excluded_tags:
+            raise ValueError("At least one of required_tags or excluded_tags must be provided")
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            try:
-                # Build base filters
-                base_filters = [
-                    ["lang", "=", "en"],
-                    ["rating", ">=", min_rating],
-                    ["votecount", ">=", min_votes]
-                ]
-                
-                # Add tag filters
-                tag_filters = self.build_tag_filters(required_tags, excluded_tags, tag_logic)
-                
-                # Combine all filters with proper logic
-                if tag_filters:
-                    all_filters = ["and"] + base_filters + tag_filters
-                else:
-                    all_filters = ["and"] + base_filters
-                
-                payload = {
-                    "filters": all_filters,
-                    "fields": "id, title, rating, votecount, released, languages, image.url, description, tags.name",
-                    "results": max_results * 3,
-                    "sort": sort_by,
-                    "reverse": True
-                }
-                
-                print(f"Debug: Final API payload filters: {all_filters}")
-                
-                response = await client.post(self.api_url, json=payload)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    results = []
-                    
-                    print(f"Debug: API returned {len(data.get('results', []))} results")
-                    
-                    if data.get("results"):
-                        for i, vn in enumerate(data["results"]):
-                            if len(results) >= max_results:
-                                break
-                                
-                            print(f"Debug: Processing VN {i+1}: {vn.get('title', 'Unknown')}")
-                            
-                            is_safe, reason = self.is_content_safe(vn, strict_filtering)
-                            if is_safe:
-                                formatted_vn = self.format_vn_info(vn)
-                                results.append(formatted_vn)
-                                print(f"Debug: Added '{formatted_vn['title']}' with tags: {formatted_vn['tags'][:5]}...")
-                            else:
-                                print(f"Debug: Filtered out {vn.get('title', 'Unknown')}: {reason}")
-                    
-                    print(f"Debug: Returning {len(results)} safe results")
-                    return results
-                
-                elif response.status_code == 429:
-                    print("Rate limited, waiting...")
-                    await asyncio.sleep(2)
-                    return []
-                else:
-                    print(f"API error {response.status_code}: {response.text}")
-                    return []
-                    
-            except Exception as e:
-                print(f"Error fetching VNs by tags: {e}")
-                return []
+        # Build base filters
+        base_filters = [
+            ["lang", "=", "en"],
+            ["rating", ">=", min_rating],
+            ["votecount", ">=", min_votes]
+        ]
+        
+        # Add tag filters
+        with time_stage("filter_build", "tags"):
+            tag_filters = self.build_tag_filters(required_tags, excluded_tags, tag_logic)
+        
+        # Combine all filters with proper logic
+        if tag_filters:
+            all_filters = ["and"] + base_filters + tag_filters
+        else:
+            all_filters = ["and"] + base_filters
+        
+        return {
+            "filters": all_filters,
+            "fields": self.vn_fields,
+            "sort": sort_by,
+            "reverse": True
+        }
 
     async def fetch_popular_vns(self, max_results: int = 10, min_rating: int = 70, 
-                               min_votes: int = 100, strict_filtering: bool = True) -> List[Dict[str, Any]]:
+                               min_votes: int = 100, strict_filtering: bool = True,
+                               deadline: Union[Deadline, float, None] = None,
+                               max_pages: Optional[int] = None) -> List[VNRecord]:
         """
         Fetch popular/highly-rated VNs without specific tag requirements
         """
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        try:
+            return await self._fetch_popular_vns(max_results, min_rating, min_votes, strict_filtering,
+                                                 deadline, max_pages)
+        except Exception as e:
+            log_event(logging.ERROR, "popular fetch failed", exc_info=True, error=str(e))
+            return []
+
+    async def _fetch_popular_vns(self, max_results: int = 10, min_rating: int = 70, min_votes: int = 100,
+                                 strict_filtering: bool = True, deadline: Union[Deadline, float, None] = None,
+                                 max_pages: Optional[int] = None) -> VNResults:
+        """fetch_popular_vns, raising errors instead of returning no VNs"""
+        filters = ["and",
+            ["lang", "=", "en"],
+            ["rating", ">=", min_rating],
+            ["votecount", ">=", min_votes]
+        ]
+        
+        payload = {
+            "filters": filters,
+            "fields": self.vn_fields,
+            "sort": "rating",
+            "reverse": True
+        }
+        
+        return await self._collect_pages(payload, max_results, max_results * 3, strict_filtering,
+                                         "popular", Deadline.coerce(deadline), max_pages)
+
+    async def fetch_vn_by_id(self, vn_id: str, strict_filtering: bool = True,
+                             deadline: Union[Deadline, float, None] = None) -> Optional[VNRecord]:
+        """
+        Fetch a single VN by its VNDB ID (e.g. "v17"); VNs already seen in any
+        cached response on this host are served from the shared cache
+        """
+        try:
+            return await self._fetch_vn_by_id(vn_id, strict_filtering, deadline)
+        except asyncio.TimeoutError:
+            log_event(logging.WARNING, "deadline exceeded", operation="by_id", vn_id=vn_id)
+            return None
+        except Exception as e:
+            log_event(logging.ERROR, "fetch by id failed", exc_info=True, vn_id=vn_id, error=str(e))
+            return None
+
+    async def _fetch_vn_by_id(self, vn_id: str, strict_filtering: bool = True,
+                              deadline: Union[Deadline, float, None] = None) -> Optional[VNRecord]:
+        """
+        fetch_vn_by_id, raising errors (asyncio.TimeoutError once the deadline
+        passes) instead of returning None; None still means not found or unsafe
+        """
+        vn = None
+        if self.shared_cache is not None:
+            vn = await asyncio.to_thread(self.shared_cache.get_record, vn_id)
+        if vn is None:
+            payload = {
+                "filters": ["id", "=", vn_id],
+                "fields": self.vn_fields,
+                "results": 1
+            }
+            data = await self._query(payload, "by_id", Deadline.coerce(deadline))
+            if data is None:
+                raise UpstreamError(f"VNDB by_id query failed for {vn_id}")
+            if not data.get("results"):
+                return None
+            vn = data["results"][0]
+        records = self.select_safe_records({"results": [vn]}, 1, strict_filtering, "by_id")
+        return records[0] if records else None
+
+    def _batch_call(self, spec: Dict[str, Any]) -> Tuple[str, Any, Dict[str, Any]]:
+        """
+        Resolve a fetch_many spec into (canonical key, raising method, kwargs)
+
+        The key is built after filling in the method's defaults and sorting
+        tag lists, so specs that only differ in spelling dedupe to one query.
+        Raises ValueError/TypeError for unknown kinds or arguments.
+        """
+        if not isinstance(spec, dict):
+            raise TypeError("query specs must be dicts")
+        kwargs = dict(spec)
+        kind = kwargs.pop("kind", None)
+        if kind not in BATCH_KINDS:
+            raise ValueError(f"unknown query kind {kind!r}; expected one of {', '.join(BATCH_KINDS)}")
+        method = getattr(self, BATCH_KINDS[kind])
+        
+        # Validated against the public signature, run through the raising counterpart
+        bound = inspect.signature(method).bind(**kwargs)
+        bound.apply_defaults()
+        canonical = {"kind": kind}
+        for name, value in bound.arguments.items():
+            if name in _BATCH_KEY_EXCLUDED:
+                continue
+            if name in ("required_tags", "excluded_tags") and value:
+                value = sorted(set(value))
+            canonical[name] = value
+        return cache_key(canonical), getattr(self, "_" + BATCH_KINDS[kind]), kwargs
+
+    async def fetch_many(self, specs: Iterable[Dict[str, Any]], concurrency: int = 4,
+                         deadline: Union[Deadline, float, None] = None) -> AsyncIterator[BatchResult]:
+        """
+        Run several queries concurrently, yielding a BatchResult for each
+        distinct query as soon as it completes
+        
+        Args:
+            specs: Dicts with a "kind" ("tags", "popular", "search" or "by_id")
+                plus keyword arguments of the matching method, e.g.
+                {"kind": "tags", "required_tags": ["Mystery"], "max_results": 5}
+            concurrency: Maximum number of queries running at once; all of them
+                also draw on the shared rate limiter and caches
+            deadline: Time budget shared by every query that doesn't set its own
+        
+        Specs that are equal once defaults are filled in run once. Invalid specs
+        and failed queries (network errors, VNDB error statuses, an open
+        circuit breaker, a by_id deadline) are reported through
+        BatchResult.error, so one bad query doesn't stop the others.
+        """
+        deadline = Deadline.coerce(deadline)
+        groups: Dict[str, List[Any]] = {}
+        for index, spec in enumerate(specs):
             try:
-                filters = ["and",
-                    ["lang", "=", "en"],
-                    ["rating", ">=", min_rating],
-                    ["votecount", ">=", min_votes]
-                ]
-                
-                payload = {
-                    "filters": filters,
-                    "fields": "id, title, rating, votecount, released, languages, image.url, description, tags.name",
-                    "results": max_results * 3,
-                    "sort": "rating",
-                    "reverse": True
-                }
-                
-                response = await client.post(self.api_url, json=payload)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    results = []
-                    
-                    if data.get("results"):
-                        for vn in data["results"]:
-                            if len(results) >= max_results:
-                                break
-                                
-                            is_safe, _ = self.is_content_safe(vn, strict_filtering)
-                            if is_safe:
-                                results.append(self.format_vn_info(vn))
-                    
-                    return results
-                else:
-                    return []
-                    
-            except Exception as e:
-                print(f"Error fetching popular VNs: {e}")
-                return []
+                key, method, kwargs = self._batch_call(spec)
+            except (TypeError, ValueError) as e:
+                yield BatchResult(None, (index,), spec, None, e)
+                continue
+            if key in groups:
+                groups[key][0].append(index)
+            else:
+                if deadline is not None and "deadline" not in kwargs:
+                    kwargs["deadline"] = deadline
+                groups[key] = [[index], spec, method, kwargs]
+        
+        log_event(logging.DEBUG, "batch started", queries=len(groups), concurrency=concurrency)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def run(method, kwargs):
+            async with semaphore:
+                return await method(**kwargs)
+        
+        tasks = {asyncio.ensure_future(run(method, kwargs)): key
+                 for key, (_, _, method, kwargs) in groups.items()}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    key = tasks[task]
+                    indices, spec = groups[key][0], groups[key][1]
+                    error = task.exception()
+                    yield BatchResult(key, tuple(indices), spec, None if error else task.result(), error)
+        finally:
+            # The consumer stopped early: don't leave queries running
+            for task in pending:
+                task.cancel()
 
     async def fetch_random_vn_with_tags(self, required_tags: List[str] = None, excluded_tags: List[str] = None,
                                        max_attempts: int = 3, strict_filtering: bool = True,
                                        min_rating: int = 60, min_votes: int = 50,
-                                       tag_logic: str = "any") -> Optional[Dict[str, Any]]:
+                                       tag_logic: str = "any",
+                                       deadline: Union[Deadline, float, None] = None) -> Optional[VNRecord]:
         """
         Fetch a single random VN that matches the tag criteria
         """
-        # First try to get a pool of VNs matching the criteria
-        results = await self.fetch_vns_by_tags(
-            required_tags=required_tags,
-            excluded_tags=excluded_tags,
-            max_results=20,
-            min_rating=min_rating,
-            min_votes=min_votes,
-            strict_filtering=strict_filtering,
-            tag_logic=tag_logic
-        )
+        if not required_tags and not excluded_tags:
+            raise ValueError("At least one of required_tags or excluded_tags must be provided")
+        
+        try:
+            return await self._fetch_random_vn_with_tags(required_tags, excluded_tags, max_attempts,
+                                                         strict_filtering, min_rating, min_votes, tag_logic,
+                                                         deadline)
+        except Exception as e:
+            log_event(logging.ERROR, "random tag pick failed", exc_info=True, required_tags=required_tags,
+                      excluded_tags=excluded_tags, error=str(e))
+            return None
+
+    async def _fetch_random_vn_with_tags(self, required_tags: List[str] = None,
+                                         excluded_tags: List[str] = None, max_attempts: int = 3,
+                                         strict_filtering: bool = True, min_rating: int = 60,
+                                         min_votes: int = 50, tag_logic: str = "any",
+                                         deadline: Union[Deadline, float, None] = None) -> Optional[VNRecord]:
+        """
+        fetch_random_vn_with_tags, raising errors instead of returning None; a
+        failed tag query still falls back to popular VNs
+        """
+        deadline = Deadline.coerce(deadline)
+        # First try to get a pool of VNs matching the criteria, keeping half the
+        # budget for the fallback
+        try:
+            results = await self._fetch_vns_by_tags(
+                required_tags=required_tags,
+                excluded_tags=excluded_tags,
+                max_results=20,
+                min_rating=min_rating,
+                min_votes=min_votes,
+                strict_filtering=strict_filtering,
+                tag_logic=tag_logic,
+                deadline=deadline.share(2) if deadline else None
+            )
+        except (UpstreamError, httpx.HTTPError) as e:
+            log_event(logging.WARNING, "tag pool failed, trying popular VNs", error=str(e))
+            results = []
         
         if results:
             return random.choice(results)
         
         # If no results with tags, fall back to popular VNs
-        popular_results = await self.fetch_popular_vns(
+        popular_results = await self._fetch_popular_vns(
             max_results=20,
             min_rating=min_rating,
             min_votes=min_votes,
-            strict_filtering=strict_filtering
+            strict_filtering=strict_filtering,
+            deadline=deadline
         )
         
         if popular_results:
@@ -445,16 +854,30 @@ class VNDBFetcher:
         return None
 
     async def fetch_random_vn(self, max_attempts: int = 200, strict_filtering: bool = True, 
-                             min_rating: int = 60, max_id: int = 1000, min_votes: int = 100) -> Optional[Dict[str, Any]]:
+                             min_rating: int = 60, max_id: int = 1000, min_votes: int = 100,
+                             deadline: Union[Deadline, float, None] = None) -> Optional[VNRecord]:
         """
         Fetch a random SFW Visual Novel
         """
-        # Use the more efficient approach
-        popular_vns = await self.fetch_popular_vns(
+        try:
+            return await self._fetch_random_vn(max_attempts, strict_filtering, min_rating, max_id, min_votes,
+                                               deadline)
+        except Exception as e:
+            log_event(logging.ERROR, "random pick failed", exc_info=True, error=str(e))
+            return None
+
+    async def _fetch_random_vn(self, max_attempts: int = 200, strict_filtering: bool = True,
+                               min_rating: int = 60, max_id: int = 1000, min_votes: int = 100,
+                               deadline: Union[Deadline, float, None] = None) -> Optional[VNRecord]:
+        """fetch_random_vn, raising errors instead of returning None"""
+        # Use the more efficient approach; one page of candidates is enough to pick from
+        popular_vns = await self._fetch_popular_vns(
             max_results=200,
             min_rating=min_rating,
             min_votes=min_votes,
-            strict_filtering=strict_filtering
+            strict_filtering=strict_filtering,
+            deadline=deadline,
+            max_pages=1
         )
         
         if popular_vns: